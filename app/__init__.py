@@ -7,6 +7,15 @@ from flask_migrate import upgrade
 from config import config
 from .extensions import db, migrate, login_manager, limiter, csrf
 from .models.user import User
+from .utils.query_profiler import query_profiler
+from .utils.health import health_checker
+from .utils.user_cache import user_cache
+from .utils.dashboard_cache import dashboard_cache
+from .utils.rate_limiter import rate_limiter
+from .utils.metrics import metrics
+from .utils.db_pool import engine_options
+from .hardware.notifications import tap_index_notifier
+from .services.audit_log import audit_logger
 
 def create_app(config_class=None):
     """Create Flask application."""
@@ -46,12 +55,26 @@ def create_app(config_class=None):
         app.logger.setLevel(logging.INFO)
         app.logger.info('Attendance System startup')
 
+    # Size the connection pool from the server's connection budget
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+    # Flask-Limiter reads RATELIMIT_STORAGE_URI; share the store with rate_limiter
+    app.config.setdefault('RATELIMIT_STORAGE_URI', app.config.get('RATELIMIT_STORAGE_URL', 'memory://'))
+
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     limiter.init_app(app)
+    rate_limiter.init_app(app)
     csrf.init_app(app)
+    query_profiler.init_app(app)
+    health_checker.init_app(app)
+    tap_index_notifier.init_app(app)
+    user_cache.init_app(app)
+    dashboard_cache.init_app(app)
+    metrics.init_app(app)
+    audit_logger.init_app(app)
 
     # Configure Flask-Login
     login_manager.login_view = 'auth.login'
@@ -59,9 +82,9 @@ def create_app(config_class=None):
 
     @login_manager.user_loader
     def load_user(user_id):
-        """Load user by ID."""
+        """Load the session user's principal, from the cache when possible."""
         try:
-            return User.query.get(int(user_id))
+            return user_cache.load(user_id)
         except Exception as e:
             app.logger.error(f'Error loading user: {e}')
             return None
@@ -79,6 +102,13 @@ def create_app(config_class=None):
     app.register_blueprint(student_bp, url_prefix='/student')
     app.register_blueprint(admin_bp, url_prefix='/admin')
 
+    # Register CLI commands
+    from .commands import init_db_command, rebuild_attendance_rollups_command, sync_fingerprints_command
+
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_attendance_rollups_command)
+    app.cli.add_command(sync_fingerprints_command)
+
     # Initialize database tables
     with app.app_context():
         try:
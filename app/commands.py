@@ -4,6 +4,7 @@ from flask.cli import with_appcontext
 from app.extensions import db
 from app.models.department import Department, create_default_departments
 from app.models.user import User
+from app.models.attendance_rollup import AttendanceRollup
 import logging
 
 logger = logging.getLogger(__name__)
@@ -54,3 +55,55 @@ def init_db_command():
         logger.error(f'Error initializing database: {str(e)}')
         click.echo('Error initializing database. Check the logs for details.', err=True)
         raise
+
+@click.command('rebuild-attendance-rollups')
+@with_appcontext
+def rebuild_attendance_rollups_command():
+    """Rebuild attendance rollups from attendance records."""
+    try:
+        count = AttendanceRollup.rebuild()
+        click.echo(f'Rebuilt {count} attendance rollup rows.')
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error rebuilding attendance rollups: {str(e)}')
+        click.echo('Error rebuilding attendance rollups. Check the logs for details.', err=True)
+        raise
+
+@click.command('sync-fingerprints')
+@click.option('--device', 'device_ids', multiple=True,
+              help='Reader to sync; repeat for several. Defaults to every reader connected to the gateway.')
+@click.option('--batch-size', type=int, default=None, help='Templates sent per command.')
+@with_appcontext
+def sync_fingerprints_command(device_ids, batch_size):
+    """Push enrolled fingerprint templates to the readers' sensor libraries."""
+    import time
+    from flask import current_app
+    from app.hardware.client import get_hardware_client
+    from app.services.fingerprint_sync import FingerprintSync
+
+    client = get_hardware_client()
+    client.start()
+    if not device_ids:
+        # The gateway sends its device list right after connecting
+        deadline = time.monotonic() + 5
+        while not client.devices and time.monotonic() < deadline:
+            time.sleep(0.1)
+        device_ids = [device_id for device_id, status in client.devices.items() if status.get('controller')]
+    if not device_ids:
+        click.echo('No readers connected to the hardware gateway.', err=True)
+        return
+
+    sync = FingerprintSync(
+        client,
+        batch_size=batch_size or current_app.config['FINGERPRINT_SYNC_BATCH_SIZE'],
+        library_size=current_app.config['FINGERPRINT_LIBRARY_SIZE']
+    )
+    try:
+        for stats in sync.sync_all(device_ids):
+            click.echo(f"{stats['device_id']}: {stats['stored']} stored, {stats['deleted']} deleted, "
+                       f"{stats['failed']} failed")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error syncing fingerprint templates: {str(e)}')
+        click.echo('Error syncing fingerprint templates. Check the logs for details.', err=True)
+        raise
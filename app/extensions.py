@@ -17,10 +17,9 @@ logger = logging.getLogger(__name__)
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
+# Storage and strategy come from the RATELIMIT_* settings at init_app
 limiter = Limiter(
     key_func=get_remote_address,
-    storage_uri="memory://",
-    strategy="fixed-window",
     default_limits=["200 per day", "50 per hour"]
 )
 csrf = CSRFProtect()
@@ -0,0 +1,327 @@
+"""Client used by web workers to talk to the hardware gateway."""
+import os
+import uuid
+import queue
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+from .framing import SUBPROTOCOLS, codec_for, decode
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVICE_URL = 'ws://127.0.0.1:8765'
+
+# Device ID the gateway registers serial links opened with OPEN_SERIAL under
+SERIAL_DEVICE_ID = 'serial'
+
+# Finished results kept for polling by request ID
+RESULT_CACHE_SIZE = 1000
+
+# Seconds to wait when asking the gateway about a request this worker did not submit
+REMOTE_POLL_TIMEOUT = 1.0
+
+RECONNECT_DELAY = 2
+
+# Messages queued for the gateway before new ones are refused
+OUTBOX_SIZE = 1000
+
+# Seconds between warnings while the gateway cannot be reached
+WARNING_INTERVAL = 60
+
+
+class _Waiter:
+    """A response a caller may be waiting for."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+
+
+class HardwareClient:
+    """Request/response client for the asyncio hardware gateway.
+
+    The gateway (``app/hardware/websocket_server.py``) owns the serial or
+    WebSocket link to the controller; web workers never touch the device.
+    Requests are put on a local queue and sent by a background thread over
+    one WebSocket connection, and responses are matched back by request
+    ID. ``submit`` and ``result`` never block on the device, so a slow
+    scan only occupies the gateway.
+
+    The client subscribes to status updates of every reader; ``devices``
+    holds the latest status per device ID, kept current by merging the
+    gateway's status deltas into its snapshot. Messages use the most
+    compact encoding both sides support. With a ``token``, each connection
+    first authenticates with it, as the gateway requires when it is not
+    listening on loopback only.
+
+    The outgoing queue is bounded. Notifications are dropped while the
+    gateway is not connected, since its periodic index reload picks up
+    whatever they carried; requests that do not fit fail straight away.
+    """
+
+    def __init__(self, url: str = DEFAULT_SERVICE_URL, token: Optional[str] = None):
+        self.url = url
+        self.token = token
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self._outbox = queue.Queue(OUTBOX_SIZE)
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, _Waiter] = {}
+        self._results = OrderedDict()
+        self._connection = None
+        self._thread = None
+        self._pid = None
+        self._stopped = False
+        self._warned_at = 0.0
+        self.dropped = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._connection is not None
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        """Combined status: whether any reader is connected and ready."""
+        devices = list(self.devices.values())
+        return {
+            'controller': any(device.get('controller') for device in devices),
+            'fingerprint': any(device.get('fingerprint') for device in devices),
+            'rfid': any(device.get('rfid') for device in devices),
+            'devices': len(devices)
+        }
+
+    def start(self):
+        """Start the connection thread, once per process."""
+        pid = os.getpid()
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='hardware-client', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Close the connection and stop the connection thread."""
+        self._stopped = True
+        connection = self._connection
+        if connection is not None:
+            connection.close()
+
+    def _run(self):
+        """Keep a connection to the gateway open, reconnecting on failure."""
+        from websockets.sync.client import connect
+
+        while not self._stopped:
+            try:
+                with connect(self.url, open_timeout=5, subprotocols=SUBPROTOCOLS) as connection:
+                    self._connection = connection
+                    codec = codec_for(connection.subprotocol)
+                    logger.info(f"Connected to hardware gateway at {self.url} ({codec.name})")
+                    stop = object()
+                    sender = threading.Thread(target=self._send_loop, args=(connection, codec, stop),
+                                              daemon=True)
+                    if self.token:
+                        connection.send(codec.encode({'type': 'auth', 'token': self.token}))
+                    sender.start()
+                    connection.send(codec.encode({'type': 'subscribe', 'all': True}))
+                    connection.send(codec.encode({'type': 'status'}))
+                    try:
+                        for message in connection:
+                            self._handle(message, codec)
+                    finally:
+                        try:
+                            self._outbox.put_nowait(stop)
+                        except queue.Full:
+                            pass  # the sender fails on the closed connection instead
+            except Exception as e:
+                # Once a minute, not on every reconnect attempt, while the gateway is down
+                if not self._stopped and time.monotonic() - self._warned_at > WARNING_INTERVAL:
+                    self._warned_at = time.monotonic()
+                    logger.warning(f"Hardware gateway connection failed: {e}")
+            finally:
+                self._connection = None
+            if not self._stopped:
+                time.sleep(RECONNECT_DELAY)
+
+    def _send_loop(self, connection, codec, stop):
+        """Drain the local queue onto the connection."""
+        while True:
+            item = self._outbox.get()
+            if item is stop:
+                return
+            if not isinstance(item, dict):
+                continue  # stop marker of an earlier connection
+            try:
+                connection.send(codec.encode(item))
+            except Exception:
+                # Keep the message for the next connection
+                try:
+                    self._outbox.put_nowait(item)
+                except queue.Full:
+                    pass
+                return
+
+    def _handle(self, message, codec):
+        try:
+            data = decode(message, codec)
+        except ValueError:
+            logger.error("Invalid message received from hardware gateway")
+            return
+
+        if data.get('type') == 'devices':
+            self.devices = {device['device_id']: device for device in data['devices']}
+            return
+        if data.get('type') == 'status':
+            # Only the fields that changed
+            self.devices.setdefault(data['device_id'], {}).update(data)
+            return
+        if data.get('type') != 'response':
+            return
+
+        request_id = data.get('id')
+        with self._lock:
+            if data.get('state') == 'done':
+                self._results[request_id] = data['result']
+                while len(self._results) > RESULT_CACHE_SIZE:
+                    self._results.popitem(last=False)
+            waiter = self._waiters.pop(request_id, None)
+        if waiter is not None:
+            waiter.response = data
+            waiter.event.set()
+
+    def _enqueue(self, message, request_id):
+        waiter = _Waiter()
+        with self._lock:
+            self._waiters[request_id] = waiter
+        self.start()
+        try:
+            self._outbox.put_nowait(message)
+        except queue.Full:
+            # Answer at once rather than leave the caller waiting out its timeout
+            result = {'status': 'error', 'message': 'Hardware gateway queue is full'}
+            with self._lock:
+                self._waiters.pop(request_id, None)
+                self._results[request_id] = result
+            waiter.response = {'type': 'response', 'id': request_id, 'state': 'done', 'result': result}
+            waiter.event.set()
+        return waiter
+
+    def notify(self, message: Dict[str, Any]):
+        """Send a message to the gateway without waiting for a reply.
+
+        Dropped while the gateway is not connected or the queue is full.
+        """
+        self.start()
+        if not self.connected:
+            self.dropped += 1
+            return
+        try:
+            self._outbox.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def submit(self, command: str, timeout: Optional[float] = None, device_id: Optional[str] = None,
+               room: Optional[str] = None, **params) -> str:
+        """Queue a command for the controller without waiting.
+
+        Args:
+            command: Command name understood by the controller
+            timeout: Seconds the gateway waits for the device
+            device_id: Reader to send the command to
+            room: Send to the reader in this room if no device_id is given
+            **params: Command parameters
+
+        Returns:
+            The request ID to pass to :meth:`result`
+        """
+        request_id = uuid.uuid4().hex
+        self._enqueue({
+            'type': 'request',
+            'id': request_id,
+            'command': command,
+            'params': params,
+            'timeout': timeout,
+            'device_id': device_id,
+            'room': room
+        }, request_id)
+        return request_id
+
+    def result(self, request_id: str) -> Dict[str, Any]:
+        """Get the state of a submitted command.
+
+        Results of commands submitted by another worker process are fetched
+        from the gateway, waiting at most ``REMOTE_POLL_TIMEOUT`` seconds.
+
+        Returns:
+            Dict with ``state`` ('done', 'pending' or 'unknown') and, when
+            done, ``result``
+        """
+        with self._lock:
+            if request_id in self._results:
+                return {'state': 'done', 'result': self._results[request_id]}
+            if request_id in self._waiters:
+                return {'state': 'pending'}
+
+        waiter = self._enqueue({'type': 'result', 'id': request_id}, request_id)
+        if not waiter.event.wait(REMOTE_POLL_TIMEOUT):
+            with self._lock:
+                self._waiters.pop(request_id, None)
+            return {'state': 'pending' if self.connected else 'unknown'}
+        return {key: value for key, value in waiter.response.items() if key in ('state', 'result')}
+
+    def request(self, command: str, timeout: float = 30, device_id: Optional[str] = None,
+                room: Optional[str] = None, **params) -> Dict[str, Any]:
+        """Send a command and wait for its result.
+
+        Only the calling thread waits; the device link is held by the
+        gateway for the duration of the command. ``device_id`` and ``room``
+        select the reader as in :meth:`submit`.
+
+        Returns:
+            The controller's result dict, with at least a ``status`` key
+        """
+        request_id = uuid.uuid4().hex
+        waiter = self._enqueue({
+            'type': 'request',
+            'id': request_id,
+            'command': command,
+            'params': params,
+            'timeout': timeout,
+            'device_id': device_id,
+            'room': room
+        }, request_id)
+        if not waiter.event.wait(timeout + REMOTE_POLL_TIMEOUT):
+            with self._lock:
+                self._waiters.pop(request_id, None)
+            return {'status': 'error', 'message': 'Timed out waiting for hardware gateway'}
+        return waiter.response['result']
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_hardware_client(url: Optional[str] = None) -> HardwareClient:
+    """Get the process-wide hardware gateway client.
+
+    Args:
+        url: Gateway URL; defaults to ``HARDWARE_SERVICE_URL`` from the app
+            config or environment
+
+    The client authenticates with ``HARDWARE_GATEWAY_TOKEN``, likewise.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            token = None
+            try:
+                from flask import current_app
+                url = url or current_app.config.get('HARDWARE_SERVICE_URL')
+                token = current_app.config.get('HARDWARE_GATEWAY_TOKEN')
+            except RuntimeError:
+                pass
+            _client = HardwareClient(url or os.environ.get('HARDWARE_SERVICE_URL', DEFAULT_SERVICE_URL),
+                                     token or os.environ.get('HARDWARE_GATEWAY_TOKEN'))
+        return _client
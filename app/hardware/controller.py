@@ -1,77 +1,63 @@
 """Hardware controller module for managing fingerprint and RFID devices."""
 import logging
-import serial
-import time
 import os
-from threading import Lock
 from typing import Optional, Dict, Any, Tuple
-from ..models import User
+from ..models import User, FingerprintSlot
 from ..extensions import db
+from .client import DEFAULT_SERVICE_URL, get_hardware_client
 
 logger = logging.getLogger(__name__)
 
 class HardwareController:
-    """Controller for managing fingerprint and RFID hardware."""
+    """Controller for managing fingerprint and RFID hardware.
+
+    The device itself is owned by the hardware gateway process
+    (``run_hardware_server.py``); this controller sends it commands
+    through a :class:`HardwareClient`, so web workers never hold the
+    serial port.
+    """
     
-    def __init__(self, port: str = 'COM3', baudrate: int = 9600, simulation_mode: bool = False):
+    def __init__(self, service_url: str = DEFAULT_SERVICE_URL, command_timeout: float = 30,
+                 simulation_mode: bool = False, device_id: Optional[str] = None):
         """Initialize the hardware controller.
         
         Args:
-            port: Serial port for the hardware
-            baudrate: Baud rate for serial communication
+            service_url: WebSocket URL of the hardware gateway
+            command_timeout: Seconds to wait for a scan to complete
             simulation_mode: Flag to enable simulation mode
+            device_id: Reader used for scans; may be omitted when the
+                gateway has a single reader
         """
-        self.port = port
-        self.baudrate = baudrate
-        self.serial = None
-        self.lock = Lock()
-        self.connected = False
+        self.service_url = service_url
+        self.command_timeout = command_timeout
+        self.device_id = device_id
+        self.client = get_hardware_client(service_url)
         self.last_error = None
         self.simulation_mode = simulation_mode
         
         if not self.simulation_mode:
-            try:
-                self.connect()
-            except Exception as e:
-                logger.error(f"Failed to initialize hardware: {e}")
-                self.last_error = str(e)
+            self.connect()
+
+    @property
+    def connected(self) -> bool:
+        return self.simulation_mode or self.client.connected
     
     def connect(self) -> bool:
-        """Establish connection with the hardware."""
+        """Start connecting to the hardware gateway in the background."""
         if self.simulation_mode:
             logger.info("Running in simulation mode - hardware connection simulated")
-            self.connected = True
             return True
             
-        try:
-            with self.lock:
-                if not self.connected:
-                    self.serial = serial.Serial(self.port, self.baudrate, timeout=1)
-                    time.sleep(2)  # Wait for hardware initialization
-                    self.connected = True
-                    logger.info("Successfully connected to hardware")
-                return True
-        except Exception as e:
-            logger.error(f"Failed to connect to hardware: {e}")
-            self.last_error = str(e)
-            self.connected = False
-            return False
+        self.client.start()
+        return self.client.connected
     
     def disconnect(self):
-        """Disconnect from the hardware."""
+        """Disconnect from the hardware gateway."""
         if self.simulation_mode:
             logger.info("Running in simulation mode - hardware disconnection simulated")
-            self.connected = False
             return
             
-        try:
-            with self.lock:
-                if self.serial and self.serial.is_open:
-                    self.serial.close()
-                self.connected = False
-        except Exception as e:
-            logger.error(f"Error disconnecting from hardware: {e}")
-            self.last_error = str(e)
+        self.client.stop()
     
     def get_status(self) -> Dict[str, Any]:
         """Get the current status of the hardware.
@@ -81,18 +67,44 @@ class HardwareController:
         """
         if self.simulation_mode:
             return {
-                'connected': self.connected,
+                'connected': True,
                 'port': 'SIMULATED',
                 'mode': 'simulation',
                 'last_error': self.last_error
             }
             
         return {
-            'connected': self.connected,
-            'port': self.port,
+            'connected': self.client.connected,
+            'controller': self.client.status.get('controller', False),
+            'fingerprint': self.client.status.get('fingerprint', False),
+            'rfid': self.client.status.get('rfid', False),
+            'devices': list(self.client.devices.values()),
+            'port': self.service_url,
             'mode': 'hardware',
             'last_error': self.last_error
         }
+
+    def _scan(self, command: str, field: str) -> Tuple[bool, Optional[str], str]:
+        """Run a scan command on the gateway and extract its value.
+
+        Serial controllers answer with a ``SUCCESS:<value>`` line; WebSocket
+        controllers answer with an event carrying ``field``.
+        """
+        success, value, message, _ = self._scan_device(command, field)
+        return success, value, message
+
+    def _scan_device(self, command: str, field: str) -> Tuple[bool, Optional[str], str, Optional[str]]:
+        """Like :meth:`_scan`, also returning the ID of the reader that answered."""
+        result = self.client.request(command, timeout=self.command_timeout, device_id=self.device_id)
+        device_id = result.get('device_id', self.device_id)
+        if 'raw' in result:
+            response = result['raw']
+            if not response.startswith('SUCCESS'):
+                return False, None, response or result.get('message', 'No response from device'), device_id
+            return True, response.split(':', 1)[1], '', device_id
+        if result.get('status') not in ('success', 'card_detected'):
+            return False, None, result.get('message', 'Scan failed'), device_id
+        return True, result.get(field), '', device_id
     
     def scan_fingerprint(self) -> Tuple[bool, Optional[bytes], str]:
         """Scan a fingerprint.
@@ -105,26 +117,42 @@ class HardwareController:
             return True, b'SIMULATED_FINGERPRINT_TEMPLATE', "Fingerprint scanned successfully"
         
         try:
-            with self.lock:
-                if not self.connected:
-                    if not self.connect():
-                        return False, None, "Hardware not connected"
-                
-                # Send fingerprint scan command
-                self.serial.write(b'SCAN_FINGERPRINT\n')
-                response = self.serial.readline().decode().strip()
-                
-                if response.startswith('SUCCESS'):
-                    # Extract template data from response
-                    template_data = bytes.fromhex(response.split(':')[1])
-                    return True, template_data, "Fingerprint scanned successfully"
-                else:
-                    return False, None, response
+            success, template, message = self._scan('SCAN_FINGERPRINT', 'template')
+            if not success:
+                return False, None, message
+            return True, bytes.fromhex(template), "Fingerprint scanned successfully"
         except Exception as e:
             logger.error(f"Error scanning fingerprint: {e}")
             self.last_error = str(e)
             return False, None, f"Error scanning fingerprint: {e}"
     
+    def identify_user(self) -> Tuple[bool, Optional[int], str]:
+        """Identify whoever is on the fingerprint sensor.
+
+        The reader searches its own template library (1:N) and returns the
+        matching slot, which the slot table maps to a user. No templates
+        are read from the database.
+
+        Returns:
+            Tuple of (success, user_id, message)
+        """
+        if self.simulation_mode:
+            logger.info("Running in simulation mode - fingerprint identification simulated")
+            return False, None, "Identification is not available in simulation mode"
+
+        try:
+            success, slot, message, device_id = self._scan_device('IDENTIFY_FINGERPRINT', 'slot')
+            if not success:
+                return False, None, message
+            user_id = FingerprintSlot.user_for(device_id, int(slot))
+            if user_id is None:
+                return False, None, "Fingerprint is not enrolled"
+            return True, user_id, "Fingerprint identified"
+        except Exception as e:
+            logger.error(f"Error identifying fingerprint: {e}")
+            self.last_error = str(e)
+            return False, None, f"Error identifying fingerprint: {e}"
+
     def scan_rfid(self) -> Tuple[bool, Optional[str], str]:
         """Scan an RFID card.
         
@@ -136,21 +164,10 @@ class HardwareController:
             return True, 'SIMULATED_RFID_CARD_ID', "RFID card scanned successfully"
         
         try:
-            with self.lock:
-                if not self.connected:
-                    if not self.connect():
-                        return False, None, "Hardware not connected"
-                
-                # Send RFID scan command
-                self.serial.write(b'SCAN_RFID\n')
-                response = self.serial.readline().decode().strip()
-                
-                if response.startswith('SUCCESS'):
-                    # Extract card ID from response
-                    card_id = response.split(':')[1]
-                    return True, card_id, "RFID card scanned successfully"
-                else:
-                    return False, None, response
+            success, card_id, message = self._scan('SCAN_RFID', 'card_id')
+            if not success:
+                return False, None, message
+            return True, card_id, "RFID card scanned successfully"
         except Exception as e:
             logger.error(f"Error scanning RFID card: {e}")
             self.last_error = str(e)
@@ -213,8 +230,8 @@ class HardwareController:
             if not user:
                 return False, "User not found"
             
-            # Step 1: Scan fingerprint
-            fp_success, fp_template, fp_message = self.scan_fingerprint()
+            # Step 1: Identify the fingerprint on the sensor
+            fp_success, identified_id, fp_message = self.identify_user()
             if not fp_success:
                 return False, f"Fingerprint verification failed: {fp_message}"
             
@@ -223,8 +240,8 @@ class HardwareController:
             if not rfid_success:
                 return False, f"RFID verification failed: {rfid_message}"
             
-            # Verify fingerprint template
-            if fp_template.hex() != user.fingerprint_template:
+            # Verify fingerprint identity
+            if identified_id != user.id:
                 return False, "Fingerprint does not match"
             
             # Verify RFID card
@@ -241,20 +258,23 @@ class HardwareController:
 # Global hardware controller instance
 controller = None
 
-def init_hardware(port: str = 'COM3', baudrate: int = 9600) -> None:
+def init_hardware(service_url: Optional[str] = None, command_timeout: float = 30,
+                  device_id: Optional[str] = None) -> None:
     """Initialize the global hardware controller.
     
     Args:
-        port: Serial port for the hardware
-        baudrate: Baud rate for serial communication
+        service_url: WebSocket URL of the hardware gateway
+        command_timeout: Seconds to wait for a scan to complete
+        device_id: Reader used for enrollment and verification scans
     """
     global controller
+    service_url = service_url or os.environ.get('HARDWARE_SERVICE_URL', DEFAULT_SERVICE_URL)
     try:
-        controller = HardwareController(port, baudrate)
+        controller = HardwareController(service_url, command_timeout, device_id=device_id)
         logger.info("Hardware controller initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize hardware controller: {e}")
-        controller = HardwareController(port, baudrate, simulation_mode=True)
+        controller = HardwareController(service_url, command_timeout, simulation_mode=True, device_id=device_id)
         logger.info("Falling back to simulation mode")
 
 def get_hardware_controller() -> Optional[HardwareController]:
@@ -266,7 +286,10 @@ def get_hardware_controller() -> Optional[HardwareController]:
     global controller
     if controller is None:
         try:
-            init_hardware()
+            from flask import current_app
+            init_hardware(current_app.config.get('HARDWARE_SERVICE_URL'),
+                          current_app.config.get('HARDWARE_COMMAND_TIMEOUT', 30),
+                          current_app.config.get('HARDWARE_DEVICE_ID'))
         except Exception as e:
             logger.error(f"Error getting hardware controller: {e}")
             return None
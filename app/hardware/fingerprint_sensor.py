@@ -3,6 +3,21 @@ import time
 from typing import Optional, Tuple
 import hashlib
 
+# R30x/AS608 packet protocol
+PACKET_HEADER = b'\xef\x01'
+DEFAULT_ADDRESS = b'\xff\xff\xff\xff'
+COMMAND_PACKET = 0x01
+ACK_PACKET = 0x07
+GEN_IMAGE = 0x01
+IMAGE_TO_TZ = 0x02
+SEARCH = 0x04
+OK = 0x00
+NO_FINGER = 0x02
+NOT_FOUND = 0x09
+
+# Templates searched by default; covers the largest common libraries
+DEFAULT_LIBRARY_SIZE = 1000
+
 class FingerprintSensor:
     def __init__(self, port: str = 'COM4', baudrate: int = 57600):
         """Initialize fingerprint sensor on specified port"""
@@ -82,13 +97,64 @@ class FingerprintSensor:
         result = self.capture_fingerprint(timeout)
         if result:
             captured_template, _ = result
-            # Compare templates using sensor's matching algorithm
-            # This is a simplified example - actual implementation would use
-            # the sensor's specific matching commands
+            # Byte comparison of raw reads; use identify() and the slot
+            # table for matching on the sensor
             return captured_template == stored_template
         
         return False
 
+    def _command(self, instruction: int, params: bytes = b'') -> Optional[bytes]:
+        """Send a command packet and return the acknowledgement payload.
+
+        Returns:
+            bytes: Confirmation code followed by any result data, or None
+        """
+        length = len(params) + 3  # instruction, params, checksum
+        body = bytes([COMMAND_PACKET]) + length.to_bytes(2, 'big') + bytes([instruction]) + params
+        checksum = (sum(body) & 0xFFFF).to_bytes(2, 'big')
+        self.serial.write(PACKET_HEADER + DEFAULT_ADDRESS + body + checksum)
+
+        header = self.serial.read(9)
+        if len(header) != 9 or header[:2] != PACKET_HEADER or header[6] != ACK_PACKET:
+            return None
+        payload = self.serial.read(int.from_bytes(header[7:9], 'big'))
+        return payload[:-2] if len(payload) >= 3 else None
+
+    def identify(self, timeout: int = 10, library_size: int = DEFAULT_LIBRARY_SIZE) -> Optional[Tuple[int, int]]:
+        """Identify a finger with the sensor's own 1:N library search.
+
+        Args:
+            timeout (int): Maximum time to wait for a finger in seconds
+            library_size (int): Number of library slots to search
+
+        Returns:
+            Tuple[int, int]: (slot, match score) of the matching template,
+                             None if no finger or no match
+        """
+        if not self.connected:
+            if not self.connect():
+                return None
+
+        start_time = time.time()
+        while (time.time() - start_time) < timeout:
+            reply = self._command(GEN_IMAGE)
+            if reply is None:
+                return None
+            if reply[0] == OK:
+                break
+            time.sleep(0.1)
+        else:
+            return None
+
+        reply = self._command(IMAGE_TO_TZ, bytes([1]))
+        if reply is None or reply[0] != OK:
+            return None
+
+        reply = self._command(SEARCH, bytes([1]) + (0).to_bytes(2, 'big') + library_size.to_bytes(2, 'big'))
+        if reply is None or reply[0] != OK or len(reply) < 5:
+            return None
+        return int.from_bytes(reply[1:3], 'big'), int.from_bytes(reply[3:5], 'big')
+
     def __enter__(self):
         """Context manager entry"""
         self.connect()
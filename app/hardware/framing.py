@@ -0,0 +1,107 @@
+"""Wire encodings for the hardware gateway's WebSocket traffic.
+
+JSON text frames are always understood. A peer that wants a compact
+binary encoding offers it as a WebSocket subprotocol and the gateway
+picks the first one it supports, in its own order of preference. Binary
+frames are decoded with the connection's negotiated codec and text
+frames as JSON, so a peer may still send JSON on a binary connection.
+
+MessagePack (``msgpack``) and CBOR (``cbor2``) are optional; without
+them every connection falls back to JSON.
+"""
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class Codec:
+    """Encode and decode messages for one subprotocol."""
+
+    name = None
+    binary = False
+
+    @property
+    def subprotocol(self):
+        return f"attendance.{self.name}"
+
+    def encode(self, message):
+        raise NotImplementedError
+
+    def decode(self, payload):
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    name = 'json'
+
+    def encode(self, message):
+        return json.dumps(message)
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+
+class MsgPackCodec(Codec):
+    name = 'msgpack'
+    binary = True
+
+    def encode(self, message):
+        return msgpack.packb(message)
+
+    def decode(self, payload):
+        try:
+            return msgpack.unpackb(payload)
+        except Exception as e:
+            raise ValueError(f"Invalid MessagePack: {e}") from e
+
+
+class CborCodec(Codec):
+    name = 'cbor'
+    binary = True
+
+    def encode(self, message):
+        return cbor2.dumps(message)
+
+    def decode(self, payload):
+        try:
+            return cbor2.loads(payload)
+        except Exception as e:
+            raise ValueError(f"Invalid CBOR: {e}") from e
+
+
+JSON = JsonCodec()
+
+# Supported codecs in order of preference; JSON is always last
+CODECS = [codec for codec, module in ((MsgPackCodec(), msgpack), (CborCodec(), cbor2))
+          if module is not None] + [JSON]
+
+SUBPROTOCOLS = [codec.subprotocol for codec in CODECS]
+
+
+def codec_for(subprotocol):
+    """Codec for a negotiated subprotocol; JSON when none was agreed."""
+    for codec in CODECS:
+        if codec.subprotocol == subprotocol:
+            return codec
+    return JSON
+
+
+def decode(payload, codec):
+    """Decode a frame: binary with the connection's codec, text as JSON.
+
+    Raises:
+        ValueError: If the payload is not a valid message
+    """
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        if not codec.binary:
+            raise ValueError("Binary frame on a JSON connection")
+        return codec.decode(bytes(payload))
+    return json.loads(payload)
@@ -0,0 +1,137 @@
+"""Change notifications that keep the hardware gateway's tap index current."""
+import logging
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from app.extensions import db
+from app.models import User, CourseStudent, Lecture
+from .client import get_hardware_client
+
+logger = logging.getLogger(__name__)
+
+# Lecture columns the tap index depends on
+LECTURE_FIELDS = ('course_id', 'room', 'date', 'start_time', 'end_time', 'status', 'is_active')
+
+# Session.info key holding changes flushed in the current transaction
+CHANGES_KEY = 'tap_index_changes'
+
+
+def _changed(obj, *fields):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def card_change(user, deleted=False):
+    """Describe a user's card assignment for the tap index."""
+    return {
+        'kind': 'card',
+        'user_id': user.id,
+        'card_id': user.rfid_card_id,
+        'active': bool(user.is_active) and not deleted
+    }
+
+
+def enrollment_change(enrollment, enrolled=True):
+    return {
+        'kind': 'enrollment',
+        'course_id': enrollment.course_id,
+        'student_id': enrollment.student_id,
+        'enrolled': enrolled
+    }
+
+
+def lecture_change(lecture, deleted=False):
+    if deleted:
+        return {'kind': 'lecture', 'id': lecture.id, 'deleted': True}
+    return {
+        'kind': 'lecture',
+        'id': lecture.id,
+        'course_id': lecture.course_id,
+        'room': lecture.room,
+        'date': lecture.date.isoformat() if lecture.date else None,
+        'start_time': lecture.start_time.isoformat() if lecture.start_time else None,
+        'end_time': lecture.end_time.isoformat() if lecture.end_time else None,
+        'status': lecture.status,
+        'is_active': lecture.is_active is not False
+    }
+
+
+def collect_changes(session):
+    """Changes to cards, enrollments and lectures in the session's pending flush."""
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, User) and obj.rfid_card_id is not None:
+            changes.append(card_change(obj))
+        elif isinstance(obj, CourseStudent):
+            changes.append(enrollment_change(obj))
+        elif isinstance(obj, Lecture):
+            changes.append(lecture_change(obj))
+    for obj in session.dirty:
+        if isinstance(obj, User) and _changed(obj, 'rfid_card_id', 'is_active'):
+            changes.append(card_change(obj))
+        elif isinstance(obj, Lecture) and _changed(obj, *LECTURE_FIELDS):
+            changes.append(lecture_change(obj))
+    for obj in session.deleted:
+        if isinstance(obj, User) and obj.rfid_card_id is not None:
+            changes.append(card_change(obj, deleted=True))
+        elif isinstance(obj, CourseStudent):
+            changes.append(enrollment_change(obj, enrolled=False))
+        elif isinstance(obj, Lecture):
+            changes.append(lecture_change(obj, deleted=True))
+    return changes
+
+
+class TapIndexNotifier:
+    """Send committed card, enrollment and lecture changes to the gateway.
+
+    Changes are collected at flush time and sent only once the transaction
+    commits, as one ``index`` message per transaction. Sending never
+    blocks the request; the gateway also reloads its index periodically in
+    case a notification is lost.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize with Flask app."""
+        self.app = app
+        app.config.setdefault('HARDWARE_INDEX_NOTIFY', True)
+        app.extensions['tap_index_notifier'] = self
+        if app.config['HARDWARE_INDEX_NOTIFY']:
+            _register_session_listeners()
+
+
+_listeners_registered = False
+
+
+def _register_session_listeners():
+    """Collect and send tap index changes on every session (once per process)."""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    _listeners_registered = True
+
+    @event.listens_for(db.session, 'after_flush')
+    def after_flush(session, flush_context):
+        changes = collect_changes(session)
+        if changes:
+            session.info.setdefault(CHANGES_KEY, []).extend(changes)
+
+    @event.listens_for(db.session, 'after_commit')
+    def after_commit(session):
+        changes = session.info.pop(CHANGES_KEY, None)
+        if not changes or not has_app_context() or not current_app.config.get('HARDWARE_INDEX_NOTIFY'):
+            return
+        try:
+            get_hardware_client().notify({'type': 'index', 'changes': changes})
+        except Exception as e:
+            logger.error(f"Error notifying hardware gateway of index changes: {e}")
+
+    @event.listens_for(db.session, 'after_rollback')
+    def after_rollback(session):
+        session.info.pop(CHANGES_KEY, None)
+
+
+tap_index_notifier = TapIndexNotifier()
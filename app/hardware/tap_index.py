@@ -0,0 +1,255 @@
+"""In-memory index the hardware gateway uses to decide taps without the database."""
+import logging
+import threading
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import create_engine, text
+
+logger = logging.getLogger('TapIndex')
+
+# Days of lectures on each side of today kept in the index
+SCHEDULE_DAYS = 1
+
+# Statuses of a lecture that was being held, for taps buffered by a reader
+HELD_STATUSES = ('ongoing', 'completed')
+
+TapDecision = namedtuple('TapDecision', 'accepted reason user_id lecture_id')
+
+
+class Bitset:
+    """Set of non-negative integers (user IDs) stored one bit each."""
+
+    __slots__ = ('bits',)
+
+    def __init__(self, values=()):
+        self.bits = bytearray()
+        for value in values:
+            self.add(value)
+
+    def add(self, value):
+        index = value >> 3
+        if index >= len(self.bits):
+            self.bits.extend(bytes(index + 1 - len(self.bits)))
+        self.bits[index] |= 1 << (value & 7)
+
+    def discard(self, value):
+        index = value >> 3
+        if index < len(self.bits):
+            self.bits[index] &= ~(1 << (value & 7)) & 0xFF
+
+    def __contains__(self, value):
+        index = value >> 3
+        return index < len(self.bits) and bool(self.bits[index] & (1 << (value & 7)))
+
+    def __len__(self):
+        return sum(bin(byte).count('1') for byte in self.bits)
+
+
+class LectureSlot:
+    """The fields of a lecture needed to tell whether it is ongoing in a room."""
+
+    __slots__ = ('id', 'course_id', 'room', 'date', 'start_time', 'end_time', 'status')
+
+    def __init__(self, id, course_id, room, date, start_time, end_time, status):
+        self.id = id
+        self.course_id = course_id
+        self.room = room
+        self.date = _as_date(date)
+        self.start_time = _as_time(start_time)
+        self.end_time = _as_time(end_time)
+        self.status = status
+
+    def is_ongoing(self, now):
+        # Same rule as Lecture.get_ongoing_lectures
+        return (self.status == 'ongoing' and self.date == now.date()
+                and self.start_time <= now.time() <= self.end_time)
+
+    def was_held(self, when):
+        """Whether the lecture was under way at ``when``, even if it has since ended."""
+        return (self.status in HELD_STATUSES and self.date == when.date()
+                and self.start_time <= when.time() <= self.end_time)
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _as_time(value):
+    return time.fromisoformat(value) if isinstance(value, str) else value
+
+
+class TapIndex:
+    """Card, lecture and enrollment lookups for deciding taps in memory.
+
+    Holds card_id -> user_id, room -> lectures around today, and for each
+    course a bitset of enrolled student IDs. ``load`` reads them from the
+    database once; after that ``apply`` keeps them current from change
+    notifications sent by the web app (see ``app/hardware/notifications.py``),
+    and a periodic reload catches anything missed.
+    """
+
+    def __init__(self, database_url=None):
+        if database_url and database_url.startswith('postgres://'):
+            database_url = database_url.replace('postgres://', 'postgresql://', 1)
+        self.database_url = database_url
+        self.cards = {}
+        self.user_cards = {}
+        self.enrollments = defaultdict(Bitset)
+        self.lectures = {}
+        self.rooms = defaultdict(dict)
+        self.loaded_at = None
+        self._lock = threading.Lock()
+        self._replay = None
+        self._engine = None
+
+    def load(self):
+        """Read the whole index from the database and swap it in.
+
+        Blocking; the gateway runs it on a worker thread. Changes applied
+        while it runs are replayed on top of the fresh data.
+        """
+        if self._engine is None:
+            self._engine = create_engine(self.database_url)
+        with self._lock:
+            self._replay = []
+
+        today = datetime.utcnow().date()
+        try:
+            with self._engine.connect() as conn:
+                cards = {
+                    row.rfid_card_id: row.id
+                    for row in conn.execute(text(
+                        "SELECT id, rfid_card_id FROM users "
+                        "WHERE rfid_card_id IS NOT NULL AND is_active = :active"
+                    ), {'active': True})
+                }
+                enrollments = defaultdict(Bitset)
+                for row in conn.execute(text("SELECT course_id, student_id FROM course_students")):
+                    enrollments[row.course_id].add(row.student_id)
+                lectures = [
+                    LectureSlot(*row)
+                    for row in conn.execute(text(
+                        "SELECT id, course_id, room, date, start_time, end_time, status FROM lectures "
+                        "WHERE date BETWEEN :start AND :end AND is_active = :active"
+                    ), {
+                        'start': today - timedelta(days=SCHEDULE_DAYS),
+                        'end': today + timedelta(days=SCHEDULE_DAYS),
+                        'active': True
+                    })
+                ]
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+
+        with self._lock:
+            self.cards = cards
+            self.user_cards = {user_id: card_id for card_id, user_id in cards.items()}
+            self.enrollments = enrollments
+            self.lectures = {}
+            self.rooms = defaultdict(dict)
+            for lecture in lectures:
+                self._put_lecture(lecture)
+            replay, self._replay = self._replay, None
+            for change in replay:
+                self._apply(change)
+            self.loaded_at = datetime.utcnow()
+
+        logger.info(f"Tap index loaded: {len(cards)} cards, {len(enrollments)} courses, "
+                    f"{len(lectures)} lectures")
+
+    def _put_lecture(self, lecture):
+        self._drop_lecture(lecture.id)
+        self.lectures[lecture.id] = lecture
+        if lecture.room is not None:
+            self.rooms[lecture.room][lecture.id] = lecture
+
+    def _drop_lecture(self, lecture_id):
+        previous = self.lectures.pop(lecture_id, None)
+        if previous is not None and previous.room is not None:
+            room_lectures = self.rooms.get(previous.room)
+            if room_lectures is not None:
+                room_lectures.pop(lecture_id, None)
+                if not room_lectures:
+                    del self.rooms[previous.room]
+
+    def apply(self, changes):
+        """Apply change notifications from the web app.
+
+        Args:
+            changes: Dicts with a ``kind`` of 'card', 'enrollment' or 'lecture'
+        """
+        with self._lock:
+            for change in changes:
+                if self._replay is not None:
+                    self._replay.append(change)
+                self._apply(change)
+
+    def _apply(self, change):
+        kind = change.get('kind')
+        if kind == 'card':
+            user_id = change['user_id']
+            previous = self.user_cards.pop(user_id, None)
+            if previous is not None and self.cards.get(previous) == user_id:
+                del self.cards[previous]
+            if change.get('card_id') is not None and change.get('active', True):
+                self.cards[change['card_id']] = user_id
+                self.user_cards[user_id] = change['card_id']
+        elif kind == 'enrollment':
+            if change['enrolled']:
+                self.enrollments[change['course_id']].add(change['student_id'])
+            elif change['course_id'] in self.enrollments:
+                self.enrollments[change['course_id']].discard(change['student_id'])
+        elif kind == 'lecture':
+            if change.get('deleted') or not change.get('is_active', True):
+                self._drop_lecture(change['id'])
+            else:
+                self._put_lecture(LectureSlot(
+                    change['id'], change['course_id'], change.get('room'), change['date'],
+                    change['start_time'], change['end_time'], change.get('status')
+                ))
+        else:
+            logger.warning(f"Unknown tap index change: {change}")
+
+    def ongoing_lecture(self, room, now=None):
+        """Get the lecture ongoing in a room, or None."""
+        now = now or datetime.utcnow()
+        for lecture in self.rooms.get(room, {}).values():
+            if lecture.is_ongoing(now):
+                return lecture
+        return None
+
+    def lecture_at(self, room, when):
+        """Get the lecture that was held in a room at ``when``, or None."""
+        for lecture in self.rooms.get(room, {}).values():
+            if lecture.was_held(when):
+                return lecture
+        return None
+
+    def check_tap(self, card_id, room, now=None, buffered=False):
+        """Decide whether a card tapped in a room counts as attendance.
+
+        Args:
+            card_id: Card read by the reader
+            room: Room the reader is installed in
+            now: Time of the tap; defaults to the current time
+            buffered: The tap was buffered by the reader and is matched to
+                the lecture held at its time rather than one ongoing now
+
+        Returns:
+            TapDecision: ``reason`` is 'accepted', 'unknown_card',
+            'no_lecture' or 'not_enrolled'
+        """
+        user_id = self.cards.get(card_id)
+        if user_id is None:
+            return TapDecision(False, 'unknown_card', None, None)
+        if buffered:
+            lecture = self.lecture_at(room, now or datetime.utcnow())
+        else:
+            lecture = self.ongoing_lecture(room, now)
+        if lecture is None:
+            return TapDecision(False, 'no_lecture', user_id, None)
+        enrolled = self.enrollments.get(lecture.course_id)
+        if enrolled is None or user_id not in enrolled:
+            return TapDecision(False, 'not_enrolled', user_id, lecture.id)
+        return TapDecision(True, 'accepted', user_id, lecture.id)
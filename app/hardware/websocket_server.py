@@ -1,147 +1,965 @@
+import os
+import hmac
 import asyncio
 import websockets
 import json
+import uuid
+import time
+import argparse
+from collections import Counter, OrderedDict, defaultdict
 from datetime import datetime
 import logging
+from .framing import JSON, SUBPROTOCOLS, codec_for, decode
+from .tap_index import TapIndex
+from app.utils.dashboard_cache import dashboard_cache
+from app.utils.metrics import FANOUT_QUEUE_DEPTH, HARDWARE_COMMAND_DURATION
+from app.services.tap_ingestion import (
+    TapIngestionQueue, make_tap, DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('WebSocketServer')
 
-class HardwareServer:
-    def __init__(self):
-        self.clients = set()
-        self.esp8266_client = None
+# Seconds to wait for the device to finish a command
+DEFAULT_COMMAND_TIMEOUT = 30
+
+# Finished command results kept for clients polling by request ID
+RESULT_CACHE_SIZE = 1000
+
+# Messages queued for one web client before the oldest are dropped
+CLIENT_QUEUE_SIZE = 256
+
+# Event statuses that end a command; anything else is a progress update
+TERMINAL_STATUSES = {'success', 'error', 'failed', 'card_detected'}
+
+# Registry IDs for readers that do not send one and for the serial link
+DEFAULT_DEVICE_ID = "esp8266"
+SERIAL_DEVICE_ID = "serial"
+
+# Subscription topic that receives every event
+ALL_TOPIC = "*"
+
+# Seconds between full reloads of the tap index
+INDEX_REFRESH_INTERVAL = 3600
+
+# Buffered taps older than this (seconds) are matched to the lecture held
+# at their time and summarised to clients instead of published one by one
+LIVE_TAP_AGE = 60
+
+DEFAULT_JOURNAL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'instance', 'tap_journal.db'
+)
+
+
+# Hosts the gateway may listen on without tokens
+LOOPBACK_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+# Close code for connections that fail authentication
+POLICY_VIOLATION = 1008
+
+
+def token_matches(expected, given):
+    """Whether ``given`` is the configured token; anything passes when none is configured."""
+    if not expected:
+        return True
+    return isinstance(given, str) and hmac.compare_digest(expected.encode(), given.encode())
+
+
+def room_topic(room):
+    return f"room:{room}"
+
+
+def lecture_topic(lecture_id):
+    return f"lecture:{lecture_id}"
+
+
+def device_topic(device_id):
+    return f"device:{device_id}"
+
+
+class SerialDevice:
+    """Line-based serial link to a directly attached controller.
+
+    The blocking pyserial calls run on a worker thread so the event loop
+    keeps serving other clients. The line protocol has no request IDs, so
+    one command is in flight at a time.
+    """
+
+    def __init__(self, port, baudrate=9600, read_timeout=DEFAULT_COMMAND_TIMEOUT):
+        self.port = port
+        self.baudrate = baudrate
+        self.read_timeout = read_timeout
+        self.serial = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self):
+        return self.serial is not None and self.serial.is_open
+
+    async def open(self):
+        import serial
+
+        self.serial = await asyncio.to_thread(serial.Serial, self.port, self.baudrate,
+                                              timeout=self.read_timeout)
+        await asyncio.sleep(2)  # Wait for hardware initialization
+        logger.info(f"Serial device connected on {self.port}")
+
+    async def close(self):
+        if self.serial is not None:
+            await asyncio.to_thread(self.serial.close)
+            self.serial = None
+
+    async def request(self, command):
+        """Send one command line and wait for its response line."""
+        async with self._lock:
+            await asyncio.to_thread(self.serial.write, f"{command}\n".encode())
+            line = (await asyncio.to_thread(self.serial.readline)).decode().strip()
+        if not line:
+            return {'status': 'error', 'message': 'No response from device', 'raw': line}
+        return {'status': 'success', 'raw': line}
+
+
+class Device:
+    """A reader in the gateway's registry, linked by WebSocket or serial port."""
+
+    def __init__(self, device_id, room=None, websocket=None, serial=None, codec=JSON):
+        self.device_id = device_id
+        self.room = room
+        self.websocket = websocket
+        self.serial = serial
+        self.codec = codec
+        self.reset_status()
+        # Status fields as last published to clients
+        self.published = {}
+        # request_id -> future resolved by the device's terminal event
+        self.pending = OrderedDict()
+
+    @property
+    def connected(self):
+        if self.serial is not None:
+            return self.serial.connected
+        return self.websocket is not None
+
+    def update_status(self, status):
+        """Merge a status report; readers may send only the fields that changed."""
+        self.fingerprint_status = status.get("fingerprint", self.fingerprint_status)
+        self.rfid_status = status.get("rfid", self.rfid_status)
+        self.fingerprint_count = status.get("fingerprint_count", self.fingerprint_count)
+        self.rfid_count = status.get("rfid_count", self.rfid_count)
+
+    def reset_status(self):
         self.fingerprint_status = "Not Ready"
         self.rfid_status = "Not Ready"
         self.fingerprint_count = 0
         self.rfid_count = 0
 
-    async def register(self, websocket):
-        self.clients.add(websocket)
-        logger.info(f"New client connected. Total clients: {len(self.clients)}")
-
-    async def unregister(self, websocket):
-        self.clients.remove(websocket)
-        if websocket == self.esp8266_client:
-            self.esp8266_client = None
-            self.fingerprint_status = "Not Ready"
-            self.rfid_status = "Not Ready"
-            await self.broadcast_status()
-        logger.info(f"Client disconnected. Total clients: {len(self.clients)}")
-
-    async def broadcast_status(self):
-        """Broadcast current hardware status to all clients"""
-        status_message = {
-            "type": "status",
-            "controller": self.esp8266_client is not None,
+    def status_fields(self):
+        return {
+            "controller": self.connected,
             "fingerprint": self.fingerprint_status == "Ready",
             "rfid": self.rfid_status == "Ready",
+            "fingerprint_count": self.fingerprint_count,
+            "rfid_count": self.rfid_count
+        }
+
+    def status_message(self):
+        """Full status of the reader, as sent in snapshots."""
+        return {
+            "type": "status",
+            "device_id": self.device_id,
+            "room": self.room,
+            **self.status_fields(),
             "timestamp": datetime.now().isoformat()
         }
-        if self.clients:
-            await asyncio.gather(
-                *[client.send(json.dumps(status_message)) for client in self.clients]
-            )
 
-    async def handle_esp8266_message(self, message, websocket):
-        """Handle messages from ESP8266"""
+    def status_delta(self):
+        """Status message with only the fields changed since the last one published.
+
+        Returns:
+            dict: The message, or None if nothing changed
+        """
+        fields = self.status_fields()
+        changes = {key: value for key, value in fields.items()
+                   if key not in self.published or self.published[key] != value}
+        if not changes:
+            return None
+        self.published = fields
+        return {
+            "type": "status",
+            "device_id": self.device_id,
+            "room": self.room,
+            **changes,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    async def send_message(self, message):
+        await self.websocket.send(self.codec.encode(message))
+
+    async def send_command(self, command, params, request_id, timeout):
+        """Send a command to this device and wait for its result."""
+        if self.serial is not None:
+            return await asyncio.wait_for(self.serial.request(command), timeout)
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            await self.send_message({
+                "id": request_id,
+                "command": command,
+                "params": params or {},
+                "timestamp": datetime.now().isoformat()
+            })
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    def resolve_command(self, request_id, event_data):
+        """Complete the pending command an event belongs to, if it is terminal.
+
+        Returns:
+            bool: Whether the event answered a command
+        """
+        if event_data.get("status") not in TERMINAL_STATUSES:
+            return request_id is not None
+        if request_id is None:
+            # Firmware that does not echo IDs answers commands in order
+            request_id = next(iter(self.pending), None)
+        future = self.pending.get(request_id)
+        if future is not None and not future.done():
+            future.set_result(dict(event_data))
+            return True
+        return False
+
+    def fail_pending(self, message):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_result({'status': 'error', 'message': message})
+
+
+class ClientConnection:
+    """A web client with its own bounded send queue.
+
+    Messages are queued without waiting on the socket and written by a
+    per-client task, so a slow browser only delays itself. When its queue
+    is full the oldest message is dropped and counted, and the client is
+    flagged to be sent a fresh status snapshot.
+    """
+
+    def __init__(self, websocket, queue_size=CLIENT_QUEUE_SIZE, codec=JSON):
+        self.websocket = websocket
+        self.codec = codec
+        self.queue = asyncio.Queue(queue_size)
+        self.topics = set()
+        self.dropped = 0
+        # Set when a message was dropped; the status deltas it holds may be stale
+        self.resync = False
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def send(self, payload):
+        """Queue an encoded message for this client."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.resync = True
+        self.queue.put_nowait(payload)
+
+    def send_message(self, message):
+        """Encode a message for this client alone and queue it."""
+        self.send(self.codec.encode(message))
+
+    async def _write_loop(self):
         try:
-            data = json.loads(message)
-            if "device" in data and data["device"] == "esp8266":
-                if self.esp8266_client is None:
-                    self.esp8266_client = websocket
-                    logger.info("ESP8266 connected")
-                
-                if "status" in data:
-                    self.fingerprint_status = data["status"].get("fingerprint", "Not Ready")
-                    self.rfid_status = data["status"].get("rfid", "Not Ready")
-                    self.fingerprint_count = data["status"].get("fingerprint_count", 0)
-                    self.rfid_count = data["status"].get("rfid_count", 0)
-                    await self.broadcast_status()
-                
-                elif "event" in data:
-                    event_data = data["event"]
-                    event_type = event_data.get("type")
-                    
-                    if event_type == "fingerprint":
-                        await self.handle_fingerprint_event(event_data)
-                    elif event_type == "rfid":
-                        await self.handle_rfid_event(event_data)
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON received from ESP8266")
+            while True:
+                payload = await self.queue.get()
+                await self.websocket.send(payload)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def close(self):
+        self.writer.cancel()
+
+
+class HardwareServer:
+    """Gateway between web clients and a fleet of readers.
+
+    Readers register with a device ID and room; commands are routed to one
+    reader by ``device_id`` or ``room``. Web clients subscribe to rooms,
+    lectures or devices and only receive events for those.
+
+    With a :class:`TapIndex`, card taps are decided in memory and the reader
+    gets a ``tap_ack`` straight away. Accepted taps are handed to a
+    :class:`TapIngestionQueue`, which journals them before the ack and
+    writes them to the database in batches.
+
+    With ``device_token`` set, a reader's first message must carry it as
+    ``token``; with ``client_token`` set, a web client's first message must
+    be ``{"type": "auth", "token": ...}``. Connections failing either check
+    are closed before they can register, send taps, change the tap index
+    or run commands.
+    """
+
+    def __init__(self, serial_device=None, command_timeout=DEFAULT_COMMAND_TIMEOUT,
+                 client_queue_size=CLIENT_QUEUE_SIZE, serial_room=None, tap_index=None,
+                 ingestion=None, client_token=None, device_token=None):
+        self.command_timeout = command_timeout
+        self.client_token = client_token
+        self.device_token = device_token
+        self.client_queue_size = client_queue_size
+        self.tap_index = tap_index
+        self.ingestion = ingestion
+        # websocket -> ClientConnection for web clients
+        self.clients = {}
+        # device_id -> Device
+        self.devices = {}
+        # room -> device IDs of the readers installed there
+        self.rooms = defaultdict(set)
+        # topic -> subscribed ClientConnections
+        self.subscribers = defaultdict(set)
+        # room -> ID of the lecture held there, overriding the tap index
+        self.room_lectures = {}
+        # request_id -> device_id of commands in flight
+        self.pending = {}
+        self.results = OrderedDict()
+        self.dropped_disconnected = 0
+        if serial_device is not None:
+            self.add_device(Device(SERIAL_DEVICE_ID, serial_room, serial=serial_device))
+
+    def register_client(self, websocket):
+        client = ClientConnection(websocket, self.client_queue_size, codec_for(websocket.subprotocol))
+        self.clients[websocket] = client
+        logger.debug(f"New client connected. Total clients: {len(self.clients)}")
+        return client
+
+    def unregister_client(self, websocket):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        self.unsubscribe(client)
+        self.dropped_disconnected += client.dropped
+        client.close()
+        logger.debug(f"Client disconnected. Total clients: {len(self.clients)}")
+
+    def add_device(self, device):
+        """Add a reader to the registry, replacing one with the same ID."""
+        previous = self.devices.get(device.device_id)
+        if previous is not None and previous is not device:
+            self.remove_device(previous, 'Device reconnected')
+        self.devices[device.device_id] = device
+        if device.room is not None:
+            self.rooms[device.room].add(device.device_id)
+        logger.info(f"Device {device.device_id} registered in room {device.room}. "
+                    f"Total devices: {len(self.devices)}")
+
+    def remove_device(self, device, reason='Device disconnected'):
+        if self.devices.get(device.device_id) is device:
+            del self.devices[device.device_id]
+        room_devices = self.rooms.get(device.room)
+        if room_devices is not None:
+            room_devices.discard(device.device_id)
+            if not room_devices:
+                del self.rooms[device.room]
+        device.fail_pending(reason)
+        logger.info(f"Device {device.device_id} removed: {reason}")
+
+    def register_device(self, websocket, data):
+        """Register the reader that sent its first message on ``websocket``."""
+        device_id = data.get("device_id") or DEFAULT_DEVICE_ID
+        device = Device(device_id, data.get("room"), websocket=websocket,
+                        codec=codec_for(websocket.subprotocol))
+        self.add_device(device)
+        return device
+
+    def find_device(self, device_id=None, room=None):
+        """Pick the reader a command is for.
+
+        Without ``device_id`` or ``room`` a command can only go to the one
+        reader when exactly one is registered.
+        """
+        if device_id is not None:
+            return self.devices.get(device_id)
+        if room is not None:
+            for candidate in self.rooms.get(room, ()):
+                device = self.devices[candidate]
+                if device.connected:
+                    return device
+            return None
+        if len(self.devices) == 1:
+            return next(iter(self.devices.values()))
+        return None
+
+    def subscribe(self, client, data):
+        """Subscribe a client to the rooms, lectures or devices named in ``data``."""
+        topics = set()
+        if data.get("all"):
+            topics.add(ALL_TOPIC)
+        if data.get("room") is not None:
+            topics.add(room_topic(data["room"]))
+        if data.get("lecture_id") is not None:
+            topics.add(lecture_topic(data["lecture_id"]))
+        if data.get("device_id") is not None:
+            topics.add(device_topic(data["device_id"]))
+        for topic in topics:
+            self.subscribers[topic].add(client)
+        client.topics |= topics
+        return topics
+
+    def unsubscribe(self, client, topics=None):
+        """Remove a client's subscriptions, all of them by default."""
+        for topic in list(client.topics if topics is None else topics):
+            subscribers = self.subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.subscribers[topic]
+            client.topics.discard(topic)
+
+    def set_room_lecture(self, room, lecture_id):
+        """Record the lecture being held in a room, or None when it ends."""
+        if lecture_id is None:
+            self.room_lectures.pop(room, None)
+        else:
+            self.room_lectures[room] = lecture_id
+
+    def current_lecture(self, room):
+        """ID of the lecture being held in a room, or None."""
+        if room in self.room_lectures:
+            return self.room_lectures[room]
+        if self.tap_index is not None:
+            lecture = self.tap_index.ongoing_lecture(room)
+            return lecture.id if lecture is not None else None
+        return None
+
+    def publish(self, message, room=None, device_id=None):
+        """Queue a message for every client subscribed to its room, lecture or device.
+
+        The message is encoded once per negotiated codec and the same bytes
+        are handed to each subscriber's send queue; nothing here waits on a
+        client socket.
+
+        Returns:
+            int: Number of clients the message was queued for
+        """
+        recipients = set(self.subscribers.get(ALL_TOPIC, ()))
+        if room is not None:
+            recipients.update(self.subscribers.get(room_topic(room), ()))
+            lecture_id = self.current_lecture(room)
+            if lecture_id is not None:
+                recipients.update(self.subscribers.get(lecture_topic(lecture_id), ()))
+        if device_id is not None:
+            recipients.update(self.subscribers.get(device_topic(device_id), ()))
+        if not recipients:
+            return 0
+        payloads = {}
+        depth = 0
+        for client in recipients:
+            payload = payloads.get(client.codec.name)
+            if payload is None:
+                payload = payloads[client.codec.name] = client.codec.encode(message)
+            client.send(payload)
+            if client.resync and not client.queue.full():
+                # Replaces whatever status deltas the client lost
+                client.resync = False
+                client.send_message(self.status_snapshot(client))
+            depth = max(depth, client.queue.qsize())
+        FANOUT_QUEUE_DEPTH.set(depth)
+        return len(recipients)
+
+    def publish_status(self, device, full=False):
+        """Publish the reader's status fields that changed since the last update.
+
+        Clients merge these into the snapshot they get when subscribing.
+        With ``full``, as for the reader's periodic full report, the whole
+        status is published, so a client that missed a delta catches up.
+        """
+        if full:
+            device.published = device.status_fields()
+            self.publish(device.status_message(), room=device.room, device_id=device.device_id)
+            return
+        delta = device.status_delta()
+        if delta is not None:
+            self.publish(delta, room=device.room, device_id=device.device_id)
+
+    def is_subscribed(self, client, device):
+        """Whether a client receives the events of a reader."""
+        topics = client.topics
+        if ALL_TOPIC in topics or device_topic(device.device_id) in topics:
+            return True
+        if device.room is None:
+            return False
+        return (room_topic(device.room) in topics
+                or lecture_topic(self.current_lecture(device.room)) in topics)
+
+    def status_snapshot(self, client=None):
+        """Full status of every reader, or of those ``client`` is subscribed to."""
+        devices = self.devices.values()
+        if client is not None:
+            devices = [device for device in devices if self.is_subscribed(client, device)]
+        return {
+            "type": "devices",
+            "devices": [device.status_message() for device in devices],
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def stats(self):
+        """Connection and queue counters for monitoring and load tests."""
+        stats = {
+            "type": "stats",
+            "devices": len(self.devices),
+            "clients": len(self.clients),
+            "subscriptions": sum(len(subscribers) for subscribers in self.subscribers.values()),
+            "pending": len(self.pending),
+            "queued": sum(client.queue.qsize() for client in self.clients.values()),
+            "dropped": self.dropped_disconnected + sum(client.dropped for client in self.clients.values()),
+            "codecs": dict(Counter(client.codec.name for client in self.clients.values()))
+        }
+        if self.ingestion is not None:
+            stats["ingestion"] = self.ingestion.stats()
+        return stats
+
+    def _store_result(self, request_id, result):
+        self.results[request_id] = result
+        while len(self.results) > RESULT_CACHE_SIZE:
+            self.results.popitem(last=False)
+
+    async def send_command(self, command, params=None, request_id=None, timeout=None,
+                           device_id=None, room=None):
+        """Send a command to a reader and wait for its result.
+
+        Commands to ESP8266 readers carry a request ID that the firmware
+        echoes in its events, so several commands can be outstanding at once
+        and each result reaches the right caller.
+
+        Args:
+            command: Command name understood by the controller
+            params: Optional command parameters
+            request_id: Correlation ID; generated if not given
+            timeout: Seconds to wait for the result
+            device_id: Reader to send the command to
+            room: Send to the reader in this room if no device_id is given
+
+        Returns:
+            dict: Result with at least a ``status`` key
+        """
+        request_id = request_id or uuid.uuid4().hex
+        timeout = timeout or self.command_timeout
+        started = time.perf_counter()
+
+        try:
+            if command in ('OPEN_SERIAL', 'CLOSE_SERIAL'):
+                result = await self.handle_gateway_command(command, params or {})
+            else:
+                device = self.find_device(device_id, room)
+                if device is not None and device.connected:
+                    self.pending[request_id] = device.device_id
+                    try:
+                        result = await device.send_command(command, params, request_id, timeout)
+                    finally:
+                        self.pending.pop(request_id, None)
+                    # Results such as fingerprint slots only mean something per reader
+                    result.setdefault('device_id', device.device_id)
+                elif device_id is None and room is None and self.devices:
+                    result = {'status': 'error', 'message': 'Several devices connected; device_id or room is required'}
+                else:
+                    result = {'status': 'error', 'message': 'Device not connected'}
+        except asyncio.TimeoutError:
+            result = {'status': 'error', 'message': 'Timed out waiting for device'}
         except Exception as e:
-            logger.error(f"Error handling ESP8266 message: {e}")
+            logger.error(f"Error sending command {command}: {e}")
+            result = {'status': 'error', 'message': str(e)}
 
-    async def handle_fingerprint_event(self, event_data):
+        HARDWARE_COMMAND_DURATION.labels(command, result.get('status', 'unknown')).observe(
+            time.perf_counter() - started
+        )
+        self._store_result(request_id, result)
+        return result
+
+    async def handle_gateway_command(self, command, params):
+        """Open or close a serial link on behalf of a client"""
+        device_id = params.get('device_id', SERIAL_DEVICE_ID)
+        device = self.devices.get(device_id)
+        if device is not None and device.serial is not None:
+            await device.serial.close()
+            self.remove_device(device, 'Serial port closed')
+            self.publish_status(device)
+        if command == 'OPEN_SERIAL':
+            serial_device = SerialDevice(params['port'], params.get('baudrate', 9600), self.command_timeout)
+            await serial_device.open()
+            device = Device(device_id, params.get('room'), serial=serial_device)
+            self.add_device(device)
+            self.publish_status(device)
+        return {'status': 'success'}
+
+    async def handle_esp8266_message(self, data, device):
+        """Handle messages from an ESP8266 reader"""
+        try:
+            if "status" in data:
+                device.update_status(data["status"])
+                # Readers only send their room with a full status report
+                self.publish_status(device, full="room" in data)
+
+            elif "taps" in data:
+                await self.handle_tap_batch(device, data["taps"])
+
+            elif "event" in data:
+                event_data = data["event"]
+                event_type = event_data.get("type")
+                answered = device.resolve_command(data.get("id"), event_data)
+
+                if event_type == "fingerprint":
+                    await self.handle_fingerprint_event(device, event_data)
+                elif event_type == "rfid":
+                    # Cards read for a command (e.g. enrollment) are not taps
+                    await self.handle_rfid_event(device, event_data, tap=not answered)
+        except Exception as e:
+            logger.error(f"Error handling message from device {device.device_id}: {e}")
+
+    async def handle_fingerprint_event(self, device, event_data):
         """Handle fingerprint scanner events"""
-        message = {
+        self.publish({
             "type": "fingerprint",
+            "device_id": device.device_id,
+            "room": device.room,
             "status": event_data.get("status"),
             "message": event_data.get("message"),
-            "count": self.fingerprint_count,
+            "count": device.fingerprint_count,
             "timestamp": datetime.now().isoformat()
-        }
-        if self.clients:
-            await asyncio.gather(
-                *[client.send(json.dumps(message)) for client in self.clients]
-            )
+        }, room=device.room, device_id=device.device_id)
 
-    async def handle_rfid_event(self, event_data):
+    async def handle_rfid_event(self, device, event_data, tap=True):
         """Handle RFID reader events"""
         message = {
             "type": "rfid",
+            "device_id": device.device_id,
+            "room": device.room,
             "status": event_data.get("status"),
             "cardId": event_data.get("card_id"),
-            "count": self.rfid_count,
+            "count": device.rfid_count,
             "timestamp": datetime.now().isoformat()
         }
-        if self.clients:
-            await asyncio.gather(
-                *[client.send(json.dumps(message)) for client in self.clients]
-            )
+        if tap and event_data.get("status") == "card_detected" and self.tap_index is not None:
+            decision = self.tap_index.check_tap(event_data.get("card_id"), device.room)
+            if decision.accepted and self.ingestion is not None:
+                # Journaled before the ack, so an acknowledged tap is never lost
+                self.ingestion.submit(decision.lecture_id, decision.user_id, verification_data=json.dumps({
+                    "card_id": event_data.get("card_id"),
+                    "device_id": device.device_id
+                }))
+            await self.acknowledge_tap(device, event_data.get("card_id"), decision)
+            message.update({
+                "accepted": decision.accepted,
+                "reason": decision.reason,
+                "userId": decision.user_id,
+                "lectureId": decision.lecture_id
+            })
+        self.publish(message, room=device.room, device_id=device.device_id)
+
+    async def handle_tap_batch(self, device, taps):
+        """Ingest a batch of taps from a reader's offline buffer.
+
+        Each tap is ``[seq, unix_time, card_id]``, with sequence numbers
+        increasing per device and a time of 0 when the reader's clock was
+        not set. Taps at or below the device's high-water mark were taken
+        before and are skipped, so resending a batch is harmless. A tap
+        with a time that cannot be converted is rejected but still counted
+        towards the high-water mark. The reply is a ``taps_ack`` carrying
+        the new high-water mark; the reader drops everything up to it from
+        its buffer.
+        """
+        if self.tap_index is None or self.ingestion is None:
+            # Without a durable journal the batch must stay on the reader
+            logger.warning(f"Tap batch from {device.device_id} not acknowledged: no tap index or journal")
+            return
+
+        hwm = self.ingestion.high_water_mark(device.device_id)
+        start_hwm = hwm
+        now = datetime.utcnow()
+        accepted_taps = []
+        results = []
+        duplicates = 0
+        backlog = 0
+        for entry in taps:
+            try:
+                seq = int(entry[0])
+            except (TypeError, ValueError, IndexError):
+                logger.warning(f"Malformed tap from {device.device_id}: {entry}")
+                continue
+            if seq <= hwm:
+                duplicates += 1
+                continue
+            # Advanced even for a malformed tap, so the reader can drop it
+            hwm = seq
+            try:
+                timestamp, card_id = int(entry[1]), str(entry[2])
+                tapped_at = datetime.utcfromtimestamp(timestamp) if timestamp else now
+            except (TypeError, ValueError, IndexError, OverflowError, OSError):
+                logger.warning(f"Malformed tap from {device.device_id}: {entry}")
+                results.append([seq, False])
+                continue
+
+            live = (now - tapped_at).total_seconds() <= LIVE_TAP_AGE
+            decision = self.tap_index.check_tap(card_id, device.room, tapped_at, buffered=not live)
+            results.append([seq, decision.accepted])
+            if decision.accepted:
+                accepted_taps.append(make_tap(
+                    decision.lecture_id, decision.user_id, timestamp=tapped_at,
+                    verification_data=json.dumps({"card_id": card_id, "device_id": device.device_id, "seq": seq})
+                ))
+            if not live:
+                backlog += 1
+            else:
+                self.publish({
+                    "type": "rfid",
+                    "device_id": device.device_id,
+                    "room": device.room,
+                    "status": "card_detected",
+                    "cardId": card_id,
+                    "accepted": decision.accepted,
+                    "reason": decision.reason,
+                    "userId": decision.user_id,
+                    "lectureId": decision.lecture_id,
+                    "timestamp": tapped_at.isoformat()
+                }, room=device.room, device_id=device.device_id)
+
+        if hwm > start_hwm:
+            # Journaled before the ack, so an acknowledged tap is never lost
+            self.ingestion.submit_batch(device.device_id, hwm, accepted_taps)
+        try:
+            await device.send_message({"type": "taps_ack", "hwm": hwm, "results": results})
+        except websockets.exceptions.ConnectionClosed:
+            logger.info(f"Device {device.device_id} left before its tap batch was acknowledged")
 
-    async def handle_client_message(self, message, websocket):
+        if not backlog:
+            return
+        self.publish({
+            "type": "rfid_sync",
+            "device_id": device.device_id,
+            "room": device.room,
+            "received": len(taps),
+            "buffered": backlog,
+            "accepted": len(accepted_taps),
+            "duplicates": duplicates,
+            "hwm": hwm,
+            "timestamp": now.isoformat()
+        }, room=device.room, device_id=device.device_id)
+
+    async def acknowledge_tap(self, device, card_id, decision):
+        """Tell the reader whether a tap was accepted."""
+        try:
+            await device.send_message({
+                "type": "tap_ack",
+                "card_id": card_id,
+                "accepted": decision.accepted,
+                "reason": decision.reason
+            })
+        except websockets.exceptions.ConnectionClosed:
+            logger.info(f"Device {device.device_id} left before its tap was acknowledged")
+
+    async def serve_request(self, data, client):
+        """Run a client request and reply with its result under the same ID"""
+        request_id = data.get("id") or uuid.uuid4().hex
+        result = await self.send_command(
+            data.get("command"),
+            params=data.get("params"),
+            request_id=request_id,
+            timeout=data.get("timeout"),
+            device_id=data.get("device_id"),
+            room=data.get("room")
+        )
+        client.send_message({
+            "type": "response",
+            "id": request_id,
+            "state": "done",
+            "result": result
+        })
+
+    async def handle_client_message(self, data, client):
         """Handle messages from web clients"""
         try:
-            data = json.loads(message)
-            command = data.get("command")
-            
-            if self.esp8266_client is None:
-                await websocket.send(json.dumps({
-                    "type": "error",
-                    "message": "ESP8266 not connected"
-                }))
-                return
-            
-            # Forward command to ESP8266
-            await self.esp8266_client.send(json.dumps({
-                "command": command,
-                "timestamp": datetime.now().isoformat()
-            }))
-            
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON received from client")
+            message_type = data.get("type")
+
+            if message_type == "auth":
+                # Checked when the connection opened
+                pass
+
+            elif message_type == "request":
+                # Requests run concurrently; the reply carries the request ID
+                asyncio.create_task(self.serve_request(data, client))
+
+            elif message_type == "result":
+                # Poll for a result, e.g. from another web worker than the submitter
+                request_id = data.get("id")
+                if request_id in self.results:
+                    reply = {"state": "done", "result": self.results[request_id]}
+                elif request_id in self.pending:
+                    reply = {"state": "pending"}
+                else:
+                    reply = {"state": "unknown"}
+                client.send_message({"type": "response", "id": request_id, **reply})
+
+            elif message_type == "subscribe":
+                topics = self.subscribe(client, data)
+                client.send_message({"type": "subscribed", "topics": sorted(topics)})
+                # Deltas published from now on apply to this
+                client.send_message(self.status_snapshot(client))
+
+            elif message_type == "unsubscribe":
+                self.unsubscribe(client)
+
+            elif message_type == "lecture":
+                self.set_room_lecture(data.get("room"), data.get("lecture_id"))
+
+            elif message_type == "index":
+                # Card, enrollment and lecture changes committed by the web app
+                if self.tap_index is not None:
+                    self.tap_index.apply(data.get("changes", []))
+
+            elif message_type == "status":
+                client.send_message(self.status_snapshot())
+
+            elif message_type == "stats":
+                client.send_message(self.stats())
+
+            elif "command" in data:
+                # Fire-and-forget commands from the browser UI
+                asyncio.create_task(self.send_command(
+                    data["command"],
+                    params=data.get("params"),
+                    device_id=data.get("device_id"),
+                    room=data.get("room")
+                ))
+
         except Exception as e:
             logger.error(f"Error handling client message: {e}")
 
-    async def handler(self, websocket, path):
-        """Handle new WebSocket connections"""
-        await self.register(websocket)
+    async def handler(self, websocket, path=None):
+        """Handle new WebSocket connections.
+
+        A connection whose first message identifies it as an ESP8266 is a
+        reader; any other connection is a web client. Either is closed if
+        its first message does not carry the configured token. Messages use
+        the subprotocol negotiated in the handshake, or JSON.
+        """
+        device = None
+        client = None
+        codec = codec_for(websocket.subprotocol)
         try:
             async for message in websocket:
-                if websocket == self.esp8266_client:
-                    await self.handle_esp8266_message(message, websocket)
+                try:
+                    data = decode(message, codec)
+                except ValueError:
+                    logger.error("Invalid message received")
+                    continue
+                if not isinstance(data, dict):
+                    logger.error("Message is not an object")
+                    continue
+
+                if device is None and client is None:
+                    if data.get("device") == "esp8266":
+                        if not token_matches(self.device_token, data.get("token")):
+                            logger.warning(f"Rejected reader {data.get('device_id')} from "
+                                           f"{websocket.remote_address}: invalid device token")
+                            await websocket.close(POLICY_VIOLATION, "Invalid device token")
+                            return
+                        device = self.register_device(websocket, data)
+                    else:
+                        token = data.get("token") if data.get("type") == "auth" else None
+                        if not token_matches(self.client_token, token):
+                            logger.warning(f"Rejected client from {websocket.remote_address}: "
+                                           f"not authenticated")
+                            await websocket.close(POLICY_VIOLATION, "Authentication required")
+                            return
+                        client = self.register_client(websocket)
+
+                if device is not None:
+                    await self.handle_esp8266_message(data, device)
                 else:
-                    await self.handle_client_message(message, websocket)
+                    await self.handle_client_message(data, client)
         except websockets.exceptions.ConnectionClosed:
             pass
         finally:
-            await self.unregister(websocket)
+            if device is not None and self.devices.get(device.device_id) is device:
+                self.remove_device(device)
+                device.websocket = None
+                device.reset_status()
+                self.publish_status(device)
+            if client is not None:
+                self.unregister_client(websocket)
+
+async def refresh_tap_index(tap_index, interval):
+    """Reload the tap index periodically, e.g. to pick up the next day's lectures."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(tap_index.load)
+        except Exception as e:
+            logger.error(f"Error reloading tap index: {e}")
+
+async def main(host="0.0.0.0", port=8765, serial_port=None, baudrate=9600, serial_room=None,
+               client_queue_size=CLIENT_QUEUE_SIZE, database_url=None,
+               index_refresh=INDEX_REFRESH_INTERVAL, journal_path=DEFAULT_JOURNAL_PATH,
+               batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+               client_token=None, device_token=None):
+    if host not in LOOPBACK_HOSTS and not (client_token and device_token):
+        raise SystemExit(f"Set HARDWARE_GATEWAY_TOKEN and HARDWARE_DEVICE_TOKEN (or --token and "
+                         f"--device-token) to listen on {host}")
+    serial_device = SerialDevice(serial_port, baudrate) if serial_port else None
+    tap_index = None
+    ingestion = None
+    if database_url:
+        tap_index = TapIndex(database_url)
+        await asyncio.to_thread(tap_index.load)
+        asyncio.create_task(refresh_tap_index(tap_index, index_refresh))
+        ingestion = TapIngestionQueue.from_path(journal_path, tap_index.database_url,
+                                                batch_size=batch_size, flush_interval=flush_interval)
+        ingestion.start()
+        if os.environ.get('DASHBOARD_CACHE_REDIS_URL'):
+            # Taps written here make the web workers' dashboards stale
+            dashboard_cache.watch_writes(os.environ['DASHBOARD_CACHE_REDIS_URL'])
+    hardware_server = HardwareServer(serial_device=serial_device, serial_room=serial_room,
+                                     client_queue_size=client_queue_size, tap_index=tap_index,
+                                     ingestion=ingestion, client_token=client_token,
+                                     device_token=device_token)
+    if serial_device is not None:
+        await serial_device.open()
+    try:
+        # Messages are small; per-connection deflate state would cost more
+        # memory and CPU than it saves with thousands of clients
+        async with websockets.serve(hardware_server.handler, host, port, compression=None,
+                                    subprotocols=SUBPROTOCOLS):
+            await asyncio.Future()  # run forever
+    finally:
+        if ingestion is not None:
+            await asyncio.to_thread(ingestion.stop)
 
-async def main():
-    hardware_server = HardwareServer()
-    async with websockets.serve(hardware_server.handler, "0.0.0.0", 8765):
-        await asyncio.Future()  # run forever
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Hardware gateway for fingerprint and RFID controllers')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--serial-port', help='Serial port of a directly attached controller')
+    parser.add_argument('--baudrate', type=int, default=9600)
+    parser.add_argument('--serial-room', help='Room the directly attached controller is installed in')
+    parser.add_argument('--client-queue-size', type=int, default=CLIENT_QUEUE_SIZE,
+                        help='Messages queued per web client before the oldest are dropped')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'),
+                        help='Database to load the tap index from; taps are not decided without it')
+    parser.add_argument('--index-refresh', type=int, default=INDEX_REFRESH_INTERVAL,
+                        help='Seconds between full reloads of the tap index')
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL_PATH,
+                        help='SQLite journal for accepted taps awaiting the database')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Taps written per batch; a full batch is flushed at once')
+    parser.add_argument('--flush-ms', type=int, default=int(DEFAULT_FLUSH_INTERVAL * 1000),
+                        help='Milliseconds between flushes of a partial batch')
+    parser.add_argument('--token', default=os.environ.get('HARDWARE_GATEWAY_TOKEN'),
+                        help='Token web app clients authenticate with; required unless listening on loopback')
+    parser.add_argument('--device-token', default=os.environ.get('HARDWARE_DEVICE_TOKEN'),
+                        help='Token readers register with; required unless listening on loopback')
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    asyncio.run(main(args.host, args.port, args.serial_port, args.baudrate, args.serial_room,
+                     args.client_queue_size, args.database_url, args.index_refresh,
+                     args.journal, args.batch_size, args.flush_ms / 1000, args.token,
+                     args.device_token))
@@ -9,6 +9,7 @@ from .user import User
 from .course import Course
 from .department import Department
 from .attendance import Attendance
+from .attendance_rollup import AttendanceRollup
 from .course_student import CourseStudent
 from .course_lecturer import CourseLecturer
 from .login_log import LoginLog
@@ -16,6 +17,8 @@ from .activity_log import ActivityLog
 from .notification import Notification
 from .lecture import Lecture
 from .hardware import HardwareStatus
+from .fingerprint_slot import FingerprintSlot
+from .user_biometric import UserBiometric
 
 # List all models for easy access
 __all__ = [
@@ -23,6 +26,7 @@ __all__ = [
     'Course',
     'Department',
     'Attendance',
+    'AttendanceRollup',
     'CourseStudent',
     'CourseLecturer',
     'LoginLog',
@@ -30,5 +34,7 @@ __all__ = [
     'Notification',
     'Lecture',
     'HardwareStatus',
+    'FingerprintSlot',
+    'UserBiometric',
     'metadata'
 ]
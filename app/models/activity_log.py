@@ -5,6 +5,10 @@ from sqlalchemy.orm import relationship
 class ActivityLog(db.Model):
     """Activity log model for tracking user actions"""
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        # Recent-activity lists and keyset pagination seek on (timestamp, id)
+        db.Index('ix_activity_logs_timestamp_id', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -46,8 +50,9 @@ class ActivityLog(db.Model):
     @classmethod
     def log_activity(cls, user_id, action, details=None, resource_type=None, resource_id=None, 
                     status='success', error_message=None, ip_address=None):
-        """Create a new activity log entry"""
-        log = cls(
+        """Queue a new activity log entry; it is written in the background by the audit logger"""
+        from app.services.audit_log import audit_logger
+        audit_logger.activity(
             user_id=user_id,
             action=action,
             details=details,
@@ -57,8 +62,6 @@ class ActivityLog(db.Model):
             error_message=error_message,
             ip_address=ip_address
         )
-        db.session.add(log)
-        return log
 
     @classmethod
     def get_user_activities(cls, user_id, limit=10):
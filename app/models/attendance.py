@@ -1,10 +1,19 @@
 from app.extensions import db
 from datetime import datetime
 from sqlalchemy.orm import relationship
+from app.utils.sql import upsert_insert
 
 class Attendance(db.Model):
     """Attendance model for tracking user attendance"""
     __tablename__ = 'attendances'
+    __table_args__ = (
+        # One record per student per lecture; also the upsert conflict target
+        db.Index('uq_attendances_lecture_user', 'lecture_id', 'user_id', unique=True),
+        # Dashboard lookups filter by student and status, then join to lectures
+        db.Index('ix_attendances_user_status_lecture', 'user_id', 'status', 'lecture_id'),
+        # Keyset pagination seeks on (timestamp, id)
+        db.Index('ix_attendances_timestamp_id', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     lecture_id = db.Column(db.Integer, db.ForeignKey('lectures.id'), nullable=False)
@@ -18,6 +27,8 @@ class Attendance(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    STATUSES = ('present', 'absent', 'late')
+
     # Relationships
     lecture = relationship('Lecture', back_populates='attendances')
     user = relationship('User', foreign_keys=[user_id], back_populates='attendances')
@@ -56,20 +67,85 @@ class Attendance(db.Model):
     @classmethod
     def mark_attendance(cls, lecture_id, user_id, status='present', marked_by_id=None, 
                        verification_method='manual', verification_data=None, notes=None):
-        """Mark attendance for a user"""
-        attendance = cls(
-            lecture_id=lecture_id,
-            user_id=user_id,
-            status=status,
-            marked_by_id=marked_by_id,
-            verification_method=verification_method,
-            verification_data=verification_data,
-            notes=notes
-        )
-        db.session.add(attendance)
-        db.session.commit()
+        """Mark attendance for a user
+
+        Goes through ``bulk_mark``, so marking a student again updates
+        their record instead of violating the one-record-per-lecture index.
+        """
+        cls.bulk_mark(lecture_id, {user_id: status}, marked_by_id=marked_by_id,
+                      verification_method=verification_method)
+        attendance = cls.query.filter_by(lecture_id=lecture_id, user_id=user_id).one()
+        if verification_data is not None or notes is not None:
+            if verification_data is not None:
+                attendance.verification_data = verification_data
+            if notes is not None:
+                attendance.notes = notes
+            db.session.commit()
         return attendance
 
+    @classmethod
+    def bulk_mark(cls, lecture_id, statuses, marked_by_id=None, verification_method='manual'):
+        """Mark attendance for a whole roster in a single upsert.
+
+        Writes one ``INSERT ... ON CONFLICT (lecture_id, user_id) DO UPDATE``
+        statement (PostgreSQL and SQLite). Existing rows are only updated
+        when their status actually changes.
+
+        Args:
+            lecture_id: ID of the lecture
+            statuses: Mapping of user_id to status ('present', 'absent', 'late')
+            marked_by_id: ID of the user marking attendance
+            verification_method: How attendance was verified
+
+        Returns:
+            list: ``{'id', 'user_id', 'status'}`` dicts for inserted or changed rows
+        """
+        from app.models.attendance_rollup import AttendanceRollup
+        from app.models.lecture import Lecture
+
+        invalid = {status for status in statuses.values() if status not in cls.STATUSES}
+        if invalid:
+            raise ValueError(f"Invalid attendance status: {', '.join(sorted(invalid))}")
+        if not statuses:
+            return []
+
+        now = datetime.utcnow()
+        rows = [{
+            'lecture_id': lecture_id,
+            'user_id': int(user_id),
+            'status': status,
+            'marked_by_id': marked_by_id,
+            'verification_method': verification_method,
+            'timestamp': now,
+            'created_at': now,
+            'updated_at': now
+        } for user_id, status in statuses.items()]
+
+        table = cls.__table__
+        stmt = upsert_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.lecture_id, table.c.user_id],
+            set_={
+                'status': stmt.excluded.status,
+                'marked_by_id': stmt.excluded.marked_by_id,
+                'verification_method': stmt.excluded.verification_method,
+                'updated_at': stmt.excluded.updated_at
+            },
+            where=table.c.status.is_distinct_from(stmt.excluded.status)
+        ).returning(table.c.id, table.c.user_id, table.c.status)
+
+        changed = [
+            {'id': row.id, 'user_id': row.user_id, 'status': row.status}
+            for row in db.session.execute(stmt)
+        ]
+
+        # Keep the per-student rollups in step with the changed rows
+        lecture = db.session.get(Lecture, lecture_id)
+        if changed and lecture:
+            AttendanceRollup.refresh(lecture.course_id, [row['user_id'] for row in changed])
+        db.session.commit()
+        return changed
+
     @classmethod
     def get_user_attendance(cls, user_id, lecture_id=None):
         """Get attendance records for a user"""
@@ -102,11 +178,18 @@ class Attendance(db.Model):
 
     def update_status(self, status, marked_by_id=None, notes=None):
         """Update attendance status"""
+        from app.models.attendance_rollup import AttendanceRollup
+
+        previous_status = self.status
         self.status = status
         if marked_by_id:
             self.marked_by_id = marked_by_id
         if notes:
             self.notes = notes
+
+        if status != previous_status and self.lecture:
+            db.session.flush()
+            AttendanceRollup.refresh(self.lecture.course_id, [self.user_id])
         db.session.commit()
 
     @staticmethod
@@ -167,15 +250,16 @@ class Attendance(db.Model):
     def get_course_attendance_stats(course_id, student_id=None):
         """Get detailed attendance statistics for a course"""
         from sqlalchemy import func
-        
+        from app.models.attendance_rollup import AttendanceRollup
+
         query = db.session.query(
-            func.count(case([(Attendance.status == 'present', 1)])).label('present'),
-            func.count(case([(Attendance.status == 'absent', 1)])).label('absent'),
-            func.count(case([(Attendance.status == 'late', 1)])).label('late')
-        ).join(Lecture).filter(Lecture.course_id == course_id)
+            func.coalesce(func.sum(AttendanceRollup.present_count), 0).label('present'),
+            func.coalesce(func.sum(AttendanceRollup.absent_count), 0).label('absent'),
+            func.coalesce(func.sum(AttendanceRollup.late_count), 0).label('late')
+        ).filter(AttendanceRollup.course_id == course_id)
         
         if student_id:
-            query = query.filter(Attendance.user_id == student_id)
+            query = query.filter(AttendanceRollup.student_id == student_id)
             
         result = query.first()
         total = result.present + result.absent + result.late
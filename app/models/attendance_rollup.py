@@ -0,0 +1,128 @@
+"""Per-course per-student attendance rollup model."""
+from datetime import datetime
+from sqlalchemy import func, case, select, literal
+from app.extensions import db
+
+
+class AttendanceRollup(db.Model):
+    """Precomputed attendance counts for each (course, student) pair.
+
+    The attendance write paths recompute the rows of the students they
+    touch (:meth:`refresh`), so rate and at-risk lookups read one row per
+    student instead of aggregating raw attendance records.
+    """
+    __tablename__ = 'attendance_rollups'
+
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    late_count = db.Column(db.Integer, nullable=False, default=0)
+    absent_count = db.Column(db.Integer, nullable=False, default=0)
+    last_attended = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AttendanceRollup {self.course_id}-{self.student_id}>'
+
+    @property
+    def total_count(self):
+        """Total number of attendance records."""
+        return self.present_count + self.late_count + self.absent_count
+
+    @property
+    def attendance_rate(self):
+        """Percentage of records marked present."""
+        return (self.present_count / self.total_count * 100) if self.total_count > 0 else 0
+
+    def to_dict(self):
+        """Convert rollup to dictionary"""
+        return {
+            'course_id': self.course_id,
+            'student_id': self.student_id,
+            'present': self.present_count,
+            'late': self.late_count,
+            'absent': self.absent_count,
+            'total': self.total_count,
+            'rate': self.attendance_rate,
+            'last_attended': self.last_attended.isoformat() if self.last_attended else None
+        }
+
+    @classmethod
+    def _aggregate(cls):
+        """SELECT producing rollup rows from raw attendance records."""
+        from app.models.attendance import Attendance
+        from app.models.lecture import Lecture
+
+        return select(
+            Lecture.course_id,
+            Attendance.user_id,
+            func.count(case((Attendance.status == 'present', 1))),
+            func.count(case((Attendance.status == 'late', 1))),
+            func.count(case((Attendance.status == 'absent', 1))),
+            func.max(case((Attendance.status.in_(['present', 'late']), Lecture.date))),
+            literal(datetime.utcnow())
+        ).select_from(Attendance).join(
+            Lecture, Attendance.lecture_id == Lecture.id
+        ).group_by(Lecture.course_id, Attendance.user_id)
+
+    @classmethod
+    def _replace(cls, delete_filter=None, aggregate_filter=None):
+        """Statements deleting rollup rows and re-inserting them from attendance records."""
+        table = cls.__table__
+        delete = table.delete()
+        aggregate = cls._aggregate()
+        if delete_filter is not None:
+            delete = delete.where(delete_filter)
+            aggregate = aggregate.where(aggregate_filter)
+
+        return [delete, table.insert().from_select([
+            'course_id', 'student_id', 'present_count', 'late_count',
+            'absent_count', 'last_attended', 'updated_at'
+        ], aggregate)]
+
+    @classmethod
+    def refresh_statements(cls, course_id, student_ids):
+        """Statements recomputing the rollup rows for some students of a course.
+
+        For callers writing through their own connection rather than the
+        session.
+        """
+        from app.models.attendance import Attendance
+        from app.models.lecture import Lecture
+
+        student_ids = list(set(student_ids))
+        if not student_ids:
+            return []
+
+        table = cls.__table__
+        return cls._replace(
+            delete_filter=(table.c.course_id == course_id) & table.c.student_id.in_(student_ids),
+            aggregate_filter=(Lecture.course_id == course_id) & Attendance.user_id.in_(student_ids)
+        )
+
+    @classmethod
+    def refresh(cls, course_id, student_ids):
+        """Recompute the rollup rows for some students of a course.
+
+        Used when existing attendance records change status, where the
+        previous status is not known to the caller.
+
+        Args:
+            course_id: ID of the course
+            student_ids: IDs of the students whose records changed
+        """
+        for stmt in cls.refresh_statements(course_id, student_ids):
+            db.session.execute(stmt)
+
+    @classmethod
+    def rebuild(cls):
+        """Rebuild the whole rollup table from attendance records."""
+        for stmt in cls._replace():
+            db.session.execute(stmt)
+        db.session.commit()
+        return cls.query.count()
+
+    @classmethod
+    def get_rollup(cls, course_id, student_id):
+        """Get the rollup row for a student in a course"""
+        return db.session.get(cls, (course_id, student_id))
@@ -106,8 +106,10 @@ class Course(db.Model):
 
     def get_attendance_stats(self):
         """Get attendance statistics for the course"""
-        total_lectures = self.lectures.count()
-        if total_lectures == 0:
+        from app.services.attendance_report import CourseAttendanceReport
+
+        report = CourseAttendanceReport(self.id).load()
+        if report.total_lectures == 0:
             return {
                 'total_lectures': 0,
                 'total_students': 0,
@@ -115,27 +117,11 @@ class Course(db.Model):
                 'attendance_by_lecture': []
             }
 
-        total_students = self.enrolled_students.count()
-        attendance_by_lecture = []
-
-        for lecture in self.lectures:
-            attended = lecture.attendances.filter_by(status='present').count()
-            attendance_by_lecture.append({
-                'lecture_id': lecture.id,
-                'title': lecture.title,
-                'date': lecture.date.strftime('%Y-%m-%d'),
-                'attendance_count': attended,
-                'attendance_percentage': (attended / total_students * 100) if total_students > 0 else 0
-            })
-
-        total_attendance = sum(item['attendance_count'] for item in attendance_by_lecture)
-        average_attendance = (total_attendance / (total_lectures * total_students) * 100) if total_students > 0 else 0
-
         return {
-            'total_lectures': total_lectures,
-            'total_students': total_students,
-            'average_attendance': average_attendance,
-            'attendance_by_lecture': attendance_by_lecture
+            'total_lectures': report.total_lectures,
+            'total_students': report.total_students,
+            'average_attendance': report.average_attendance(),
+            'attendance_by_lecture': report.lecture_stats()
         }
 
     def get_attendance_rate(self, student_id=None):
@@ -143,17 +129,20 @@ class Course(db.Model):
         If student_id is provided, calculate for specific student
         Otherwise, calculate average for all enrolled students
         """
-        from app.models.attendance import Attendance
-        from sqlalchemy import func, case
+        from app.models.attendance_rollup import AttendanceRollup
+        from sqlalchemy import func
 
         query = db.session.query(
-            func.avg(case([(Attendance.status == 'present', 100)], else_=0))
-        ).join(Lecture).filter(Lecture.course_id == self.id)
+            func.sum(AttendanceRollup.present_count),
+            func.sum(AttendanceRollup.present_count + AttendanceRollup.late_count +
+                     AttendanceRollup.absent_count)
+        ).filter(AttendanceRollup.course_id == self.id)
 
         if student_id:
-            query = query.filter(Attendance.user_id == student_id)
+            query = query.filter(AttendanceRollup.student_id == student_id)
 
-        return query.scalar() or 0
+        present, total = query.one()
+        return (present / total * 100) if total else 0
 
     def get_active_students_count(self, days=30):
         """Get count of students who attended at least one lecture in the last X days"""
@@ -174,11 +163,23 @@ class Course(db.Model):
 
     def get_at_risk_students_count(self):
         """Get count of students below minimum attendance requirement"""
-        at_risk_count = 0
-        for student in self.enrolled_students:
-            if self.get_attendance_rate(student.id) < self.minimum_attendance:
-                at_risk_count += 1
-        return at_risk_count
+        from app.models.attendance_rollup import AttendanceRollup
+        from app.models.course_student import CourseStudent
+
+        enrolled = CourseStudent.query.filter_by(course_id=self.id).count()
+        total = (AttendanceRollup.present_count + AttendanceRollup.late_count +
+                 AttendanceRollup.absent_count)
+        # Students with no records count as 0% and so stay at risk
+        meeting_minimum = db.session.query(AttendanceRollup).join(
+            CourseStudent,
+            (CourseStudent.course_id == AttendanceRollup.course_id) &
+            (CourseStudent.student_id == AttendanceRollup.student_id)
+        ).filter(
+            AttendanceRollup.course_id == self.id,
+            total > 0,
+            AttendanceRollup.present_count * 100 >= (self.minimum_attendance or 0) * total
+        ).count()
+        return enrolled - meeting_minimum
 
     def get_completion_status(self):
         """Get course completion status based on scheduled lectures"""
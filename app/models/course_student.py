@@ -5,6 +5,9 @@ from app.extensions import db
 class CourseStudent(db.Model):
     """Association model for Course-Student relationship."""
     __tablename__ = 'course_students'
+    __table_args__ = (
+        db.Index('ix_course_students_course_student', 'course_id', 'student_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
@@ -0,0 +1,53 @@
+"""Fingerprint sensor library slot model."""
+from datetime import datetime
+from app.extensions import db
+
+
+class FingerprintSlot(db.Model):
+    """A slot in a reader's fingerprint sensor library and the user it holds.
+
+    The sensor identifies a finger by searching its own template library
+    and returns the matching slot number; this table maps (device, slot)
+    back to a user, so identification never reads template blobs.
+    ``template_hash`` is the hash of the template the slot should hold and
+    ``synced_at`` is set once the reader has stored it; rows with a NULL
+    ``synced_at`` are waiting for the sync job.
+    """
+    __tablename__ = 'fingerprint_slots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(64), nullable=False)
+    slot = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    template_hash = db.Column(db.String(64), nullable=False)
+    synced_at = db.Column(db.DateTime)
+
+    user = db.relationship('User')
+
+    __table_args__ = (
+        db.UniqueConstraint('device_id', 'slot', name='uq_fingerprint_slots_device_slot'),
+        db.UniqueConstraint('device_id', 'user_id', name='uq_fingerprint_slots_device_user'),
+    )
+
+    def __repr__(self):
+        return f'<FingerprintSlot {self.device_id}:{self.slot} user={self.user_id}>'
+
+    @classmethod
+    def user_for(cls, device_id, slot):
+        """ID of the user whose template is in a reader's slot, or None."""
+        return db.session.query(cls.user_id).filter(
+            cls.device_id == device_id,
+            cls.slot == slot,
+            cls.synced_at.isnot(None)
+        ).scalar()
+
+    def mark_synced(self, when=None):
+        self.synced_at = when or datetime.utcnow()
+
+    def to_dict(self):
+        return {
+            'device_id': self.device_id,
+            'slot': self.slot,
+            'user_id': self.user_id,
+            'synced_at': self.synced_at.isoformat() if self.synced_at else None
+        }
@@ -5,6 +5,9 @@ from sqlalchemy.orm import relationship
 class Lecture(db.Model):
     """Lecture model for managing course lectures"""
     __tablename__ = 'lectures'
+    __table_args__ = (
+        db.Index('ix_lectures_course_date_start', 'course_id', 'date', 'start_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
@@ -2,10 +2,15 @@ from flask import current_app
 from app.extensions import db
 from datetime import datetime, timedelta
 from sqlalchemy.orm import relationship
+from app.utils.partitions import PartitionManager
 
 class LoginLog(db.Model):
     """Login log model for tracking user login attempts"""
     __tablename__ = 'login_logs'
+    __table_args__ = (
+        # Keyset pagination seeks on (timestamp, id)
+        db.Index('ix_login_logs_timestamp_id', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Made nullable for failed logins
@@ -32,8 +37,9 @@ class LoginLog(db.Model):
 
     @classmethod
     def log_activity(cls, user_id=None, action='login', status='success', ip_address=None, user_agent=None, details=None):
-        """Log a login-related activity"""
-        log = cls(
+        """Queue a login-related activity; it is written in the background by the audit logger"""
+        from app.services.audit_log import audit_logger
+        audit_logger.login(
             user_id=user_id,
             action=action,
             status=status,
@@ -41,12 +47,6 @@ class LoginLog(db.Model):
             user_agent=user_agent,
             details=details
         )
-        db.session.add(log)
-        try:
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            current_app.logger.error(f"Error logging login activity: {str(e)}")
 
     @classmethod
     def get_recent_logs(cls, limit=10):
@@ -73,14 +73,14 @@ class LoginLog(db.Model):
 
     @classmethod
     def cleanup_old_logs(cls, days=30):
-        """Delete logs older than specified days"""
+        """Expire the months holding only logs older than specified days"""
         cutoff = datetime.utcnow() - timedelta(days=days)
         try:
-            cls.query.filter(cls.timestamp < cutoff).delete()
-            db.session.commit()
+            partitions = PartitionManager(db.engine)
+            return partitions.drop_expired(cls.__tablename__, cutoff)
         except Exception as e:
-            db.session.rollback()
             current_app.logger.error(f"Error cleaning up old login logs: {str(e)}")
+            return []
 
     def to_dict(self):
         """Convert login log to dictionary"""
@@ -2,10 +2,15 @@ from app.extensions import db
 from datetime import datetime
 from sqlalchemy.orm import relationship
 from datetime import timedelta
+from app.utils.partitions import PartitionManager
 
 class Notification(db.Model):
     """Notification model for managing user notifications"""
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Also the partition key on PostgreSQL
+        db.Index('ix_notifications_created_at', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -98,10 +103,10 @@ class Notification(db.Model):
 
     @classmethod
     def delete_old_notifications(cls, days=30):
-        """Delete notifications older than specified days"""
+        """Expire the months holding only notifications older than specified days"""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
-        cls.query.filter(cls.created_at < cutoff_date).delete()
-        db.session.commit()
+        partitions = PartitionManager(db.engine)
+        return partitions.drop_expired(cls.__tablename__, cutoff_date)
 
     @classmethod
     def get_recent_notifications(cls, limit=10):
@@ -4,7 +4,7 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from app.extensions import db
 import logging
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, LargeBinary, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +23,7 @@ class User(UserMixin, db.Model):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login = Column(DateTime)
-    fingerprint_data = Column(LargeBinary, nullable=True)
+    rfid_card_id = Column(String(32), unique=True, nullable=True, index=True)
 
     # Relationships
     department = db.relationship('Department', back_populates='department_users')
@@ -73,6 +73,13 @@ class User(UserMixin, db.Model):
         lazy='dynamic',
         cascade='all, delete-orphan'
     )
+    # Fingerprint template, in its own table; loaded only when accessed
+    biometric = db.relationship(
+        'UserBiometric',
+        back_populates='user',
+        uselist=False,
+        cascade='all, delete-orphan'
+    )
 
     def __init__(self, login_id, email=None, first_name=None, last_name=None, role='student'):
         """Initialize a new user."""
@@ -87,6 +94,22 @@ class User(UserMixin, db.Model):
         """Return user's full name."""
         return f"{self.first_name} {self.last_name}"
 
+    @property
+    def fingerprint_data(self):
+        """Enrolled fingerprint template, or None. Reads the user_biometrics table."""
+        return self.biometric.fingerprint_data if self.biometric is not None else None
+
+    @fingerprint_data.setter
+    def fingerprint_data(self, template):
+        """Enrol a fingerprint template, or remove it with None."""
+        if template is None:
+            self.biometric = None
+            return
+        from .user_biometric import UserBiometric
+        if self.biometric is None:
+            self.biometric = UserBiometric()
+        self.biometric.set_template(template)
+
     @property
     def password(self):
         """Prevent password from being accessed."""
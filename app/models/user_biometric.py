@@ -0,0 +1,49 @@
+"""User biometric template model."""
+import hashlib
+from datetime import datetime
+from app.extensions import db
+
+
+def template_hash(template):
+    """SHA-256 hex digest identifying a template without reading it back."""
+    return hashlib.sha256(template).hexdigest()
+
+
+class UserBiometric(db.Model):
+    """A user's enrolled fingerprint template, kept out of the users table.
+
+    Template bytes are only needed to enrol users on readers, so they live
+    here, one row per user, and are themselves deferred: loading a
+    ``UserBiometric`` or comparing ``template_hash`` does not fetch them.
+    Session loads, rosters and user listings never touch this table.
+    """
+    __tablename__ = 'user_biometrics'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    fingerprint_data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    template_hash = db.Column(db.String(64), nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = db.relationship('User', back_populates='biometric')
+
+    def __repr__(self):
+        return f'<UserBiometric {self.user_id}>'
+
+    def set_template(self, template):
+        self.fingerprint_data = template
+        self.template_hash = template_hash(template)
+
+    @classmethod
+    def get_template(cls, user_id):
+        """A user's fingerprint template, or None."""
+        return db.session.query(cls.fingerprint_data).filter(cls.user_id == user_id).scalar()
+
+    @classmethod
+    def templates_for(cls, user_ids):
+        """Templates of several users, as user_id -> bytes."""
+        return dict(db.session.query(cls.user_id, cls.fingerprint_data).filter(cls.user_id.in_(user_ids)))
+
+    @classmethod
+    def find_by_hash(cls, digest):
+        """The biometric row holding a template with this hash, or None."""
+        return cls.query.filter_by(template_hash=digest).first()
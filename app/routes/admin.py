@@ -20,6 +20,8 @@ from app.forms import (
     SettingsForm
 )
 from app.utils import admin_required, roles_required
+from app.utils.pagination import keyset_paginate, per_page_arg
+from app.utils.dashboard_cache import dashboard_cache
 from app.extensions import db
 from app.hardware.controller import init_hardware, get_hardware_controller
 import logging
@@ -28,63 +30,97 @@ import traceback
 admin_bp = Blueprint('admin', __name__)
 logger = logging.getLogger(__name__)
 
+def _log_filters(*names):
+    """Collect the non-empty filter arguments for a paginated log view."""
+    return {name: request.args[name] for name in names if request.args.get(name)}
+
+def _filter_by_date_range(query, column, filters):
+    """Restrict a query to ``date_from``/``date_to`` (YYYY-MM-DD, inclusive)."""
+    try:
+        if 'date_from' in filters:
+            query = query.filter(column >= datetime.strptime(filters['date_from'], '%Y-%m-%d'))
+        if 'date_to' in filters:
+            date_to = datetime.strptime(filters['date_to'], '%Y-%m-%d') + timedelta(days=1)
+            query = query.filter(column < date_to)
+    except ValueError:
+        flash("Invalid date filter. Use YYYY-MM-DD.", "warning")
+    return query
+
+def _paginate_logs(query, model):
+    """Fetch the page of ``query`` addressed by the request's cursor arguments."""
+    return keyset_paginate(
+        query,
+        model,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=per_page_arg(request.args.get('per_page'))
+    )
+
+def _compute_dashboard_statistics():
+    """Run the admin dashboard's count and trend queries."""
+    # Get total users
+    total_users = User.query.count()
+    
+    # Get total courses
+    total_courses = Course.query.count()
+    
+    # Get total departments
+    total_departments = Department.query.count()
+    
+    # Get today's attendance
+    today = datetime.now().date()
+    today_attendance = Attendance.query.filter(
+        func.date(Attendance.timestamp) == today
+    ).count()
+    
+    # Get attendance data for the last 7 days
+    seven_days_ago = datetime.now() - timedelta(days=7)
+    attendance_data = db.session.query(
+        func.date(Attendance.timestamp).label('date'),
+        func.count(Attendance.id).label('count')
+    ).filter(
+        Attendance.timestamp >= seven_days_ago
+    ).group_by(
+        func.date(Attendance.timestamp)
+    ).order_by(
+        func.date(Attendance.timestamp)
+    ).all()
+    
+    attendance_labels = [row.date.strftime('%Y-%m-%d') for row in attendance_data]
+    attendance_counts = [row.count for row in attendance_data]
+    
+    # Get department statistics
+    department_stats = db.session.query(
+        Department.name,
+        func.count(User.id).label('user_count')
+    ).join(
+        User, Department.id == User.department_id
+    ).group_by(
+        Department.name
+    ).all()
+    
+    department_labels = [dept.name for dept in department_stats]
+    department_counts = [dept.user_count for dept in department_stats]
+    
+    return {
+        'total_users': total_users,
+        'total_courses': total_courses,
+        'total_departments': total_departments,
+        'today_attendance': today_attendance,
+        'attendance_labels': attendance_labels,
+        'attendance_data': attendance_counts,
+        'department_labels': department_labels,
+        'department_data': department_counts
+    }
+
 def get_dashboard_statistics():
-    """Get statistics for the admin dashboard."""
+    """Get statistics for the admin dashboard, from the snapshot cache when fresh."""
     try:
-        # Get total users
-        total_users = User.query.count()
-        
-        # Get total courses
-        total_courses = Course.query.count()
-        
-        # Get total departments
-        total_departments = Department.query.count()
-        
-        # Get today's attendance
-        today = datetime.now().date()
-        today_attendance = Attendance.query.filter(
-            func.date(Attendance.timestamp) == today
-        ).count()
-        
-        # Get attendance data for the last 7 days
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        attendance_data = db.session.query(
-            func.date(Attendance.timestamp).label('date'),
-            func.count(Attendance.id).label('count')
-        ).filter(
-            Attendance.timestamp >= seven_days_ago
-        ).group_by(
-            func.date(Attendance.timestamp)
-        ).order_by(
-            func.date(Attendance.timestamp)
-        ).all()
-        
-        attendance_labels = [row.date.strftime('%Y-%m-%d') for row in attendance_data]
-        attendance_counts = [row.count for row in attendance_data]
-        
-        # Get department statistics
-        department_stats = db.session.query(
-            Department.name,
-            func.count(User.id).label('user_count')
-        ).join(
-            User, Department.id == User.department_id
-        ).group_by(
-            Department.name
-        ).all()
-        
-        department_labels = [dept.name for dept in department_stats]
-        department_counts = [dept.user_count for dept in department_stats]
-        
-        return {
-            'total_users': total_users,
-            'total_courses': total_courses,
-            'total_departments': total_departments,
-            'today_attendance': today_attendance,
-            'attendance_labels': attendance_labels,
-            'attendance_data': attendance_counts,
-            'department_labels': department_labels,
-            'department_data': department_counts
-        }
+        return dashboard_cache.get(
+            f'admin:dashboard:{datetime.now().date()}',
+            _compute_dashboard_statistics,
+            depends_on=(User, Course, Department, Attendance)
+        )
     except Exception as e:
         logger.error(f"Error getting dashboard stats: {e}")
         return {
@@ -334,6 +370,42 @@ def api_hardware_status():
             'error': str(e)
         })
 
+@admin_bp.route('/api/hardware/commands', methods=['POST'])
+@login_required
+@admin_required
+def submit_hardware_command():
+    """Queue a command for the hardware gateway without waiting for the device."""
+    data = request.get_json() or {}
+    command = data.get('command')
+    if not command:
+        return jsonify({'success': False, 'message': 'Command is required'}), 400
+
+    controller = get_hardware_controller()
+    if controller is None or controller.simulation_mode:
+        return jsonify({'success': False, 'message': 'Hardware gateway not available'}), 503
+
+    request_id = controller.client.submit(
+        command,
+        device_id=data.get('device_id', controller.device_id),
+        room=data.get('room'),
+        **data.get('params', {})
+    )
+    return jsonify({
+        'success': True,
+        'request_id': request_id,
+        'result_url': url_for('admin.hardware_command_result', request_id=request_id)
+    }), 202
+
+@admin_bp.route('/api/hardware/commands/<request_id>')
+@login_required
+@admin_required
+def hardware_command_result(request_id):
+    """Poll for the result of a queued hardware command."""
+    controller = get_hardware_controller()
+    if controller is None or controller.simulation_mode:
+        return jsonify({'success': False, 'message': 'Hardware gateway not available'}), 503
+    return jsonify({'success': True, **controller.client.result(request_id)})
+
 @admin_bp.route('/api/users/register', methods=['POST'])
 @login_required
 @admin_required
@@ -425,13 +497,54 @@ def manage_users():
 @admin_required
 def activity_logs():
     """View activity logs."""
+    filters = _log_filters('user_id', 'action', 'status', 'resource_type', 'date_from', 'date_to')
     try:
-        logs = ActivityLog.query.order_by(ActivityLog.timestamp.desc()).limit(100).all()
-        return render_template('admin/activity_logs.html', logs=logs)
+        query = ActivityLog.query.options(db.joinedload(ActivityLog.user))
+        for name in ('user_id', 'action', 'status', 'resource_type'):
+            if name in filters:
+                query = query.filter(getattr(ActivityLog, name) == filters[name])
+        query = _filter_by_date_range(query, ActivityLog.timestamp, filters)
+
+        page = _paginate_logs(query, ActivityLog)
+        return render_template('admin/activity_logs.html', logs=page.items, page=page, filters=filters)
     except SQLAlchemyError as e:
         current_app.logger.error(f"Database error in activity_logs: {str(e)}")
         flash("Error loading activity logs. Please try again later.", "error")
-        return render_template('admin/activity_logs.html', logs=[])
+        return render_template('admin/activity_logs.html', logs=[], page=None, filters=filters)
+
+@admin_bp.route('/query-profile')
+@login_required
+@admin_required
+def query_profile():
+    """Recent per-request SQL statement counts, timings and slowest statements."""
+    profiler = current_app.extensions.get('query_profiler')
+    if profiler is None:
+        return jsonify({'success': False, 'message': 'Query profiling is disabled'}), 404
+
+    limit = request.args.get('limit', 50, type=int)
+    endpoint = request.args.get('endpoint')
+    return jsonify({
+        'success': True,
+        'budget': profiler.budget_for(endpoint) if endpoint else current_app.config.get('QUERY_BUDGET'),
+        'requests': profiler.recent(limit=limit, endpoint=endpoint)
+    })
+
+@admin_bp.route('/user-cache')
+@login_required
+@admin_required
+def user_cache_stats():
+    """Hit and miss counts of the session user cache in this worker."""
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        return jsonify({'success': False, 'message': 'User cache is not configured'}), 404
+    return jsonify({'success': True, 'stats': cache.stats()})
+
+@admin_bp.route('/dashboard-cache')
+@login_required
+@admin_required
+def dashboard_cache_stats():
+    """Hit, stale-hit and refresh counts of the dashboard snapshot cache in this worker."""
+    return jsonify({'success': True, 'stats': dashboard_cache.stats()})
 
 @admin_bp.route('/system-logs')
 @login_required
@@ -454,13 +567,20 @@ def system_logs():
 @admin_required
 def login_logs():
     """View login logs."""
+    filters = _log_filters('user_id', 'action', 'status', 'ip_address', 'date_from', 'date_to')
     try:
-        logs = LoginLog.query.order_by(LoginLog.timestamp.desc()).limit(100).all()
-        return render_template('admin/login_logs.html', logs=logs)
+        query = LoginLog.query.options(db.joinedload(LoginLog.user))
+        for name in ('user_id', 'action', 'status', 'ip_address'):
+            if name in filters:
+                query = query.filter(getattr(LoginLog, name) == filters[name])
+        query = _filter_by_date_range(query, LoginLog.timestamp, filters)
+
+        page = _paginate_logs(query, LoginLog)
+        return render_template('admin/login_logs.html', logs=page.items, page=page, filters=filters)
     except SQLAlchemyError as e:
         current_app.logger.error(f"Database error in login_logs: {str(e)}")
         flash("Error loading login logs. Please try again later.", "error")
-        return render_template('admin/login_logs.html', logs=[])
+        return render_template('admin/login_logs.html', logs=[], page=None, filters=filters)
 
 @admin_bp.route('/manage-courses')
 @login_required
@@ -767,26 +887,36 @@ def delete_course(course_id):
     
     return jsonify({'success': True, 'message': 'Course deleted successfully'})
 
+def _compute_statistics():
+    """Run the statistics page's count queries."""
+    return {
+        # User statistics
+        'total_users': User.query.count(),
+        'active_users': User.query.filter_by(is_active=True).count(),
+        'student_count': User.query.filter_by(role='student').count(),
+        'lecturer_count': User.query.filter_by(role='lecturer').count(),
+
+        # Course statistics
+        'total_courses': Course.query.count(),
+        'total_lectures': Lecture.query.count(),
+        'total_departments': Department.query.count(),
+
+        # Attendance statistics
+        'total_attendance': Attendance.query.count(),
+        'today_attendance': Attendance.query.join(Lecture).filter(
+            db.func.date(Lecture.date) == datetime.utcnow().date()
+        ).count()
+    }
+
 @admin_bp.route('/statistics')
 @login_required
 @admin_required
 def statistics():
-    # User statistics
-    total_users = User.query.count()
-    active_users = User.query.filter_by(is_active=True).count()
-    student_count = User.query.filter_by(role='student').count()
-    lecturer_count = User.query.filter_by(role='lecturer').count()
-    
-    # Course statistics
-    total_courses = Course.query.count()
-    total_lectures = Lecture.query.count()
-    total_departments = Department.query.count()
-    
-    # Attendance statistics
-    total_attendance = Attendance.query.count()
-    today_attendance = Attendance.query.join(Lecture).filter(
-        db.func.date(Lecture.date) == datetime.utcnow().date()
-    ).count()
+    counts = dashboard_cache.get(
+        f'admin:statistics:{datetime.utcnow().date()}',
+        _compute_statistics,
+        depends_on=(User, Course, Lecture, Department, Attendance)
+    )
     
     # Recent activities
     recent_activities = ActivityLog.query.order_by(
@@ -794,25 +924,47 @@ def statistics():
     ).limit(10).all()
     
     return render_template('admin/statistics.html',
-                         total_users=total_users,
-                         active_users=active_users,
-                         student_count=student_count,
-                         lecturer_count=lecturer_count,
-                         total_courses=total_courses,
-                         total_lectures=total_lectures,
-                         total_departments=total_departments,
-                         total_attendance=total_attendance,
-                         today_attendance=today_attendance,
                          recent_activities=recent_activities,
-                         datetime=datetime)
+                         datetime=datetime,
+                         **counts)
 
 @admin_bp.route('/attendance')
 @login_required
 @admin_required
 def attendance():
     """View and manage attendance records"""
-    attendance_records = Attendance.query.order_by(Attendance.marked_at.desc()).all()
-    return render_template('admin/attendance.html', attendance_records=attendance_records)
+    filters = _log_filters('course_id', 'user_id', 'status', 'date_from', 'date_to')
+    try:
+        # Many rows share a lecture and marker, so those load with one IN query each
+        query = Attendance.query.options(
+            db.joinedload(Attendance.user),
+            db.selectinload(Attendance.marked_by),
+            db.selectinload(Attendance.lecture).joinedload(Lecture.course)
+        )
+        if 'course_id' in filters:
+            query = query.filter(Attendance.lecture_id.in_(
+                db.session.query(Lecture.id).filter(Lecture.course_id == filters['course_id'])
+            ))
+        for name in ('user_id', 'status'):
+            if name in filters:
+                query = query.filter(getattr(Attendance, name) == filters[name])
+        query = _filter_by_date_range(query, Attendance.timestamp, filters)
+
+        page = _paginate_logs(query, Attendance)
+        courses = Course.query.order_by(Course.code).all()
+        return render_template('admin/attendance.html',
+                             attendance_records=page.items,
+                             page=page,
+                             filters=filters,
+                             courses=courses)
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in attendance: {str(e)}")
+        flash("Error loading attendance records. Please try again later.", "error")
+        return render_template('admin/attendance.html',
+                             attendance_records=[],
+                             page=None,
+                             filters=filters,
+                             courses=[])
 
 @admin_bp.route('/course/enroll', methods=['POST'])
 @login_required
@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required
-from app.models import User, db
+from app.models import User, UserBiometric, db
 from app.hardware.rfid_reader import RFIDReader
 from app.hardware.fingerprint_sensor import FingerprintSensor
 from app.decorators import admin_required
@@ -60,8 +60,7 @@ def capture_fingerprint():
                 template_data, template_hash = result
                 
                 # Check if fingerprint is already registered
-                existing_user = User.query.filter_by(fingerprint_hash=template_hash).first()
-                if existing_user:
+                if UserBiometric.find_by_hash(template_hash) is not None:
                     return jsonify({
                         'success': False,
                         'message': 'This fingerprint is already registered'
@@ -47,19 +47,17 @@ def login():
                     try:
                         # Update last login
                         user.last_login = datetime.utcnow()
-                        
-                        # Create login log
-                        login_log = LoginLog(
+                        db.session.commit()
+
+                        # Audit records are written in the background, outside this transaction
+                        LoginLog.log_activity(
                             user_id=user.id,
                             ip_address=request.remote_addr,
                             user_agent=request.user_agent.string,
                             action='login',
                             status='success'
                         )
-                        db.session.add(login_log)
-                        
-                        # Create activity log
-                        activity_log = ActivityLog.log_activity(
+                        ActivityLog.log_activity(
                             user_id=user.id,
                             action='login',
                             details=f'User logged in from {request.remote_addr}',
@@ -68,9 +66,6 @@ def login():
                             ip_address=request.remote_addr
                         )
                         
-                        # Commit all changes
-                        db.session.commit()
-                        
                         # Log in the user
                         login_user(user, remember=form.remember.data)
                         logger.info(f"User {user.login_id} logged in successfully")
@@ -92,19 +87,13 @@ def login():
                     error = "Invalid login ID or password"
                     
                     # Log failed attempt
-                    try:
-                        login_log = LoginLog(
-                            user_id=user.id,
-                            ip_address=request.remote_addr,
-                            user_agent=request.user_agent.string,
-                            action='login',
-                            status='failed'
-                        )
-                        db.session.add(login_log)
-                        db.session.commit()
-                    except SQLAlchemyError as e:
-                        logger.error(f"Error logging failed login: {str(e)}")
-                        db.session.rollback()
+                    LoginLog.log_activity(
+                        user_id=user.id,
+                        ip_address=request.remote_addr,
+                        user_agent=request.user_agent.string,
+                        action='login',
+                        status='failed'
+                    )
                         
             except Exception as e:
                 logger.error(f"Unexpected error during login: {str(e)}", exc_info=True)
@@ -124,7 +113,7 @@ def logout():
     """Handle user logout."""
     try:
         # Create activity log
-        activity_log = ActivityLog.log_activity(
+        ActivityLog.log_activity(
             user_id=current_user.id,
             action='logout',
             details=f'User logged out from {request.remote_addr}',
@@ -132,10 +121,8 @@ def logout():
             status='success',
             ip_address=request.remote_addr
         )
-        db.session.add(activity_log)
-        db.session.commit()
         
-        # Log out user after successful transaction
+        # Log out user
         user_id = current_user.id
         logout_user()
         logger.info(f"User {user_id} logged out successfully")
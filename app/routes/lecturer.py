@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify, send_file, current_app
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from functools import wraps
 from app.models.course import Course
@@ -6,13 +6,14 @@ from app.models.lecture import Lecture
 from app.models.attendance import Attendance
 from app.models.user import User
 from app.models.notification import Notification
+from app.models.course_student import CourseStudent
 from app.extensions import db, csrf
+from app.services.attendance_report import CourseAttendanceReport
+from app.services.attendance_export import iter_export_rows, iter_csv, iter_html, iter_xlsx
+from app.utils.dashboard_cache import dashboard_cache
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, case
 import re
-import io
-import csv
-import xlsxwriter
 
 lecturer_bp = Blueprint('lecturer', __name__)
 
@@ -25,6 +26,80 @@ def lecturer_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _dashboard_metrics(courses, current_time):
+    """Run the lecturer dashboard's trend, student and per-course count queries."""
+    # Get last semester's courses using proper date comparison
+    current_semester = current_time.strftime('%Y%m')
+    last_semester = f"{int(current_semester) - (6 if current_semester[-2:] == '09' else 7):06d}"
+    
+    last_semester_courses = Course.query.filter(
+        Course.lecturer_id == current_user.id,
+        Course.semester == last_semester
+    ).count()
+    
+    current_semester_courses = len(courses)
+    courses_trend = 0
+    if last_semester_courses > 0:
+        courses_trend = ((current_semester_courses - last_semester_courses) / last_semester_courses) * 100
+
+    # Calculate attendance trends
+    current_week_attendance = db.session.query(
+        func.avg(case((Attendance.status == 'present', 100), else_=0))
+    ).join(Lecture).join(Course).filter(
+        Course.lecturer_id == current_user.id,
+        Lecture.date >= current_time.date() - timedelta(days=7),
+        Lecture.date <= current_time.date()
+    ).scalar() or 0
+
+    last_week_attendance = db.session.query(
+        func.avg(case((Attendance.status == 'present', 100), else_=0))
+    ).join(Lecture).join(Course).filter(
+        Course.lecturer_id == current_user.id,
+        Lecture.date >= current_time.date() - timedelta(days=14),
+        Lecture.date < current_time.date() - timedelta(days=7)
+    ).scalar() or 0
+
+    attendance_trend = float(current_week_attendance - last_week_attendance)
+
+    # Get active and at-risk students
+    total_students = 0
+    active_students = 0
+    at_risk_students = 0
+    
+    for course in courses:
+        course_students = course.enrolled_students.count()
+        total_students += course_students
+        active_students += course.get_active_students_count()
+        at_risk_students += course.get_at_risk_students_count()
+
+    # Get course insights (top 5 courses)
+    course_insights = []
+    for course in courses[:5]:  # Limit to top 5 courses
+        total_lectures = Lecture.query.filter_by(course_id=course.id).count()
+        completed_lectures = Lecture.query.filter(
+            Lecture.course_id == course.id,
+            Lecture.end_time < current_time
+        ).count()
+        
+        course_insights.append({
+            'course_id': course.id,
+            'total_lectures': total_lectures,
+            'completed_lectures': completed_lectures,
+            'completion_rate': (completed_lectures / total_lectures * 100) if total_lectures > 0 else 0,
+            'attendance_rate': float(course.get_attendance_rate()),
+            'student_count': course.enrolled_students.count(),
+            'at_risk_count': course.get_at_risk_students_count()
+        })
+
+    return {
+        'courses_trend': courses_trend,
+        'attendance_trend': attendance_trend,
+        'total_students': total_students,
+        'active_students': active_students,
+        'at_risk_students': at_risk_students,
+        'course_insights': course_insights
+    }
+
 @lecturer_bp.route('/dashboard')
 @login_required
 @lecturer_required
@@ -33,22 +108,15 @@ def dashboard():
         # Get current time
         current_time = datetime.now()
         
-        # Get courses and calculate trends
+        # Get courses
         courses = Course.query.filter_by(lecturer_id=current_user.id).all()
-        
-        # Get last semester's courses using proper date comparison
-        current_semester = current_time.strftime('%Y%m')
-        last_semester = f"{int(current_semester) - (6 if current_semester[-2:] == '09' else 7):06d}"
-        
-        last_semester_courses = Course.query.filter(
-            Course.lecturer_id == current_user.id,
-            Course.semester == last_semester
-        ).count()
-        
-        current_semester_courses = len(courses)
-        courses_trend = 0
-        if last_semester_courses > 0:
-            courses_trend = ((current_semester_courses - last_semester_courses) / last_semester_courses) * 100
+
+        # Counts and trends come from a per-lecturer snapshot
+        metrics = dashboard_cache.get(
+            f'lecturer:{current_user.id}:{current_time.date()}',
+            lambda: _dashboard_metrics(courses, current_time),
+            depends_on=(Course, CourseStudent, Lecture, Attendance)
+        )
 
         # Get today's lectures and completion status
         today_lectures = Lecture.query.join(Course).filter(
@@ -60,36 +128,6 @@ def dashboard():
         completed_today = sum(1 for lecture in today_lectures if lecture.has_ended)
         completion_rate = (completed_today / total_today * 100) if total_today > 0 else 0
 
-        # Calculate attendance trends
-        current_week_attendance = db.session.query(
-            func.avg(case([(Attendance.status == 'present', 100)], else_=0))
-        ).join(Lecture).join(Course).filter(
-            Course.lecturer_id == current_user.id,
-            Lecture.date >= current_time.date() - timedelta(days=7),
-            Lecture.date <= current_time.date()
-        ).scalar() or 0
-
-        last_week_attendance = db.session.query(
-            func.avg(case([(Attendance.status == 'present', 100)], else_=0))
-        ).join(Lecture).join(Course).filter(
-            Course.lecturer_id == current_user.id,
-            Lecture.date >= current_time.date() - timedelta(days=14),
-            Lecture.date < current_time.date() - timedelta(days=7)
-        ).scalar() or 0
-
-        attendance_trend = current_week_attendance - last_week_attendance
-
-        # Get active and at-risk students
-        total_students = 0
-        active_students = 0
-        at_risk_students = 0
-        
-        for course in courses:
-            course_students = course.enrolled_students.count()
-            total_students += course_students
-            active_students += course.get_active_students_count()
-            at_risk_students += course.get_at_risk_students_count()
-
         # Get upcoming week's schedule
         week_start = current_time.date()
         week_end = week_start + timedelta(days=7)
@@ -107,37 +145,25 @@ def dashboard():
                 schedule[day] = []
             schedule[day].append(lecture)
 
-        # Get course insights (top 5 courses)
-        course_insights = []
-        for course in courses[:5]:  # Limit to top 5 courses
-            total_lectures = Lecture.query.filter_by(course_id=course.id).count()
-            completed_lectures = Lecture.query.filter(
-                Lecture.course_id == course.id,
-                Lecture.end_time < current_time
-            ).count()
-            
-            course_insights.append({
-                'course': course,
-                'total_lectures': total_lectures,
-                'completed_lectures': completed_lectures,
-                'completion_rate': (completed_lectures / total_lectures * 100) if total_lectures > 0 else 0,
-                'attendance_rate': course.get_attendance_rate(),
-                'student_count': course.enrolled_students.count(),
-                'at_risk_count': course.get_at_risk_students_count()
-            })
+        # Attach the courses to their cached insights
+        courses_by_id = {course.id: course for course in courses}
+        course_insights = [
+            dict(insight, course=courses_by_id[insight['course_id']])
+            for insight in metrics['course_insights'] if insight['course_id'] in courses_by_id
+        ]
 
         return render_template('lecturer/dashboard.html',
             current_user=current_user,
             now=current_time,
             courses=courses,
-            courses_trend=courses_trend,
+            courses_trend=metrics['courses_trend'],
             total_today=total_today,
             completed_today=completed_today,
             completion_rate=completion_rate,
-            attendance_trend=attendance_trend,
-            total_students=total_students,
-            active_students=active_students,
-            at_risk_students=at_risk_students,
+            attendance_trend=metrics['attendance_trend'],
+            total_students=metrics['total_students'],
+            active_students=metrics['active_students'],
+            at_risk_students=metrics['at_risk_students'],
             schedule=schedule,
             course_insights=course_insights
         )
@@ -182,18 +208,19 @@ def take_attendance(lecture_id):
             return jsonify({'status': 'error', 'message': 'No data provided'}), 400
             
         try:
-            for user_id, status in attendance_data.items():
-                attendance = Attendance(
-                    lecture_id=lecture_id,
-                    user_id=user_id,
-                    status=status,
-                    marked_by_id=current_user.id,
-                    verification_method='manual'
-                )
-                db.session.add(attendance)
-            
-            db.session.commit()
-            return jsonify({'status': 'success', 'message': 'Attendance recorded successfully'})
+            changed = Attendance.bulk_mark(
+                lecture_id,
+                attendance_data,
+                marked_by_id=current_user.id,
+                verification_method='manual'
+            )
+            return jsonify({
+                'status': 'success',
+                'message': 'Attendance recorded successfully',
+                'changed': changed
+            })
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         except Exception as e:
             db.session.rollback()
             current_app.logger.error(f'Error recording attendance: {str(e)}')
@@ -254,31 +281,12 @@ def reports():
     
     if course_id:
         course = Course.query.get_or_404(course_id)
-        students = User.query.filter_by(role='student').join(
-            Course.enrolled_students
-        ).filter(Course.id == course_id).all()
-        
-        attendance_stats = []
-        for student in students:
-            query = Attendance.query.join(Lecture).filter(
-                Lecture.course_id == course_id,
-                Attendance.user_id == student.id
-            )
-            
-            if date_from:
-                query = query.filter(Lecture.date >= datetime.strptime(date_from, '%Y-%m-%d').date())
-            if date_to:
-                query = query.filter(Lecture.date <= datetime.strptime(date_to, '%Y-%m-%d').date())
-            
-            total = query.count()
-            present = query.filter(Attendance.status == 'present').count()
-            
-            attendance_stats.append({
-                'student': student,
-                'total': total,
-                'present': present,
-                'percentage': round((present / total * 100) if total > 0 else 0, 2)
-            })
+        report = CourseAttendanceReport(
+            course_id,
+            date_from=datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None,
+            date_to=datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+        ).load()
+        attendance_stats = report.student_stats()
         
         return render_template('lecturer/reports.html',
                              courses=courses,
@@ -422,125 +430,36 @@ def update_notifications():
 @lecturer_required
 def export_data():
     export_format = request.form.get('format', 'csv')
+    date_stamp = datetime.now().strftime("%Y%m%d")
     
     try:
-        # Get the user's data
-        courses = Course.query.filter_by(lecturer_id=current_user.id).all()
-        lectures = Lecture.query.filter_by(lecturer_id=current_user.id).all()
-        attendance_records = (Attendance.query
-                            .join(Lecture)
-                            .filter(Lecture.lecturer_id == current_user.id)
-                            .all())
+        # Rows are streamed from a single joined select as the response is sent
+        rows = iter_export_rows(current_user.id)
 
         if export_format == 'csv':
-            # Generate CSV
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write headers
-            writer.writerow(['Course Code', 'Course Title', 'Date', 'Time', 'Student', 'Status'])
-            
-            # Write data
-            for record in attendance_records:
-                writer.writerow([
-                    record.lecture.course.code,
-                    record.lecture.course.title,
-                    record.lecture.date.strftime('%Y-%m-%d'),
-                    record.lecture.start_time.strftime('%H:%M'),
-                    record.student.name,
-                    record.status
-                ])
-            
-            # Create response
-            output.seek(0)
-            return send_file(
-                io.BytesIO(output.getvalue().encode('utf-8')),
+            return Response(
+                stream_with_context(iter_csv(rows)),
                 mimetype='text/csv',
-                as_attachment=True,
-                download_name=f'attendance_records_{datetime.now().strftime("%Y%m%d")}.csv'
+                headers={'Content-Disposition': f'attachment; filename=attendance_records_{date_stamp}.csv'}
             )
 
         elif export_format == 'excel':
-            # Generate Excel
-            output = io.BytesIO()
-            workbook = xlsxwriter.Workbook(output)
-            worksheet = workbook.add_worksheet()
-
-            # Add headers
-            headers = ['Course Code', 'Course Title', 'Date', 'Time', 'Student', 'Status']
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header)
-
-            # Add data
-            for row, record in enumerate(attendance_records, start=1):
-                worksheet.write(row, 0, record.lecture.course.code)
-                worksheet.write(row, 1, record.lecture.course.title)
-                worksheet.write(row, 2, record.lecture.date.strftime('%Y-%m-%d'))
-                worksheet.write(row, 3, record.lecture.start_time.strftime('%H:%M'))
-                worksheet.write(row, 4, record.student.name)
-                worksheet.write(row, 5, record.status)
-
-            workbook.close()
-            output.seek(0)
-
-            return send_file(
-                output,
+            return Response(
+                stream_with_context(iter_xlsx(rows)),
                 mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                as_attachment=True,
-                download_name=f'attendance_records_{datetime.now().strftime("%Y%m%d")}.xlsx'
+                headers={'Content-Disposition': f'attachment; filename=attendance_records_{date_stamp}.xlsx'}
             )
 
         elif export_format == 'pdf':
-            # For PDF, we'll generate a simple HTML file that can be printed to PDF by the browser
-            html_content = '''
-            <html>
-            <head>
-                <style>
-                    body { font-family: Arial, sans-serif; }
-                    table { width: 100%; border-collapse: collapse; margin-top: 20px; }
-                    th, td { padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }
-                    th { background-color: #f2f2f2; }
-                    h1 { text-align: center; }
-                </style>
-            </head>
-            <body>
-                <h1>Attendance Records</h1>
-                <table>
-                    <tr>
-                        <th>Course Code</th>
-                        <th>Course Title</th>
-                        <th>Date</th>
-                        <th>Time</th>
-                        <th>Student</th>
-                        <th>Status</th>
-                    </tr>
-            '''
-            
-            for record in attendance_records:
-                html_content += f'''
-                    <tr>
-                        <td>{record.lecture.course.code}</td>
-                        <td>{record.lecture.course.title}</td>
-                        <td>{record.lecture.date.strftime('%Y-%m-%d')}</td>
-                        <td>{record.lecture.start_time.strftime('%H:%M')}</td>
-                        <td>{record.student.name}</td>
-                        <td>{record.status}</td>
-                    </tr>
-                '''
-            
-            html_content += '''
-                </table>
-                <script>
-                    window.onload = function() { window.print(); }
-                </script>
-            </body>
-            </html>
-            '''
-            
-            return html_content, 200, {
-                'Content-Type': 'text/html',
-                'Content-Disposition': f'inline; filename=attendance_records_{datetime.now().strftime("%Y%m%d")}.html'
-            }
+            # For PDF, we stream a simple HTML file that can be printed to PDF by the browser
+            return Response(
+                stream_with_context(iter_html(rows)),
+                mimetype='text/html',
+                headers={'Content-Disposition': f'inline; filename=attendance_records_{date_stamp}.html'}
+            )
+
+        flash('Unsupported export format.', 'error')
+        return redirect(url_for('lecturer.settings'))
 
     except Exception as e:
         flash('An error occurred while exporting your data.', 'error')
@@ -7,6 +7,7 @@ from app.models.attendance import Attendance
 from app.models.activity_log import ActivityLog
 from app.extensions import db
 from app.utils.decorators import lecturer_required
+from app.services.attendance_report import CourseAttendanceReport
 from datetime import datetime, time, timedelta
 from sqlalchemy import func, and_
 
@@ -169,25 +170,25 @@ def take_attendance(lecture_id):
         flash('You do not have access to this lecture.', 'error')
         return redirect(url_for('lecturer.dashboard'))
     
+    students = User.query.join(
+        Course.enrolled_students
+    ).filter(
+        User.role == 'student',
+        Course.id == lecture.course_id
+    ).all()
+    
     if request.method == 'POST':
         try:
-            # Clear existing attendance records
-            Attendance.query.filter_by(lecture_id=lecture_id).delete()
-            
             # Get list of present students
-            present_students = request.form.getlist('present_students')
+            present_students = {int(student_id) for student_id in request.form.getlist('present_students')}
             
-            # Create new attendance records
-            for student_id in present_students:
-                attendance = Attendance(
-                    student_id=student_id,
-                    lecture_id=lecture_id,
-                    course_id=lecture.course_id,
-                    status='present'
-                )
-                db.session.add(attendance)
-            
-            db.session.commit()
+            # Upsert the whole roster in one statement
+            Attendance.bulk_mark(
+                lecture_id,
+                {student.id: 'present' if student.id in present_students else 'absent'
+                 for student in students},
+                marked_by_id=current_user.id
+            )
             
             # Log activity
             ActivityLog.log_activity(
@@ -203,12 +204,6 @@ def take_attendance(lecture_id):
             db.session.rollback()
             flash(f'Error recording attendance: {str(e)}', 'error')
     
-    students = User.query.join(
-        Course.enrolled_students
-    ).filter(
-        User.role == 'student',
-        Course.id == lecture.course_id
-    ).all()
     existing_attendance = {a.student_id: a.status for a in lecture.attendances}
     
     return render_template('lecturer/attendance.html',
@@ -252,39 +247,11 @@ def course_attendance_report(course_id):
         flash('You do not have access to this course.', 'error')
         return redirect(url_for('lecturer.view_courses'))
     
-    lectures = course.lectures.filter_by(lecturer_id=current_user.id).all()
-    students = User.query.join(
-        Course.enrolled_students
-    ).filter(
-        User.role == 'student',
-        Course.id == course_id
-    ).all()
-    
-    # Calculate attendance statistics for each student
-    attendance_data = {}
-    for student in students:
-        student_attendance = []
-        for lecture in lectures:
-            attendance = Attendance.query.filter_by(
-                student_id=student.id,
-                lecture_id=lecture.id
-            ).first()
-            student_attendance.append({
-                'date': lecture.date,
-                'status': attendance.status if attendance else 'absent'
-            })
-        
-        # Calculate attendance rate
-        attended = len([a for a in student_attendance if a['status'] == 'present'])
-        attendance_rate = (attended / len(lectures) * 100) if lectures else 0
-        
-        attendance_data[student.id] = {
-            'attendance': student_attendance,
-            'rate': attendance_rate
-        }
+    # Load the whole course into a student x lecture matrix
+    report = CourseAttendanceReport(course_id).load()
     
     return render_template('lecturer/course_attendance.html',
                          course=course,
-                         lectures=lectures,
-                         students=students,
-                         attendance_data=attendance_data)
+                         lectures=report.lectures,
+                         students=report.students,
+                         attendance_data=report.student_rows())
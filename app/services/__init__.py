@@ -0,0 +1,8 @@
+"""Services package."""
+from .attendance_summary import StudentAttendanceSummary
+from .attendance_report import CourseAttendanceReport
+
+__all__ = [
+    'StudentAttendanceSummary',
+    'CourseAttendanceReport'
+]
@@ -0,0 +1,135 @@
+"""Streaming exports of a lecturer's attendance records."""
+import io
+import csv
+import os
+import tempfile
+from markupsafe import escape
+from sqlalchemy import select
+import xlsxwriter
+from app.extensions import db
+from app.models.attendance import Attendance
+from app.models.course import Course
+from app.models.lecture import Lecture
+from app.models.user import User
+
+EXPORT_HEADERS = ['Course Code', 'Course Title', 'Date', 'Time', 'Student', 'Status']
+
+# Rows fetched per round trip; PostgreSQL uses a server-side cursor
+YIELD_PER = 1000
+
+# Size of the chunks read back from the finished XLSX file
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def iter_export_rows(lecturer_id):
+    """Yield one export row per attendance record for a lecturer's courses.
+
+    Only the exported columns are selected, in a single joined statement
+    streamed with ``yield_per`` so no ORM objects or relationships are
+    loaded.
+    """
+    stmt = select(
+        Course.code,
+        Course.title,
+        Lecture.date,
+        Lecture.start_time,
+        User.first_name,
+        User.last_name,
+        Attendance.status
+    ).select_from(Attendance).join(
+        Lecture, Attendance.lecture_id == Lecture.id
+    ).join(
+        Course, Lecture.course_id == Course.id
+    ).join(
+        User, Attendance.user_id == User.id
+    ).where(
+        Course.lecturer_id == lecturer_id
+    ).order_by(
+        Lecture.date, Lecture.start_time, Course.code
+    ).execution_options(yield_per=YIELD_PER)
+
+    for code, title, date, start_time, first_name, last_name, status in db.session.execute(stmt):
+        yield [
+            code,
+            title,
+            date.strftime('%Y-%m-%d') if date else '',
+            start_time.strftime('%H:%M') if start_time else '',
+            f"{first_name} {last_name}",
+            status
+        ]
+
+
+def iter_csv(rows):
+    """Encode rows as CSV, yielding one chunk per row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data.encode('utf-8')
+
+    writer.writerow(EXPORT_HEADERS)
+    yield flush()
+    for row in rows:
+        writer.writerow(row)
+        yield flush()
+
+
+def iter_html(rows):
+    """Render rows as a printable HTML table, yielding one chunk per row."""
+    yield '''
+            <html>
+            <head>
+                <style>
+                    body { font-family: Arial, sans-serif; }
+                    table { width: 100%; border-collapse: collapse; margin-top: 20px; }
+                    th, td { padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }
+                    th { background-color: #f2f2f2; }
+                    h1 { text-align: center; }
+                </style>
+            </head>
+            <body>
+                <h1>Attendance Records</h1>
+                <table>
+                    <tr>''' + ''.join(f'<th>{header}</th>' for header in EXPORT_HEADERS) + '</tr>\n'
+
+    for row in rows:
+        yield '<tr>' + ''.join(f'<td>{escape(value)}</td>' for value in row) + '</tr>\n'
+
+    yield '''
+                </table>
+                <script>
+                    window.onload = function() { window.print(); }
+                </script>
+            </body>
+            </html>
+            '''
+
+
+def iter_xlsx(rows):
+    """Write rows to an XLSX file in constant memory and stream it back.
+
+    XlsxWriter's ``constant_memory`` mode flushes each row to disk as it is
+    written, so memory stays flat. The workbook can only be sent once it is
+    closed, after which the file is read back in chunks and removed.
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, EXPORT_HEADERS)
+        for row_number, row in enumerate(rows, start=1):
+            worksheet.write_row(row_number, 0, row)
+        workbook.close()
+
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
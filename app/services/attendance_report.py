@@ -0,0 +1,191 @@
+"""Student x lecture attendance matrix for course reports."""
+import numpy as np
+from app.extensions import db
+from app.models.attendance import Attendance
+from app.models.course_student import CourseStudent
+from app.models.lecture import Lecture
+from app.models.user import User
+
+# Status codes stored in the matrix
+NOT_RECORDED = 0
+PRESENT = 1
+LATE = 2
+ABSENT = 3
+
+STATUS_CODES = {
+    'present': PRESENT,
+    'late': LATE,
+    'absent': ABSENT
+}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+
+class CourseAttendanceReport:
+    """Dense student x lecture attendance matrix for a course.
+
+    The course's lectures, enrolled students and attendance records are
+    loaded with one query each. Attendance is stored as an ``int8`` matrix
+    of status codes (rows are students, columns are lectures) and every
+    per-student and per-lecture figure is a vectorized reduction over it.
+    """
+
+    def __init__(self, course_id, date_from=None, date_to=None):
+        """Initialize the report.
+
+        Args:
+            course_id: ID of the course
+            date_from: Optional first lecture date to include
+            date_to: Optional last lecture date to include
+        """
+        self.course_id = course_id
+        self.date_from = date_from
+        self.date_to = date_to
+
+        self.lectures = []
+        self.students = []
+        self.matrix = np.zeros((0, 0), dtype=np.int8)
+        self._loaded = False
+
+    def load(self):
+        """Load lectures, students and attendance into the matrix."""
+        if self._loaded:
+            return self
+
+        lecture_query = Lecture.query.filter(Lecture.course_id == self.course_id)
+        if self.date_from:
+            lecture_query = lecture_query.filter(Lecture.date >= self.date_from)
+        if self.date_to:
+            lecture_query = lecture_query.filter(Lecture.date <= self.date_to)
+        self.lectures = lecture_query.order_by(Lecture.date, Lecture.start_time).all()
+
+        self.students = User.query.join(
+            CourseStudent, CourseStudent.student_id == User.id
+        ).filter(
+            CourseStudent.course_id == self.course_id,
+            User.role == 'student'
+        ).order_by(User.last_name, User.first_name).all()
+
+        attendance_query = db.session.query(
+            Attendance.user_id,
+            Attendance.lecture_id,
+            Attendance.status
+        ).join(
+            Lecture, Attendance.lecture_id == Lecture.id
+        ).filter(Lecture.course_id == self.course_id)
+        if self.date_from:
+            attendance_query = attendance_query.filter(Lecture.date >= self.date_from)
+        if self.date_to:
+            attendance_query = attendance_query.filter(Lecture.date <= self.date_to)
+
+        self._build_matrix(attendance_query.all())
+        self._loaded = True
+        return self
+
+    def _build_matrix(self, records):
+        """Scatter (user_id, lecture_id, status) rows into the matrix."""
+        self.matrix = np.zeros((len(self.students), len(self.lectures)), dtype=np.int8)
+        if not records or not self.students or not self.lectures:
+            return
+
+        user_ids = np.fromiter((r[0] for r in records), dtype=np.int64, count=len(records))
+        lecture_ids = np.fromiter((r[1] for r in records), dtype=np.int64, count=len(records))
+        codes = np.fromiter(
+            (STATUS_CODES.get(r[2], NOT_RECORDED) for r in records),
+            dtype=np.int8, count=len(records)
+        )
+
+        rows = self._positions(np.array([s.id for s in self.students], dtype=np.int64), user_ids)
+        cols = self._positions(np.array([l.id for l in self.lectures], dtype=np.int64), lecture_ids)
+
+        # Drop records for students no longer enrolled
+        keep = (rows >= 0) & (cols >= 0)
+        self.matrix[rows[keep], cols[keep]] = codes[keep]
+
+    @staticmethod
+    def _positions(ids, values):
+        """Index of each value in ``ids``, or -1 where it is missing."""
+        order = np.argsort(ids)
+        sorted_ids = ids[order]
+        idx = np.searchsorted(sorted_ids, values)
+        idx[idx >= len(sorted_ids)] = 0
+        found = sorted_ids[idx] == values
+        return np.where(found, order[idx], -1)
+
+    @property
+    def total_lectures(self):
+        """Number of lectures (matrix columns)."""
+        return len(self.lectures)
+
+    @property
+    def total_students(self):
+        """Number of enrolled students (matrix rows)."""
+        return len(self.students)
+
+    def status_counts(self, status, axis):
+        """Count cells with ``status`` along ``axis`` (1=per student, 0=per lecture)."""
+        return (self.matrix == STATUS_CODES[status]).sum(axis=axis)
+
+    def recorded_counts(self, axis):
+        """Count cells with any attendance record along ``axis``."""
+        return (self.matrix != NOT_RECORDED).sum(axis=axis)
+
+    def student_rates(self):
+        """Present percentage per student over all lectures in the report."""
+        if not self.total_lectures:
+            return np.zeros(self.total_students)
+        return self.status_counts('present', axis=1) * 100.0 / self.total_lectures
+
+    def lecture_rates(self):
+        """Present percentage per lecture over all enrolled students."""
+        if not self.total_students:
+            return np.zeros(self.total_lectures)
+        return self.status_counts('present', axis=0) * 100.0 / self.total_students
+
+    def average_attendance(self):
+        """Present percentage over the whole matrix."""
+        if not self.matrix.size:
+            return 0
+        return float((self.matrix == PRESENT).mean() * 100)
+
+    def student_rows(self):
+        """Per-student rows for the course attendance template.
+
+        Returns:
+            dict: ``{student_id: {'attendance': [...], 'rate': float}}``, with
+            lectures that have no record reported as absent
+        """
+        rates = self.student_rates()
+        dates = [lecture.date for lecture in self.lectures]
+        data = {}
+        for i, student in enumerate(self.students):
+            data[student.id] = {
+                'attendance': [
+                    {'date': date, 'status': STATUS_NAMES.get(int(code), 'absent')}
+                    for date, code in zip(dates, self.matrix[i])
+                ],
+                'rate': float(rates[i])
+            }
+        return data
+
+    def student_stats(self):
+        """Per-student record and present counts for the lecturer reports page."""
+        recorded = self.recorded_counts(axis=1)
+        present = self.status_counts('present', axis=1)
+        return [{
+            'student': student,
+            'total': int(recorded[i]),
+            'present': int(present[i]),
+            'percentage': round(float(present[i]) / recorded[i] * 100, 2) if recorded[i] > 0 else 0
+        } for i, student in enumerate(self.students)]
+
+    def lecture_stats(self):
+        """Per-lecture present counts and percentages."""
+        present = self.status_counts('present', axis=0)
+        rates = self.lecture_rates()
+        return [{
+            'lecture_id': lecture.id,
+            'title': lecture.topic,
+            'date': lecture.date.strftime('%Y-%m-%d'),
+            'attendance_count': int(present[j]),
+            'attendance_percentage': float(rates[j])
+        } for j, lecture in enumerate(self.lectures)]
@@ -0,0 +1,251 @@
+"""Aggregated attendance figures for the student dashboard."""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import func, and_
+from sqlalchemy.orm import joinedload
+from app.extensions import db
+from app.models.attendance import Attendance
+from app.models.course import Course
+from app.models.course_student import CourseStudent
+from app.models.lecture import Lecture
+
+
+class StudentAttendanceSummary:
+    """Build every student dashboard number from a fixed number of queries.
+
+    The summary issues three statements regardless of how many courses the
+    student is enrolled in or how long their streak is:
+
+    1. enrolled courses with their lecture counts
+    2. the student's attendance grouped by (course_id, status, Lecture.date)
+    3. the lectures scheduled for the next ``schedule_days`` days, outer
+       joined to the student's attendance for each of them
+
+    Everything else (rates, streak, trend, schedule) is derived in memory.
+    """
+
+    def __init__(self, student_id, now=None, minimum_attendance=75, schedule_days=7):
+        """Initialize the summary.
+
+        Args:
+            student_id: ID of the student
+            now: Reference time, defaults to ``datetime.now()``
+            minimum_attendance: Attendance percentage below which a course is at risk
+            schedule_days: Number of days to include in the upcoming schedule
+        """
+        self.student_id = student_id
+        self.now = now or datetime.now()
+        self.today = self.now.date()
+        self.minimum_attendance = minimum_attendance
+        self.schedule_days = schedule_days
+
+        self.courses = []
+        self.lecture_counts = {}
+        # {course_id: {status: count}}
+        self.status_counts = defaultdict(lambda: defaultdict(int))
+        # {date: {status: count}}
+        self.daily_counts = defaultdict(lambda: defaultdict(int))
+        self.schedule = []
+        self._loaded = False
+
+    def load(self):
+        """Run the aggregate queries. Safe to call more than once."""
+        if self._loaded:
+            return self
+
+        self._load_courses()
+        self._load_attendance()
+        self._load_schedule()
+        self._loaded = True
+        return self
+
+    def _load_courses(self):
+        """Load enrolled courses together with their lecture counts."""
+        lecture_counts = db.session.query(
+            Lecture.course_id.label('course_id'),
+            func.count(Lecture.id).label('lecture_count')
+        ).group_by(Lecture.course_id).subquery()
+
+        rows = db.session.query(
+            Course,
+            func.coalesce(lecture_counts.c.lecture_count, 0)
+        ).join(
+            CourseStudent, CourseStudent.course_id == Course.id
+        ).outerjoin(
+            lecture_counts, lecture_counts.c.course_id == Course.id
+        ).filter(
+            CourseStudent.student_id == self.student_id
+        ).options(
+            joinedload(Course.lecturer)
+        ).order_by(Course.code).all()
+
+        self.courses = [course for course, _ in rows]
+        self.lecture_counts = {course.id: count for course, count in rows}
+
+    def _load_attendance(self):
+        """Load the student's attendance grouped by course, status and date."""
+        rows = db.session.query(
+            Lecture.course_id,
+            Attendance.status,
+            Lecture.date,
+            func.count(Attendance.id)
+        ).join(
+            Lecture, Attendance.lecture_id == Lecture.id
+        ).filter(
+            Attendance.user_id == self.student_id
+        ).group_by(
+            Lecture.course_id, Attendance.status, Lecture.date
+        ).all()
+
+        for course_id, status, date, count in rows:
+            self.status_counts[course_id][status] += count
+            self.daily_counts[date][status] += count
+
+    def _load_schedule(self):
+        """Load upcoming lectures with the student's attendance status."""
+        end_date = self.today + timedelta(days=self.schedule_days)
+
+        self.schedule = db.session.query(
+            Lecture,
+            Attendance.status
+        ).join(
+            CourseStudent, CourseStudent.course_id == Lecture.course_id
+        ).outerjoin(
+            Attendance, and_(
+                Attendance.lecture_id == Lecture.id,
+                Attendance.user_id == self.student_id
+            )
+        ).filter(
+            CourseStudent.student_id == self.student_id,
+            Lecture.date >= self.today,
+            Lecture.date < end_date
+        ).options(
+            joinedload(Lecture.course)
+        ).order_by(Lecture.date, Lecture.start_time).all()
+
+    @staticmethod
+    def _present_rate(counts):
+        """Percentage of records marked present, 0 when there are none."""
+        total = sum(counts.values())
+        if total == 0:
+            return 0
+        return counts.get('present', 0) * 100 / total
+
+    def course_rate(self, course_id):
+        """Average attendance over the student's records for a course."""
+        return self._present_rate(self.status_counts.get(course_id, {}))
+
+    def _period_rate(self, start, end):
+        """Average attendance for lectures dated in [start, end]."""
+        counts = defaultdict(int)
+        for date, statuses in self.daily_counts.items():
+            if start <= date <= end:
+                for status, count in statuses.items():
+                    counts[status] += count
+        return self._present_rate(counts)
+
+    def attendance_streak(self):
+        """Number of consecutive days, ending today, with a present record."""
+        present_days = {
+            date for date, statuses in self.daily_counts.items()
+            if statuses.get('present')
+        }
+        streak = 0
+        current_date = self.today
+        while current_date in present_days:
+            streak += 1
+            current_date -= timedelta(days=1)
+        return streak
+
+    def attendance_trend(self):
+        """Difference between this week's and last week's attendance rate."""
+        current_week = self._period_rate(self.today - timedelta(days=7), self.today)
+        last_week = self._period_rate(
+            self.today - timedelta(days=14),
+            self.today - timedelta(days=8)
+        )
+        if last_week > 0:
+            return current_week - last_week
+        return 0
+
+    def course_performance(self):
+        """Per-course attendance figures for the dashboard table."""
+        performance = []
+        for course in self.courses:
+            counts = self.status_counts.get(course.id, {})
+            total_course_lectures = self.lecture_counts.get(course.id, 0)
+            attended = counts.get('present', 0)
+
+            performance.append({
+                'code': course.code,
+                'title': course.title,
+                'lecturer': course.lecturer,
+                'attendance_rate': (attended / total_course_lectures * 100) if total_course_lectures > 0 else 0,
+                'lectures_attended': attended,
+                'lectures_missed': counts.get('absent', 0),
+                'minimum_required': self.minimum_attendance
+            })
+        return performance
+
+    def today_lectures(self):
+        """Today's lectures with start/end flags and attendance status."""
+        now_time = self.now.time()
+        return [{
+            'course': lecture.course,
+            'start_time': lecture.start_time,
+            'end_time': lecture.end_time,
+            'room': lecture.room,
+            'lecturer': lecture.lecturer,
+            'has_started': lecture.start_time <= now_time,
+            'has_ended': lecture.end_time < now_time,
+            'attendance_status': status
+        } for lecture, status in self.schedule if lecture.date == self.today]
+
+    def upcoming_week(self):
+        """Lectures for each day of the schedule window.
+
+        Lectures in courses where the student is below the minimum
+        attendance are flagged with ``is_important``.
+        """
+        by_date = defaultdict(list)
+        for lecture, _ in self.schedule:
+            lecture.is_important = self.course_rate(lecture.course_id) < self.minimum_attendance
+            by_date[lecture.date].append(lecture)
+
+        return [{
+            'date': self.today + timedelta(days=i),
+            'lectures': by_date.get(self.today + timedelta(days=i), [])
+        } for i in range(self.schedule_days)]
+
+    def stats(self):
+        """Headline numbers for the dashboard cards."""
+        courses_good = sum(
+            1 for course in self.courses
+            if self.course_rate(course.id) >= self.minimum_attendance
+        )
+        total_lectures = sum(self.lecture_counts.values())
+        total_lectures_attended = sum(
+            statuses.get('present', 0) for statuses in self.daily_counts.values()
+        )
+
+        now_time = self.now.time()
+        lectures_completed = sum(
+            sum(statuses.values())
+            for date, statuses in self.daily_counts.items()
+            if date < self.today
+        ) + sum(
+            1 for lecture, status in self.schedule
+            if status and lecture.date == self.today and lecture.end_time < now_time
+        )
+
+        return {
+            'total_courses': len(self.courses),
+            'courses_good': courses_good,
+            'courses_at_risk': len(self.courses) - courses_good,
+            'total_lectures_attended': total_lectures_attended,
+            'attendance_streak': self.attendance_streak(),
+            'total_lectures': total_lectures,
+            'lectures_completed': lectures_completed,
+            'attendance_rate': (total_lectures_attended / total_lectures * 100) if total_lectures > 0 else 0,
+            'attendance_trend': self.attendance_trend()
+        }
@@ -0,0 +1,282 @@
+"""Asynchronous, batched writing of activity and login audit records."""
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import exc
+from app.extensions import db
+from app.models.activity_log import ActivityLog
+from app.models.login_log import LoginLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds
+
+# What to do with an event when the queue is full: 'drop' it at once, or
+# 'block' the request for up to AUDIT_BLOCK_TIMEOUT seconds and then drop it
+POLICIES = ('drop', 'block')
+
+# Seconds between warnings about dropped events
+DROP_WARNING_INTERVAL = 60
+
+# Errors worth retrying a batch for; anything else is a problem with the rows
+TRANSIENT_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError, exc.TimeoutError)
+
+# Queue entry that makes the writer flush and exit
+_STOP = object()
+
+
+class AuditLogger:
+    """Queue audit records in memory and bulk-insert them from a thread.
+
+    Requests call :meth:`activity` or :meth:`login`, which only put a row
+    on a bounded queue; a writer thread inserts everything waiting, up to
+    ``AUDIT_BATCH_SIZE`` rows per table in one statement, every
+    ``AUDIT_FLUSH_INTERVAL`` seconds. Audit inserts therefore no longer
+    share the request's transaction or add a round trip to it.
+
+    When the queue is full, ``AUDIT_QUEUE_POLICY`` decides whether an
+    event is dropped or the request waits for room; dropped events are
+    counted and logged. Whatever is queued is written when the process
+    exits. With ``AUDIT_JSONL_PATH`` set, every record is also appended to
+    that file as one JSON line, for cold storage. With ``AUDIT_LOG_ASYNC``
+    disabled, as in tests, each record is written immediately instead.
+
+    A batch failing with a transient database error is retried
+    ``AUDIT_RETRY_ATTEMPTS`` times, waiting ``AUDIT_RETRY_BACKOFF`` seconds
+    and doubling each time. A batch that still cannot be inserted is
+    appended to ``AUDIT_FALLBACK_PATH`` with the error, so no record is
+    lost without a trace.
+
+    The writer thread starts on first use, once per process, so each
+    forked server worker gets its own.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._queue = queue.Queue(DEFAULT_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._warned_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize with Flask app."""
+        self.app = app
+        app.config.setdefault('AUDIT_LOG_ASYNC', True)
+        app.config.setdefault('AUDIT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+        app.config.setdefault('AUDIT_QUEUE_POLICY', 'drop')
+        app.config.setdefault('AUDIT_BLOCK_TIMEOUT', 0.5)
+        app.config.setdefault('AUDIT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        app.config.setdefault('AUDIT_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        app.config.setdefault('AUDIT_JSONL_PATH', None)
+        app.config.setdefault('AUDIT_RETRY_ATTEMPTS', 3)
+        app.config.setdefault('AUDIT_RETRY_BACKOFF', 0.5)
+        if not app.config.get('AUDIT_FALLBACK_PATH'):
+            app.config['AUDIT_FALLBACK_PATH'] = os.path.join(app.instance_path, 'audit_failed.jsonl')
+        if app.config['AUDIT_QUEUE_POLICY'] not in POLICIES:
+            raise ValueError(f"AUDIT_QUEUE_POLICY must be one of {POLICIES}")
+
+        self._queue = queue.Queue(app.config['AUDIT_QUEUE_SIZE'])
+        app.extensions['audit_logger'] = self
+        _register_stop(self)
+
+    def activity(self, user_id, action, details=None, resource_type=None, resource_id=None,
+                 status='success', error_message=None, ip_address=None):
+        """Queue an activity log record."""
+        self._enqueue(ActivityLog.__table__, {
+            'user_id': user_id,
+            'action': action,
+            'details': details,
+            'ip_address': ip_address,
+            'timestamp': datetime.utcnow(),
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'status': status,
+            'error_message': error_message
+        })
+
+    def login(self, user_id=None, action='login', status='success', ip_address=None, user_agent=None,
+              details=None):
+        """Queue a login log record."""
+        self._enqueue(LoginLog.__table__, {
+            'user_id': user_id,
+            'timestamp': datetime.utcnow(),
+            'action': action,
+            'status': status,
+            'ip_address': ip_address,
+            'user_agent': user_agent[:255] if user_agent else user_agent,
+            'details': details
+        })
+
+    def _enqueue(self, table, row):
+        if not self.app.config['AUDIT_LOG_ASYNC']:
+            self._write([(table, row)])
+            return
+
+        self._ensure_thread()
+        try:
+            if self.app.config['AUDIT_QUEUE_POLICY'] == 'block':
+                self._queue.put((table, row), timeout=self.app.config['AUDIT_BLOCK_TIMEOUT'])
+            else:
+                self._queue.put_nowait((table, row))
+        except queue.Full:
+            self._dropped()
+
+    def _dropped(self):
+        with self._lock:
+            self.dropped += 1
+            now = time.monotonic()
+            if now - self._warned_at < DROP_WARNING_INTERVAL:
+                return
+            self._warned_at = now
+        logger.warning(f"Audit queue full; {self.dropped} audit records dropped so far")
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._flush_loop, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        interval = self.app.config['AUDIT_FLUSH_INTERVAL']
+        batch_size = self.app.config['AUDIT_BATCH_SIZE']
+        while True:
+            try:
+                entry = self._queue.get(timeout=interval)
+            except queue.Empty:
+                continue
+            stop = entry is _STOP
+            batch = [] if stop else [entry]
+
+            # Collect what else is already waiting, without waiting for more
+            while not stop and len(batch) < batch_size:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stop = True
+                else:
+                    batch.append(entry)
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+            if len(batch) < batch_size:
+                time.sleep(interval)
+
+    def _write(self, batch):
+        """Insert a batch of records, one statement per table, in one transaction."""
+        rows = {}
+        for table, row in batch:
+            rows.setdefault(table, []).append(row)
+        self._append_jsonl(batch, self.app.config['AUDIT_JSONL_PATH'])
+
+        delay = self.app.config['AUDIT_RETRY_BACKOFF']
+        attempts = max(1, self.app.config['AUDIT_RETRY_ATTEMPTS'])
+        for attempt in range(1, attempts + 1):
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as conn:
+                        for table, table_rows in rows.items():
+                            conn.execute(table.insert(), table_rows)
+                break
+            except TRANSIENT_ERRORS as e:
+                if attempt < attempts:
+                    logger.warning(f"Error writing {len(batch)} audit records, retrying in {delay}s: {e}")
+                    time.sleep(delay)
+                    delay *= 2
+                    continue
+                self._failed(batch, e)
+                return
+            except Exception as e:
+                self._failed(batch, e)
+                return
+        with self._lock:
+            self.written += len(batch)
+
+    def _failed(self, batch, error):
+        """Keep a batch that could not be inserted in the fallback file."""
+        with self._lock:
+            self.errors += 1
+        path = self.app.config['AUDIT_FALLBACK_PATH']
+        logger.error(f"Error writing {len(batch)} audit records, appending them to {path}: {error}")
+        self._append_jsonl(batch, path, error=f"{type(error).__name__}: {error}")
+
+    def _append_jsonl(self, batch, path, **extra):
+        if not path:
+            return
+        try:
+            lines = ''.join(
+                json.dumps(dict(row, table=table.name, **extra), default=str, separators=(',', ':')) + '\n'
+                for table, row in batch
+            )
+            with open(path, 'a') as f:
+                f.write(lines)
+        except Exception as e:
+            logger.error(f"Error appending audit records to {path}: {e}")
+
+    def flush(self):
+        """Write everything queued now, from the calling thread."""
+        batch = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                batch.append(entry)
+        for start in range(0, len(batch), self.app.config['AUDIT_BATCH_SIZE']):
+            self._write(batch[start:start + self.app.config['AUDIT_BATCH_SIZE']])
+
+    def stop(self, timeout=10):
+        """Write what is queued and stop the writer thread; called at process exit."""
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                thread.join(timeout)
+            except queue.Full:
+                pass
+        if self.app is not None:
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'errors': self.errors
+            }
+
+
+_stop_registered = set()
+
+
+def _register_stop(audit_logger):
+    """Write what is queued at process exit (once per AuditLogger, however many apps use it)."""
+    if id(audit_logger) in _stop_registered:
+        return
+    _stop_registered.add(id(audit_logger))
+    atexit.register(audit_logger.stop)
+
+
+audit_logger = AuditLogger()
@@ -0,0 +1,127 @@
+"""Push enrolled fingerprint templates to the readers' sensor libraries."""
+import logging
+from datetime import datetime
+from app.extensions import db
+from app.models import User, FingerprintSlot, UserBiometric
+
+logger = logging.getLogger(__name__)
+
+# Templates per STORE_TEMPLATES command; a hex template is about 1 KB and
+# the reader decodes the whole command in RAM
+DEFAULT_BATCH_SIZE = 4
+
+# Slots per DELETE_TEMPLATES command
+DELETE_BATCH_SIZE = 32
+
+# Templates a sensor library holds (R503: 200, R307: 1000)
+DEFAULT_LIBRARY_SIZE = 200
+
+# Seconds a reader gets to store one batch
+DEFAULT_COMMAND_TIMEOUT = 60
+
+
+class FingerprintSync:
+    """Keep each reader's sensor library in step with enrolled users.
+
+    The slot table records which user each library slot should hold. A
+    sync first brings the table in line with the users who have a
+    template, assigning free slots to new ones and marking changed
+    templates for a re-push. It then sends the reader batches of
+    ``DELETE_TEMPLATES`` and ``STORE_TEMPLATES`` commands through the
+    hardware gateway, committing after each batch so an interrupted sync
+    resumes where it stopped.
+    """
+
+    def __init__(self, client, batch_size=DEFAULT_BATCH_SIZE, library_size=DEFAULT_LIBRARY_SIZE,
+                 timeout=DEFAULT_COMMAND_TIMEOUT):
+        self.client = client
+        self.batch_size = batch_size
+        self.library_size = library_size
+        self.timeout = timeout
+
+    def plan(self, device_id):
+        """Update the slot table of a reader.
+
+        Returns:
+            tuple: (slots to store, slots to delete), as FingerprintSlot lists
+        """
+        # Compared by hash; no template bytes are read to plan
+        templates = dict(db.session.query(UserBiometric.user_id, UserBiometric.template_hash).join(
+            User, User.id == UserBiometric.user_id
+        ).filter(User.is_active.is_(True)))
+        slots = {slot.user_id: slot for slot in FingerprintSlot.query.filter_by(device_id=device_id)}
+
+        to_delete = [slot for user_id, slot in slots.items() if user_id not in templates]
+        for user_id, digest in templates.items():
+            slot = slots.get(user_id)
+            if slot is not None and slot.template_hash != digest:
+                slot.template_hash = digest
+                slot.synced_at = None
+
+        used = {slot.slot for slot in slots.values()}
+        free = (number for number in range(1, self.library_size + 1) if number not in used)
+        unassigned = [user_id for user_id in templates if user_id not in slots]
+        for index, user_id in enumerate(unassigned):
+            number = next(free, None)
+            if number is None:
+                logger.warning(f"Fingerprint library of {device_id} is full; "
+                               f"{len(unassigned) - index} users not synced")
+                break
+            db.session.add(FingerprintSlot(device_id=device_id, slot=number, user_id=user_id,
+                                           template_hash=templates[user_id]))
+        db.session.commit()
+
+        to_store = FingerprintSlot.query.filter_by(device_id=device_id, synced_at=None).order_by(
+            FingerprintSlot.slot).all()
+        return to_store, to_delete
+
+    def sync_device(self, device_id):
+        """Bring one reader's library up to date.
+
+        Returns:
+            dict: Counts of ``stored``, ``deleted`` and ``failed`` slots
+        """
+        to_store, to_delete = self.plan(device_id)
+        stats = {'device_id': device_id, 'stored': 0, 'deleted': 0, 'failed': 0}
+
+        for start in range(0, len(to_delete), DELETE_BATCH_SIZE):
+            batch = to_delete[start:start + DELETE_BATCH_SIZE]
+            result = self.client.request('DELETE_TEMPLATES', timeout=self.timeout, device_id=device_id,
+                                         slots=[slot.slot for slot in batch])
+            if result.get('status') != 'success':
+                logger.error(f"Deleting fingerprint templates on {device_id} failed: {result.get('message')}")
+                stats['failed'] += len(batch)
+                continue
+            for slot in batch:
+                db.session.delete(slot)
+            db.session.commit()
+            stats['deleted'] += len(batch)
+
+        for start in range(0, len(to_store), self.batch_size):
+            batch = to_store[start:start + self.batch_size]
+            # Template blobs are read here, a batch at a time, and nowhere on the scan path
+            templates = UserBiometric.templates_for([slot.user_id for slot in batch])
+            result = self.client.request('STORE_TEMPLATES', timeout=self.timeout, device_id=device_id, templates=[
+                {'slot': slot.slot, 'template': templates[slot.user_id].hex()}
+                for slot in batch if templates.get(slot.user_id)
+            ])
+            if result.get('status') != 'success':
+                logger.error(f"Storing fingerprint templates on {device_id} failed: {result.get('message')}")
+                stats['failed'] += len(batch)
+                continue
+            stored = set(result.get('stored', [slot.slot for slot in batch]))
+            now = datetime.utcnow()
+            for slot in batch:
+                if slot.slot in stored:
+                    slot.mark_synced(now)
+                    stats['stored'] += 1
+                else:
+                    stats['failed'] += 1
+            db.session.commit()
+
+        logger.info(f"Fingerprint sync of {device_id}: {stats['stored']} stored, "
+                    f"{stats['deleted']} deleted, {stats['failed']} failed")
+        return stats
+
+    def sync_all(self, device_ids):
+        return [self.sync_device(device_id) for device_id in device_ids]
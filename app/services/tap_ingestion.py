@@ -0,0 +1,460 @@
+"""Write-behind ingestion of attendance taps."""
+import os
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from sqlalchemy import create_engine, exc, select
+from app.models.attendance import Attendance
+from app.models.attendance_rollup import AttendanceRollup
+from app.models.lecture import Lecture
+from app.utils.sql import upsert_insert
+from app.utils.metrics import TAP_RECORD_LATENCY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 0.25  # seconds
+
+# Seconds to wait before retrying a batch after a transient database error
+RETRY_DELAY = 5
+
+# Errors that say nothing about the taps themselves; anything else rejects them
+TRANSIENT_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError, exc.TimeoutError)
+
+# Flush timings kept for the latency percentiles
+LATENCY_SAMPLES = 1000
+
+
+class TapJournal:
+    """Append-only SQLite journal of taps not yet written to the database.
+
+    The journal runs in WAL mode, so an append is one sequential write.
+    With ``synchronous=NORMAL`` an appended tap survives a crash of the
+    process; use ``FULL`` to also survive power loss. Rows are deleted
+    once their batch is committed, and whatever is left is replayed on
+    the next start.
+
+    For readers that buffer taps offline, the journal also keeps the
+    highest sequence number taken from each device, updated in the same
+    transaction as the taps it covers.
+
+    Taps the database rejects, e.g. for a lecture deleted since, are moved
+    to a ``dead_taps`` table with the error, to be looked at by hand.
+    """
+
+    def __init__(self, path, synchronous='NORMAL'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'PRAGMA synchronous={synchronous}')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS taps ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'lecture_id INTEGER NOT NULL, '
+            'user_id INTEGER NOT NULL, '
+            'status TEXT NOT NULL, '
+            'timestamp TEXT NOT NULL, '
+            'verification_method TEXT, '
+            'verification_data TEXT)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS dead_taps ('
+            'seq INTEGER PRIMARY KEY, '
+            'lecture_id INTEGER NOT NULL, '
+            'user_id INTEGER NOT NULL, '
+            'status TEXT NOT NULL, '
+            'timestamp TEXT NOT NULL, '
+            'verification_method TEXT, '
+            'verification_data TEXT, '
+            'error TEXT, '
+            'failed_at TEXT NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS device_sequences ('
+            'device_id TEXT PRIMARY KEY, '
+            'hwm INTEGER NOT NULL)'
+        )
+
+    def _insert(self, tap):
+        return self._conn.execute(
+            'INSERT INTO taps (lecture_id, user_id, status, timestamp, verification_method, '
+            'verification_data) VALUES (?, ?, ?, ?, ?, ?)',
+            (tap['lecture_id'], tap['user_id'], tap['status'], tap['timestamp'],
+             tap.get('verification_method'), tap.get('verification_data'))
+        ).lastrowid
+
+    def append(self, tap):
+        """Append a tap and return its sequence number."""
+        with self._lock:
+            return self._insert(tap)
+
+    def append_batch(self, taps, device_id, hwm):
+        """Append a device's taps and record its high-water mark atomically.
+
+        Args:
+            taps: Taps to append; may be empty when none were accepted
+            device_id: Reader the taps came from
+            hwm: Highest device sequence number covered by this batch
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for tap in taps:
+                    self._insert(tap)
+                self._conn.execute(
+                    'INSERT INTO device_sequences (device_id, hwm) VALUES (?, ?) '
+                    'ON CONFLICT (device_id) DO UPDATE SET hwm = MAX(hwm, excluded.hwm)',
+                    (device_id, hwm)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def high_water_marks(self):
+        """Highest sequence number journaled from each device."""
+        with self._lock:
+            return dict(self._conn.execute('SELECT device_id, hwm FROM device_sequences').fetchall())
+
+    def read(self, limit):
+        """Oldest taps still in the journal."""
+        with self._lock:
+            cursor = self._conn.execute(
+                'SELECT seq, lecture_id, user_id, status, timestamp, verification_method, '
+                'verification_data FROM taps ORDER BY seq LIMIT ?', (limit,)
+            )
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def delete_through(self, seq):
+        """Remove taps up to and including ``seq`` once they are written."""
+        with self._lock:
+            self._conn.execute('DELETE FROM taps WHERE seq <= ?', (seq,))
+
+    def bury(self, failed, seq):
+        """Move rejected taps to ``dead_taps`` and remove taps up to ``seq``, atomically.
+
+        Args:
+            failed: (tap, error message) pairs the database rejected
+            seq: Last journal sequence number of the batch they came from
+        """
+        failed_at = datetime.utcnow().isoformat()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO dead_taps (seq, lecture_id, user_id, status, timestamp, '
+                    'verification_method, verification_data, error, failed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(tap['seq'], tap['lecture_id'], tap['user_id'], tap['status'], tap['timestamp'],
+                      tap.get('verification_method'), tap.get('verification_data'), error, failed_at)
+                     for tap, error in failed]
+                )
+                self._conn.execute('DELETE FROM taps WHERE seq <= ?', (seq,))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def depth(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM taps').fetchone()[0]
+
+    def dead_depth(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM dead_taps').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def make_tap(lecture_id, user_id, status='present', timestamp=None,
+             verification_method='rfid', verification_data=None):
+    """Build a journal entry for a tap."""
+    return {
+        'lecture_id': lecture_id,
+        'user_id': user_id,
+        'status': status,
+        'timestamp': (timestamp or datetime.utcnow()).isoformat(),
+        'verification_method': verification_method,
+        'verification_data': verification_data
+    }
+
+
+def dedupe_taps(taps):
+    """Keep the first tap of each (lecture_id, user_id) pair."""
+    seen = {}
+    for tap in taps:
+        seen.setdefault((tap['lecture_id'], tap['user_id']), tap)
+    return list(seen.values())
+
+
+class AttendanceWriter:
+    """Write a batch of taps as attendance records in one transaction.
+
+    Taps for a student who already has a record for the lecture are
+    skipped, and the rollups of the students that did get a record are
+    refreshed in the same transaction.
+    """
+
+    def __init__(self, database_url=None, engine=None):
+        self.engine = engine if engine is not None else create_engine(database_url)
+
+    def __call__(self, taps):
+        """Insert the taps.
+
+        Returns:
+            int: Number of attendance records inserted
+        """
+        now = datetime.utcnow()
+        rows = [{
+            'lecture_id': tap['lecture_id'],
+            'user_id': tap['user_id'],
+            'status': tap['status'],
+            'timestamp': datetime.fromisoformat(tap['timestamp']),
+            'verification_method': tap['verification_method'],
+            'verification_data': tap['verification_data'],
+            'created_at': now,
+            'updated_at': now
+        } for tap in taps]
+
+        table = Attendance.__table__
+        with self.engine.begin() as conn:
+            stmt = upsert_insert(table, conn).values(rows).on_conflict_do_nothing(
+                index_elements=[table.c.lecture_id, table.c.user_id]
+            ).returning(table.c.lecture_id, table.c.user_id)
+            inserted = conn.execute(stmt).all()
+            if not inserted:
+                return 0
+
+            lecture_ids = {row.lecture_id for row in inserted}
+            courses = dict(conn.execute(
+                select(Lecture.id, Lecture.course_id).where(Lecture.id.in_(lecture_ids))
+            ).all())
+            students = defaultdict(set)
+            for row in inserted:
+                students[courses[row.lecture_id]].add(row.user_id)
+            for course_id, student_ids in students.items():
+                for rollup_stmt in AttendanceRollup.refresh_statements(course_id, student_ids):
+                    conn.execute(rollup_stmt)
+        return len(inserted)
+
+
+class TapIngestionQueue:
+    """Accept taps into a durable journal and write them in micro-batches.
+
+    ``submit`` only appends to the :class:`TapJournal`, so a tap can be
+    acknowledged as soon as it returns. A flusher thread writes the
+    journal to the database every ``flush_interval`` seconds, or as soon as
+    ``batch_size`` taps are waiting, deduplicating each batch and
+    committing it as one transaction. Taps left in the journal by a crash
+    are written first when the queue starts.
+
+    A batch failing with a transient error (connection lost, database
+    unavailable) is retried every ``RETRY_DELAY`` seconds. Any other error
+    means some tap in it cannot be written, so the batch is written again
+    one tap at a time and the taps that still fail are moved to the
+    journal's dead letters, letting later taps through.
+    """
+
+    def __init__(self, journal, writer, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.journal = journal
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+        self._depth = journal.depth()
+        self._device_hwm = journal.high_water_marks()
+        self.replayed = self._depth
+        self.accepted = 0
+        self.written = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.errors = 0
+        self.dead_lettered = 0
+        self.last_flush_at = None
+        self._flush_ms = deque(maxlen=LATENCY_SAMPLES)
+
+    @classmethod
+    def from_path(cls, journal_path, database_url, **kwargs):
+        """Build a queue journaling to ``journal_path`` and writing to ``database_url``."""
+        directory = os.path.dirname(journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return cls(TapJournal(journal_path), AttendanceWriter(database_url), **kwargs)
+
+    def start(self):
+        """Start the flusher thread; replays any journaled taps first."""
+        if self._running:
+            return
+        if self.replayed:
+            logger.info(f"Replaying {self.replayed} journaled taps")
+        self._running = True
+        self._thread = threading.Thread(target=self._flush_loop, name='tap-ingestion', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher thread after writing what is in the journal."""
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            while self.flush():
+                pass
+        except Exception as e:
+            logger.error(f"Taps left in the journal at shutdown: {e}")
+
+    def submit(self, lecture_id, user_id, status='present', timestamp=None,
+               verification_method='rfid', verification_data=None):
+        """Journal a tap for writing.
+
+        Returns:
+            int: Journal sequence number of the tap
+        """
+        seq = self.journal.append(make_tap(lecture_id, user_id, status, timestamp,
+                                           verification_method, verification_data))
+        self._journaled(1)
+        return seq
+
+    def submit_batch(self, device_id, hwm, taps):
+        """Journal taps a reader buffered and advance its high-water mark.
+
+        Idempotent per ``(device_id, seq)``: the caller drops taps at or
+        below :meth:`high_water_mark`, and the taps and the new mark are
+        journaled in one transaction, so a batch the reader resends after
+        a lost acknowledgement is never written twice.
+
+        Args:
+            device_id: Reader the taps came from
+            hwm: Highest device sequence number in the batch, accepted or not
+            taps: Tap dicts built with :func:`make_tap`
+        """
+        self.journal.append_batch(taps, device_id, hwm)
+        with self._lock:
+            self._device_hwm[device_id] = max(hwm, self._device_hwm.get(device_id, 0))
+        self._journaled(len(taps))
+
+    def high_water_mark(self, device_id):
+        """Highest sequence number journaled from a reader, 0 if none."""
+        return self._device_hwm.get(device_id, 0)
+
+    def _journaled(self, count):
+        if not count:
+            return
+        with self._lock:
+            self._depth += count
+            self.accepted += count
+            full = self._depth >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def _flush_loop(self):
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                # Keep flushing while a burst fills whole batches
+                while self._running and self.flush() >= self.batch_size:
+                    pass
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logger.error(f"Error writing taps, retrying in {RETRY_DELAY}s: {e}")
+                time.sleep(RETRY_DELAY)
+
+    def flush(self):
+        """Write one batch from the journal.
+
+        Returns:
+            int: Number of journaled taps consumed
+        """
+        with self._flush_lock:
+            taps = self.journal.read(self.batch_size)
+            if not taps:
+                return 0
+
+            start = time.perf_counter()
+            failed = []
+            try:
+                inserted = self.writer(dedupe_taps(taps))
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception as e:
+                logger.warning(f"Database rejected a batch of {len(taps)} taps, "
+                               f"writing them one at a time: {e}")
+                inserted, failed = self._write_singly(dedupe_taps(taps))
+            if failed:
+                self.journal.bury(failed, taps[-1]['seq'])
+                logger.error(f"Moved {len(failed)} rejected taps to the journal's dead letters")
+            else:
+                self.journal.delete_through(taps[-1]['seq'])
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # Tap timestamps are UTC, as set by make_tap
+        recorded_at = datetime.utcnow()
+        for tap in taps:
+            TAP_RECORD_LATENCY.observe(max((recorded_at - datetime.fromisoformat(tap['timestamp'])).total_seconds(), 0))
+
+        with self._lock:
+            self._depth = max(self._depth - len(taps), 0)
+            self.written += inserted
+            self.duplicates += len(taps) - inserted
+            self.batches += 1
+            self.dead_lettered += len(failed)
+            self.last_flush_at = datetime.utcnow()
+            self._flush_ms.append(elapsed_ms)
+        return len(taps)
+
+    def _write_singly(self, taps):
+        """Write taps one per transaction; a transient error stops and retries them all.
+
+        Returns:
+            tuple: (records inserted, (tap, error message) pairs that were rejected)
+        """
+        inserted = 0
+        failed = []
+        for tap in taps:
+            try:
+                inserted += self.writer([tap])
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception as e:
+                failed.append((tap, f"{type(e).__name__}: {e}"))
+        return inserted, failed
+
+    @property
+    def depth(self):
+        """Taps journaled but not yet written."""
+        return self._depth
+
+    def stats(self):
+        """Queue depth, throughput counters and flush latency in milliseconds."""
+        with self._lock:
+            timings = sorted(self._flush_ms)
+            return {
+                'depth': self._depth,
+                'accepted': self.accepted,
+                'written': self.written,
+                'duplicates': self.duplicates,
+                'replayed': self.replayed,
+                'batches': self.batches,
+                'errors': self.errors,
+                'dead_lettered': self.dead_lettered,
+                'flush_ms_p50': round(timings[len(timings) // 2], 2) if timings else None,
+                'flush_ms_p95': round(timings[int(len(timings) * 0.95)], 2) if timings else None,
+                'flush_ms_max': round(timings[-1], 2) if timings else None,
+                'last_flush_at': self.last_flush_at.isoformat() if self.last_flush_at else None
+            }
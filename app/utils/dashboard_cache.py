@@ -0,0 +1,266 @@
+"""Cached dashboard statistics."""
+import json
+import logging
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+# Connection.info key holding the models written in the current transaction
+CHANGES_KEY = 'dashboard_cache_changes'
+
+REDIS_KEY_PREFIX = 'dashboard:'
+REDIS_CHANGES_KEY = 'dashboard:changed'
+
+# Tables whose committed changes are recorded, by the model snapshots name them
+# with; snapshots may depend on any of them
+WATCHED_TABLES = {
+    'attendances': 'Attendance',
+    'courses': 'Course',
+    'course_students': 'CourseStudent',
+    'departments': 'Department',
+    'lectures': 'Lecture',
+    'users': 'User'
+}
+WATCHED_MODELS = frozenset(WATCHED_TABLES.values())
+
+# Stale snapshots are kept this many TTLs, to be served while one is recomputed
+STALE_TTLS = 10
+
+
+class DashboardCache:
+    """Computed dashboard payloads, per role and scope, with stale-while-revalidate.
+
+    ``get`` returns the snapshot stored under a key, computing it on first
+    use. A snapshot goes stale when its TTL passes or when a committed
+    transaction writes to one of the models it depends on, whether through
+    the ORM or a Core statement such as the attendance upsert. The first caller
+    to find it stale recomputes it; callers arriving meanwhile get the
+    stale snapshot rather than running the same queries. Snapshots younger
+    than ``DASHBOARD_CACHE_MIN_AGE`` are served even after a change, so a
+    burst of attendance writes costs one recompute, not one per view.
+
+    Snapshots and change times are kept in this process, or in Redis when
+    ``DASHBOARD_CACHE_REDIS_URL`` is set, in which case the recompute lock
+    is shared too and only one worker recomputes a snapshot. Another
+    process writing to the database, such as the hardware gateway, marks
+    changes for the web workers when it calls :meth:`watch_writes` with
+    the same Redis URL; otherwise its writes show up when the TTL expires.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._changed = {}
+        self._refreshing = set()
+        self._redis = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize with Flask app."""
+        self.app = app
+        app.config.setdefault('DASHBOARD_CACHE_ENABLED', True)
+        app.config.setdefault('DASHBOARD_CACHE_TTL', 60)
+        app.config.setdefault('DASHBOARD_CACHE_MIN_AGE', 5)
+        app.config.setdefault('DASHBOARD_CACHE_REDIS_URL', None)
+        app.config.setdefault('DASHBOARD_CACHE_LOCK_TIMEOUT', 30)
+        app.extensions['dashboard_cache'] = self
+
+        self.watch_writes(app.config['DASHBOARD_CACHE_REDIS_URL'])
+
+    def watch_writes(self, redis_url=None):
+        """Record this process's committed writes to watched tables.
+
+        Called by ``init_app``; processes without the app, such as the
+        hardware gateway, call it with ``DASHBOARD_CACHE_REDIS_URL`` so web
+        workers see their changes.
+        """
+        if redis_url:
+            import redis
+            self._redis = redis.from_url(redis_url)
+        _register_engine_listeners(self)
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['DASHBOARD_CACHE_ENABLED']
+
+    def get(self, key, compute, depends_on, ttl=None):
+        """Snapshot stored under ``key``, recomputed by ``compute()`` when stale.
+
+        Args:
+            key: Snapshot key, including the role and scope it is for
+            compute: Function returning the payload; it must be JSON-serializable
+            depends_on: Model classes whose changes make the snapshot stale,
+                from ``WATCHED_MODELS``
+            ttl: Seconds the snapshot stays fresh; defaults to ``DASHBOARD_CACHE_TTL``
+
+        Returns:
+            The payload
+        """
+        if not self.enabled:
+            return compute()
+        ttl = ttl or self.app.config['DASHBOARD_CACHE_TTL']
+        models = sorted(model.__name__ for model in depends_on)
+
+        snapshot, changed_at = self._read(key, models)
+        if snapshot is None:
+            self.misses += 1
+            return self._compute(key, compute, ttl)
+        if self._is_fresh(snapshot, changed_at, ttl):
+            self.hits += 1
+            return snapshot['value']
+        if not self._acquire(key):
+            self.stale_hits += 1
+            return snapshot['value']
+        try:
+            self.refreshes += 1
+            return self._compute(key, compute, ttl)
+        except Exception as e:
+            logger.error(f"Error refreshing dashboard snapshot {key}: {e}")
+            return snapshot['value']
+        finally:
+            self._release(key)
+
+    def _is_fresh(self, snapshot, changed_at, ttl):
+        age = time.time() - snapshot['computed_at']
+        if age >= ttl:
+            return False
+        if age < self.app.config['DASHBOARD_CACHE_MIN_AGE']:
+            return True
+        return all(changed <= snapshot['computed_at'] for changed in changed_at)
+
+    def _compute(self, key, compute, ttl):
+        # Stamped before computing, so a change committed meanwhile leaves it stale
+        snapshot = {'computed_at': time.time(), 'value': compute()}
+        if self._redis is not None:
+            try:
+                self._redis.set(f'{REDIS_KEY_PREFIX}{key}', json.dumps(snapshot), ex=int(ttl * STALE_TTLS))
+            except Exception as e:
+                logger.warning(f"Error storing dashboard snapshot {key} in Redis: {e}")
+        else:
+            with self._lock:
+                self._snapshots[key] = snapshot
+                self._prune(ttl)
+        return snapshot['value']
+
+    def _prune(self, ttl):
+        cutoff = time.time() - ttl * STALE_TTLS
+        for key in [key for key, snapshot in self._snapshots.items() if snapshot['computed_at'] < cutoff]:
+            del self._snapshots[key]
+
+    def _read(self, key, models):
+        """The stored snapshot (or None) and its models' last change times."""
+        if self._redis is None:
+            with self._lock:
+                return self._snapshots.get(key), [self._changed.get(model, 0) for model in models]
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.get(f'{REDIS_KEY_PREFIX}{key}')
+            pipe.hmget(REDIS_CHANGES_KEY, models)
+            data, changed_at = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error reading dashboard snapshot {key} from Redis: {e}")
+            return None, []
+        return (json.loads(data) if data else None), [float(changed or 0) for changed in changed_at]
+
+    def _acquire(self, key):
+        """Claim the recompute of a stale snapshot; False if another caller has it."""
+        if self._redis is None:
+            with self._lock:
+                if key in self._refreshing:
+                    return False
+                self._refreshing.add(key)
+                return True
+        try:
+            return bool(self._redis.set(f'{REDIS_KEY_PREFIX}lock:{key}', 1, nx=True,
+                                        ex=self.app.config['DASHBOARD_CACHE_LOCK_TIMEOUT']))
+        except Exception as e:
+            logger.warning(f"Error locking dashboard snapshot {key} in Redis: {e}")
+            return True
+
+    def _release(self, key):
+        if self._redis is None:
+            with self._lock:
+                self._refreshing.discard(key)
+            return
+        try:
+            self._redis.delete(f'{REDIS_KEY_PREFIX}lock:{key}')
+        except Exception as e:
+            logger.warning(f"Error unlocking dashboard snapshot {key} in Redis: {e}")
+
+    def mark_changed(self, models):
+        """Record that rows of these models (class names) changed just now."""
+        now = time.time()
+        if self._redis is None:
+            with self._lock:
+                for model in models:
+                    self._changed[model] = now
+            return
+        try:
+            self._redis.hset(REDIS_CHANGES_KEY, mapping={model: now for model in models})
+        except Exception as e:
+            logger.error(f"Error recording dashboard changes in Redis: {e}")
+
+    def clear(self):
+        """Drop every snapshot held by this process."""
+        with self._lock:
+            self._snapshots.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'backend': 'redis' if self._redis is not None else 'local',
+                'snapshots': len(self._snapshots) if self._redis is None else None,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes
+            }
+
+
+_listeners_registered = False
+
+
+def _register_engine_listeners(cache):
+    """Mark the models written by each committed transaction (once per process).
+
+    Listens to statements on every engine, so ORM flushes, bulk updates and
+    Core inserts or upserts are all seen.
+    """
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    _listeners_registered = True
+
+    @event.listens_for(Engine, 'after_execute')
+    def after_execute(conn, clauseelement, multiparams, params, execution_options, result):
+        if not isinstance(clauseelement, UpdateBase):
+            return
+        model = WATCHED_TABLES.get(getattr(clauseelement.table, 'name', None))
+        if model is not None:
+            conn.info.setdefault(CHANGES_KEY, set()).add(model)
+
+    # Fires just before the database commits; a recompute in that window
+    # may still miss the change, until DASHBOARD_CACHE_TTL
+    @event.listens_for(Engine, 'commit')
+    def commit(conn):
+        touched = conn.info.pop(CHANGES_KEY, None)
+        if touched:
+            cache.mark_changed(touched)
+
+    @event.listens_for(Engine, 'rollback')
+    def rollback(conn):
+        conn.info.pop(CHANGES_KEY, None)
+
+
+dashboard_cache = DashboardCache()
@@ -0,0 +1,124 @@
+"""Database connection pool sizing."""
+import os
+import logging
+import time
+from sqlalchemy.pool import NullPool, QueuePool
+from .metrics import POOL_CHECKOUT_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Pool options that only apply to QueuePool
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_use_lifo')
+
+# Connections each worker's own threads need besides requests: the audit
+# writer and the health checker
+BACKGROUND_CONNECTIONS = 2
+
+
+class PoolBudget:
+    """How a global database connection budget is split across workers.
+
+    Every worker process holds its own pool, so the server as a whole can
+    open ``workers * (pool_size + max_overflow)`` connections. Pools are
+    sized so that total never exceeds the budget: each worker gets
+    ``budget // workers`` connections, further capped at its concurrency
+    (one connection per thread or greenlet) plus ``BACKGROUND_CONNECTIONS``
+    for its background threads, with no overflow.
+    """
+
+    def __init__(self, workers, concurrency, budget, external_pooler=False):
+        if workers < 1 or concurrency < 1:
+            raise ValueError('workers and concurrency must be at least 1')
+        if not external_pooler and workers > budget:
+            raise ValueError(
+                f"{workers} workers exceed the database connection budget of {budget}; "
+                f"reduce WEB_CONCURRENCY or raise DB_CONNECTION_BUDGET"
+            )
+        self.workers = workers
+        self.concurrency = concurrency
+        self.budget = budget
+        self.external_pooler = external_pooler
+        self.pool_size = 0 if external_pooler else min(concurrency + BACKGROUND_CONNECTIONS, budget // workers)
+
+    @property
+    def total_connections(self):
+        """Connections the whole server can hold open at once."""
+        return self.workers * self.pool_size
+
+    def describe(self):
+        """One-line summary for the startup log."""
+        if self.external_pooler:
+            return (f"{self.workers} workers x {self.concurrency} concurrent requests; "
+                    f"connections are pooled externally (NullPool)")
+        message = (f"{self.workers} workers x pool_size {self.pool_size} = "
+                   f"{self.total_connections} connections (budget {self.budget})")
+        needed = self.concurrency + BACKGROUND_CONNECTIONS
+        if self.pool_size < needed:
+            message += (f"; {needed - self.pool_size} of {needed} threads per worker "
+                        f"({self.concurrency} for requests) may wait for a connection")
+        return message
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def budget_from_config(config):
+    """Build the PoolBudget described by the app configuration.
+
+    Worker counts are read from the environment when the pool is built,
+    not from when config.py was imported, since gunicorn_config.py sets
+    them after the master may already have loaded the app package.
+    """
+    return PoolBudget(
+        workers=int(os.environ.get('WEB_CONCURRENCY', config['SERVER_WORKERS'])),
+        concurrency=int(os.environ.get('SERVER_CONCURRENCY', config['SERVER_CONCURRENCY'])),
+        budget=config['DB_CONNECTION_BUDGET'],
+        external_pooler=config['DB_EXTERNAL_POOLER']
+    )
+
+
+def engine_options(config):
+    """Compute SQLALCHEMY_ENGINE_OPTIONS for this process.
+
+    Starts from the configured options and overrides the pool size from
+    the connection budget. Behind an external pooler such as PgBouncer in
+    transaction mode, NullPool is used so connections are returned to the
+    pooler after every checkout. SQLite does not use QueuePool options.
+
+    Args:
+        config: Flask app config
+
+    Returns:
+        dict: Engine options
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+
+    if uri.startswith('sqlite'):
+        for key in QUEUE_POOL_OPTIONS:
+            options.pop(key, None)
+        return options
+
+    budget = budget_from_config(config)
+    if budget.external_pooler:
+        for key in QUEUE_POOL_OPTIONS:
+            options.pop(key, None)
+        # The pooler owns connection liveness and lifetime
+        options.pop('pool_pre_ping', None)
+        options.pop('pool_recycle', None)
+        options['poolclass'] = NullPool
+    else:
+        options['pool_size'] = budget.pool_size
+        options['max_overflow'] = 0
+        options['poolclass'] = TimedQueuePool
+
+    logger.info(f"Database pool: {budget.describe()}")
+    return options
@@ -1,18 +1,17 @@
 import requests
 import json
-import serial
 import time
 from flask import current_app
-from threading import Lock
+from app.hardware.client import SERIAL_DEVICE_ID, get_hardware_client
 
 class HardwareController:
     """Controller class for managing the NodeMCU-based attendance system hardware."""
     
     def __init__(self):
-        self._serial_port = None
+        # The serial port itself is opened by the hardware gateway process
+        self._client = get_hardware_client()
         self._port_name = None
         self._connected = False
-        self._lock = Lock()
         self._last_status = {
             'battery': 0,
             'charging': False,
@@ -33,50 +32,44 @@ class HardwareController:
             bool: True if connection successful, False otherwise
         """
         try:
-            with self._lock:
-                if self._connected:
-                    return True
-                
-                self._serial_port = serial.Serial(port_name, baudrate, timeout=1)
-                time.sleep(2)  # Wait for connection to stabilize
-                
-                # Test connection and get initial status
-                self._serial_port.write(b'STATUS\n')
-                response = self._serial_port.readline().decode().strip()
-                
-                if response.startswith('STATUS:'):
-                    self._connected = True
-                    self._port_name = port_name
-                    self._parse_status(response)
-                    return True
-                else:
-                    self._serial_port.close()
-                    self._serial_port = None
-                    return False
+            if self._connected:
+                return True
+
+            result = self._client.request('OPEN_SERIAL', port=port_name, baudrate=baudrate)
+            if result.get('status') != 'success':
+                return False
+
+            # Test connection and get initial status
+            self._connected = True
+            success, response = self.send_command('STATUS')
+            if success and response.startswith('STATUS:'):
+                self._port_name = port_name
+                self._parse_status(response)
+                return True
+
+            self._connected = False
+            self._client.request('CLOSE_SERIAL')
+            return False
                     
         except Exception as e:
             current_app.logger.error(f"Error connecting to NodeMCU: {e}")
-            if self._serial_port:
-                self._serial_port.close()
-                self._serial_port = None
+            self._connected = False
             return False
     
     def disconnect(self):
         """Disconnect from the NodeMCU."""
-        with self._lock:
-            if self._serial_port:
-                self._serial_port.write(b'DISCONNECT\n')  # Notify device we're disconnecting
-                time.sleep(0.1)  # Give device time to process
-                self._serial_port.close()
-            self._serial_port = None
-            self._connected = False
-            self._last_status = {
-                'battery': 0,
-                'charging': False,
-                'fingerprint': False,
-                'rfid': False,
-                'display': False
-            }
+        if self._connected:
+            self.send_command('DISCONNECT')  # Notify device we're disconnecting
+            self._client.request('CLOSE_SERIAL')
+        self._port_name = None
+        self._connected = False
+        self._last_status = {
+            'battery': 0,
+            'charging': False,
+            'fingerprint': False,
+            'rfid': False,
+            'display': False
+        }
     
     def is_connected(self):
         """Check if NodeMCU is connected."""
@@ -140,10 +133,12 @@ class HardwareController:
             return False, "Not connected"
             
         try:
-            with self._lock:
-                self._serial_port.write(f"{command}\n".encode())
-                response = self._serial_port.readline().decode().strip()
-                return True, response
+            # The gateway serializes commands on the port; only this thread waits
+            result = self._client.request(command, timeout=current_app.config.get('HARDWARE_COMMAND_TIMEOUT', 30),
+                                          device_id=SERIAL_DEVICE_ID)
+            if result.get('status') != 'success':
+                return False, result.get('message', 'Command failed')
+            return True, result.get('raw', '')
         except Exception as e:
             current_app.logger.error(f"Error sending command: {e}")
             return False, str(e)
@@ -0,0 +1,124 @@
+"""Cached database health checks."""
+import os
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import text
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+class HealthChecker:
+    """Check database connectivity in the background and cache the result.
+
+    A daemon thread runs ``SELECT 1`` every ``HEALTH_CHECK_INTERVAL``
+    seconds, so health probes only read the cached state. With
+    ``HEALTH_CHECK_BACKGROUND`` disabled, the check instead runs on the
+    first probe after the cached state expires. Either way, probes issue at
+    most one statement per interval.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._lock = threading.Lock()
+        self._state = None
+        self._checked_at = 0.0
+        self._pid = None
+        self._running = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize with Flask app."""
+        self.app = app
+        app.config.setdefault('HEALTH_CHECK_INTERVAL', 15)
+        app.config.setdefault('HEALTH_CHECK_BACKGROUND', True)
+        app.extensions['health_checker'] = self
+
+    @property
+    def interval(self):
+        return self.app.config['HEALTH_CHECK_INTERVAL']
+
+    def _ensure_thread(self):
+        """Start the checker thread, once per process.
+
+        Started lazily so each forked server worker gets its own thread.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._running = True
+            thread = threading.Thread(target=self._check_loop, name='health-checker', daemon=True)
+            thread.start()
+
+    def _check_loop(self):
+        """Main checking loop."""
+        while self._running:
+            self.check()
+            time.sleep(self.interval)
+
+    def check(self):
+        """Run the database check now and cache the result.
+
+        Returns:
+            dict: Health state
+        """
+        start = time.perf_counter()
+        try:
+            with self.app.app_context():
+                db.session.execute(text('SELECT 1'))
+                db.session.remove()
+            state = {
+                'status': 'healthy',
+                'database': 'connected',
+                'latency_ms': round((time.perf_counter() - start) * 1000, 2)
+            }
+        except Exception as e:
+            logger.error(f"Health check failed: {e}")
+            state = {
+                'status': 'unhealthy',
+                'database': 'unavailable',
+                'error': str(e)
+            }
+        state['checked_at'] = datetime.utcnow().isoformat()
+
+        with self._lock:
+            self._state = state
+            self._checked_at = time.monotonic()
+        return state
+
+    def get_state(self):
+        """Get the cached health state.
+
+        Returns:
+            tuple: (state dict, HTTP status code)
+        """
+        if self.app.config['HEALTH_CHECK_BACKGROUND']:
+            self._ensure_thread()
+            with self._lock:
+                state, checked_at = self._state, self._checked_at
+            if state is None:
+                state = self.check()
+            elif time.monotonic() - checked_at > self.interval * 3:
+                # The checker thread has stalled; report it rather than stale data
+                state = {**state, 'status': 'unhealthy', 'error': 'Health check is stale'}
+        else:
+            with self._lock:
+                state, checked_at = self._state, self._checked_at
+            if state is None or time.monotonic() - checked_at > self.interval:
+                state = self.check()
+
+        return state, 200 if state['status'] == 'healthy' else 503
+
+    def stop(self):
+        """Stop the checker thread."""
+        self._running = False
+
+
+health_checker = HealthChecker()
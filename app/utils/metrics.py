@@ -0,0 +1,142 @@
+"""Prometheus metrics for requests, the database and the hardware gateway.
+
+Under gunicorn every worker is a separate process, so metrics are kept in
+prometheus_client's multiprocess mode: each process writes its values to
+mmap files in ``PROMETHEUS_MULTIPROC_DIR`` and ``/metrics`` adds them up
+across all of them. gunicorn_config.py sets the directory; run the
+hardware gateway with the same ``PROMETHEUS_MULTIPROC_DIR`` for its
+command, tap and fan-out metrics to appear as well. Without the variable
+each process only reports its own values.
+"""
+import os
+import time
+import logging
+from flask import g, request, Response, has_request_context
+from prometheus_client import (
+    CollectorRegistry, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to handle a request',
+    ['method', 'endpoint', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUEST_STATEMENTS = Histogram(
+    'http_request_sql_statements', 'SQL statements issued while handling a request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time waited for a pooled database connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+HARDWARE_COMMAND_DURATION = Histogram(
+    'hardware_command_duration_seconds', 'Round trip of a gateway command to a reader',
+    ['command', 'status'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+TAP_RECORD_LATENCY = Histogram(
+    'tap_record_latency_seconds', 'Time from a tap on the reader to its attendance record committing',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 60, 300, 3600, 86400)
+)
+FANOUT_QUEUE_DEPTH = Gauge(
+    'hardware_fanout_queue_depth', 'Deepest web client send queue after the last publish',
+    multiprocess_mode='livemax'
+)
+
+
+def registry():
+    """Registry to expose: all processes' values in multiprocess mode, else this one's."""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    collector_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collector_registry)
+    return collector_registry
+
+
+def remove_dead_process_files(path):
+    """Delete metric files left by processes that are no longer running.
+
+    Called when gunicorn starts, so values from a previous run are not
+    added to the new one's. Files of live processes, such as a running
+    hardware gateway, are kept.
+    """
+    if not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        pid = name.rsplit('_', 1)[-1].split('.', 1)[0]
+        if not name.endswith('.db') or not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            os.remove(os.path.join(path, name))
+        except PermissionError:
+            pass
+
+
+class Metrics:
+    """Time requests, count their SQL statements and serve ``/metrics``."""
+
+    def __init__(self, app=None):
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize with Flask app."""
+        self.app = app
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        _register_engine_listeners()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        from app.extensions import limiter
+        app.add_url_rule('/metrics', 'metrics', limiter.exempt(metrics_view))
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_statements = 0
+
+    def _after_request(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(request.method, endpoint, response.status_code).observe(
+            time.perf_counter() - started
+        )
+        REQUEST_STATEMENTS.labels(endpoint).observe(g.pop('_metrics_statements', 0))
+        return response
+
+
+def metrics_view():
+    """Prometheus text exposition of every process's metrics."""
+    return Response(generate_latest(registry()), mimetype=CONTENT_TYPE_LATEST)
+
+
+_listeners_registered = False
+
+
+def _register_engine_listeners():
+    """Count statements issued during requests on every engine (once per process)."""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    _listeners_registered = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and '_metrics_statements' in g:
+            g._metrics_statements += 1
+
+
+metrics = Metrics()
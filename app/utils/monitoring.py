@@ -2,162 +2,215 @@
 import logging
 import psutil
 import time
+from array import array
 from datetime import datetime
 import threading
-from flask import current_app
 import os
 import json
 
 logger = logging.getLogger(__name__)
 
+# Usage percentage above which a resource is reported as a warning
+WARNING_PERCENT = 80
+
+# Seconds from starting the sampling thread to its first sample, so the
+# first CPU reading covers a real interval rather than none at all
+FIRST_SAMPLE_DELAY = 1
+
+# Columns of a sample, in record order
+SAMPLE_FIELDS = ('timestamp', 'cpu_percent', 'memory_percent', 'memory_available',
+                 'disk_percent', 'disk_free')
+
+
+class RingBuffer:
+    """Fixed-size columns of floats holding the most recent samples.
+
+    Storage is allocated once; appending overwrites the oldest sample in
+    place, so the buffer never grows or needs trimming.
+    """
+
+    def __init__(self, fields, capacity):
+        self.fields = fields
+        self.capacity = capacity
+        self.columns = {field: array('d', bytes(8 * capacity)) for field in fields}
+        self.size = 0
+        self._next = 0
+
+    def append(self, values):
+        for field, value in zip(self.fields, values):
+            self.columns[field][self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def latest(self):
+        """The newest sample as a dict, or None when empty."""
+        if not self.size:
+            return None
+        index = (self._next - 1) % self.capacity
+        return {field: self.columns[field][index] for field in self.fields}
+
+    def since(self, timestamp):
+        """Samples newer than ``timestamp``, oldest first, as one list per field."""
+        start = (self._next - self.size) % self.capacity
+        indexes = [(start + offset) % self.capacity for offset in range(self.size)]
+        indexes = [index for index in indexes if self.columns['timestamp'][index] > timestamp]
+        return {field: [self.columns[field][index] for index in indexes] for field in self.fields}
+
+
 class SystemMonitor:
-    """Monitor system resources and application health."""
-    
+    """Sample system resources in the background and serve the latest sample.
+
+    A daemon thread samples every ``check_interval`` seconds into a ring
+    buffer holding 24 hours of samples. CPU usage is the delta of CPU
+    times since the previous sample, so sampling never sleeps. Each
+    sample is also appended as one compact JSON line to the day's file
+    under ``instance/stats``. ``get_system_health`` only reads the latest
+    sample and does not block; until the first sample is taken,
+    ``FIRST_SAMPLE_DELAY`` after the thread starts, it reports ``starting``.
+    """
+
     def __init__(self, app=None, check_interval=60):
         """Initialize system monitor.
-        
+
         Args:
             app: Flask application instance
             check_interval: Interval between checks in seconds
         """
         self.app = app
         self.check_interval = check_interval
-        self.monitoring = False
-        self.stats = {
-            'start_time': datetime.now().isoformat(),
-            'cpu_usage': [],
-            'memory_usage': [],
-            'disk_usage': [],
-            'active_connections': 0,
-            'requests_per_minute': 0,
-            'errors_per_minute': 0
-        }
-        
+        self.start_time = datetime.now()
+        self.samples = RingBuffer(SAMPLE_FIELDS, max(1, (24 * 60 * 60) // check_interval))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pid = None
+        self.stats_dir = None
+        self.memory_total = None
+        self.disk_total = None
+
         if app is not None:
             self.init_app(app)
-    
+
     def init_app(self, app):
         """Initialize with Flask app."""
         self.app = app
-        
+
         # Create stats directory if it doesn't exist
-        stats_dir = os.path.join(app.instance_path, 'stats')
-        os.makedirs(stats_dir, exist_ok=True)
-        
-        # Start monitoring in a separate thread
-        if not self.monitoring:
-            thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.stats_dir = os.path.join(app.instance_path, 'stats')
+        os.makedirs(self.stats_dir, exist_ok=True)
+        app.extensions['system_monitor'] = self
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        """Start the sampling thread, once per process.
+
+        Also called from ``get_system_health`` so each forked server worker
+        gets its own thread.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._stop.clear()
+            thread = threading.Thread(target=self._monitor_loop, name='system-monitor', daemon=True)
             thread.start()
-    
+
     def _monitor_loop(self):
         """Main monitoring loop."""
-        self.monitoring = True
-        while self.monitoring:
+        # psutil keeps CPU times per thread, so the baseline is taken here;
+        # the first call only records them for the next one to compare with
+        psutil.cpu_percent(interval=None)
+        delay = FIRST_SAMPLE_DELAY
+        while not self._stop.wait(delay):
+            delay = self.check_interval
             try:
-                self._collect_stats()
-                self._save_stats()
-                time.sleep(self.check_interval)
+                self._save_stats(self._collect_stats())
             except Exception as e:
                 logger.error(f"Error in monitoring loop: {e}")
-    
+
     def _collect_stats(self):
-        """Collect system statistics."""
-        try:
-            # System stats
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
-            # Update stats
-            timestamp = datetime.now().isoformat()
-            
-            self.stats['cpu_usage'].append({
-                'timestamp': timestamp,
-                'value': cpu_percent
-            })
-            
-            self.stats['memory_usage'].append({
-                'timestamp': timestamp,
-                'total': memory.total,
-                'available': memory.available,
-                'percent': memory.percent
-            })
-            
-            self.stats['disk_usage'].append({
-                'timestamp': timestamp,
-                'total': disk.total,
-                'used': disk.used,
-                'free': disk.free,
-                'percent': disk.percent
-            })
-            
-            # Keep only last 24 hours of data
-            max_entries = (24 * 60 * 60) // self.check_interval
-            for key in ['cpu_usage', 'memory_usage', 'disk_usage']:
-                self.stats[key] = self.stats[key][-max_entries:]
-            
-            # Log warning if resources are running low
-            if cpu_percent > 80:
-                logger.warning(f"High CPU usage: {cpu_percent}%")
-            if memory.percent > 80:
-                logger.warning(f"High memory usage: {memory.percent}%")
-            if disk.percent > 80:
-                logger.warning(f"High disk usage: {disk.percent}%")
-            
-        except Exception as e:
-            logger.error(f"Error collecting system stats: {e}")
-    
-    def _save_stats(self):
-        """Save statistics to file."""
+        """Take one sample and add it to the ring buffer.
+
+        Returns:
+            tuple: The sample, in ``SAMPLE_FIELDS`` order
+        """
+        cpu_percent = psutil.cpu_percent(interval=None)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        sample = (time.time(), cpu_percent, memory.percent, memory.available, disk.percent, disk.free)
+        self.memory_total, self.disk_total = memory.total, disk.total
+        with self._lock:
+            self.samples.append(sample)
+
+        # Log warning if resources are running low
+        if cpu_percent > WARNING_PERCENT:
+            logger.warning(f"High CPU usage: {cpu_percent}%")
+        if memory.percent > WARNING_PERCENT:
+            logger.warning(f"High memory usage: {memory.percent}%")
+        if disk.percent > WARNING_PERCENT:
+            logger.warning(f"High disk usage: {disk.percent}%")
+        return sample
+
+    def _save_stats(self, sample):
+        """Append a sample to the day's stats file."""
+        if self.stats_dir is None:
+            return
         try:
-            stats_file = os.path.join(
-                self.app.instance_path,
-                'stats',
-                f"stats_{datetime.now().strftime('%Y%m%d')}.json"
-            )
-            
-            with open(stats_file, 'w') as f:
-                json.dump(self.stats, f, indent=2)
-            
+            stats_file = os.path.join(self.stats_dir, f"stats_{datetime.now().strftime('%Y%m%d')}.jsonl")
+            with open(stats_file, 'a') as f:
+                f.write(json.dumps(sample, separators=(',', ':')) + '\n')
         except Exception as e:
             logger.error(f"Error saving stats: {e}")
-    
+
+    def history(self, seconds=3600):
+        """Samples from the last ``seconds``, as one list per field."""
+        with self._lock:
+            return self.samples.since(time.time() - seconds)
+
     def get_system_health(self):
-        """Get current system health status.
-        
+        """Get current system health status from the latest sample.
+
         Returns:
             dict: System health information
         """
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
+            self._ensure_thread()
+            with self._lock:
+                sample = self.samples.latest()
+            if sample is None:
+                return {'status': 'starting', 'message': 'No sample taken yet',
+                        'timestamp': datetime.now().isoformat()}
+
+            cpu_percent = sample['cpu_percent']
+            memory_percent = sample['memory_percent']
+            disk_percent = sample['disk_percent']
             return {
-                'status': 'healthy' if all(x < 80 for x in [cpu_percent, memory.percent, disk.percent]) else 'warning',
+                'status': 'healthy' if all(x < WARNING_PERCENT for x in [cpu_percent, memory_percent, disk_percent]) else 'warning',
                 'cpu': {
                     'usage_percent': cpu_percent,
-                    'status': 'ok' if cpu_percent < 80 else 'warning'
+                    'status': 'ok' if cpu_percent < WARNING_PERCENT else 'warning'
                 },
                 'memory': {
-                    'total': memory.total,
-                    'available': memory.available,
-                    'usage_percent': memory.percent,
-                    'status': 'ok' if memory.percent < 80 else 'warning'
+                    'total': self.memory_total,
+                    'available': int(sample['memory_available']),
+                    'usage_percent': memory_percent,
+                    'status': 'ok' if memory_percent < WARNING_PERCENT else 'warning'
                 },
                 'disk': {
-                    'total': disk.total,
-                    'free': disk.free,
-                    'usage_percent': disk.percent,
-                    'status': 'ok' if disk.percent < 80 else 'warning'
+                    'total': self.disk_total,
+                    'free': int(sample['disk_free']),
+                    'usage_percent': disk_percent,
+                    'status': 'ok' if disk_percent < WARNING_PERCENT else 'warning'
                 },
-                'timestamp': datetime.now().isoformat()
+                'timestamp': datetime.fromtimestamp(sample['timestamp']).isoformat()
             }
-            
+
         except Exception as e:
             logger.error(f"Error getting system health: {e}")
             return {'status': 'error', 'message': str(e)}
-    
+
     def stop(self):
         """Stop monitoring."""
-        self.monitoring = False
+        self._stop.set()
@@ -0,0 +1,116 @@
+"""Keyset (seek) pagination over ``(timestamp, id)`` ordered tables."""
+import base64
+import logging
+from datetime import datetime
+from sqlalchemy import tuple_
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def encode_cursor(timestamp, row_id):
+    """Encode a row's sort key as an opaque URL-safe cursor.
+
+    Args:
+        timestamp: Timestamp of the row
+        row_id: Primary key of the row
+
+    Returns:
+        str: Cursor string
+    """
+    raw = f"{timestamp.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by :func:`encode_cursor`.
+
+    Args:
+        cursor: Cursor string
+
+    Returns:
+        tuple: ``(timestamp, id)``, or None if the cursor is invalid
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        logger.warning(f"Ignoring invalid pagination cursor: {cursor!r}")
+        return None
+
+
+class KeysetPage:
+    """One page of rows ordered newest first by ``(timestamp, id)``."""
+
+    def __init__(self, items, per_page, has_newer, has_older):
+        self.items = items
+        self.per_page = per_page
+        self.has_newer = has_newer
+        self.has_older = has_older
+
+    def _cursor(self, item):
+        return encode_cursor(item.timestamp, item.id)
+
+    @property
+    def newer_cursor(self):
+        """Cursor for the page before this one, or None."""
+        return self._cursor(self.items[0]) if self.has_newer and self.items else None
+
+    @property
+    def older_cursor(self):
+        """Cursor for the page after this one, or None."""
+        return self._cursor(self.items[-1]) if self.has_older and self.items else None
+
+
+def per_page_arg(value, default=DEFAULT_PER_PAGE):
+    """Clamp a requested page size to ``1..MAX_PER_PAGE``."""
+    try:
+        return max(1, min(int(value), MAX_PER_PAGE))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_paginate(query, model, after=None, before=None, per_page=DEFAULT_PER_PAGE):
+    """Fetch one page of a query newest first, seeking on ``(timestamp, id)``.
+
+    Each page is a ``LIMIT per_page + 1`` range scan of the
+    ``(timestamp, id)`` index starting at the cursor, so the cost does not
+    grow with how deep into the table the page is. Rows with a NULL
+    timestamp are never returned.
+
+    Args:
+        query: Unordered query over ``model`` with filters and loader options
+        model: Mapped class with ``timestamp`` and ``id`` columns
+        after: Cursor of the last row seen; returns the older rows
+        before: Cursor of the first row seen; returns the newer rows
+        per_page: Number of rows per page
+
+    Returns:
+        KeysetPage: The requested page
+    """
+    key = tuple_(model.timestamp, model.id)
+    query = query.filter(model.timestamp.isnot(None))
+
+    before_key = decode_cursor(before)
+    if before_key:
+        # Walk forwards from the cursor, then flip back to newest first
+        rows = query.filter(key > before_key)\
+                    .order_by(model.timestamp.asc(), model.id.asc())\
+                    .limit(per_page + 1)\
+                    .all()
+        has_newer = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], per_page, has_newer=has_newer, has_older=True)
+
+    after_key = decode_cursor(after)
+    if after_key:
+        query = query.filter(key < after_key)
+    rows = query.order_by(model.timestamp.desc(), model.id.desc())\
+                .limit(per_page + 1)\
+                .all()
+    has_older = len(rows) > per_page
+    return KeysetPage(rows[:per_page], per_page, has_newer=after_key is not None, has_older=has_older)
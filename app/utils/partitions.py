@@ -0,0 +1,261 @@
+"""Monthly partitions for the append-only log tables.
+
+On PostgreSQL ``activity_logs``, ``login_logs`` and ``notifications`` are
+range-partitioned by month on their timestamp column (migration
+``partition_log_tables``), with one partition per month named
+``<table>_pYYYYMM`` and a ``<table>_default`` partition catching anything
+outside them. Queries with a time range only scan the partitions it
+covers, and expiring a month is a ``DROP TABLE`` of its partition.
+
+SQLite has no partitioning, so there each table stays whole and an
+expired month is deleted as one range of its indexed timestamp column.
+That costs time in proportion to the rows removed, but every row within
+retention stays where the application reads it.
+
+``maintain`` does both halves of the work and is run daily by
+``scripts/backup_scheduler.py``.
+"""
+import re
+import logging
+from datetime import datetime
+from sqlalchemy import delete, func, select, text
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Partitioned table -> the column it is partitioned on
+PARTITIONED_TABLES = {
+    'activity_logs': 'timestamp',
+    'login_logs': 'timestamp',
+    'notifications': 'created_at'
+}
+
+# Months kept per table, counting back from the current month, which is always kept
+DEFAULT_RETENTION_MONTHS = {
+    'activity_logs': 12,
+    'login_logs': 3,
+    'notifications': 3
+}
+
+# Partitions created ahead of the current month, so inserts never hit a missing one
+DEFAULT_MONTHS_AHEAD = 2
+
+
+def month_start(value):
+    """First instant of the month containing ``value``."""
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    """Start of the month ``count`` months after (or before) ``month``."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+class PartitionManager:
+    """Create and expire monthly partitions on one engine."""
+
+    def __init__(self, engine, tables=None):
+        self.engine = engine
+        self.tables = tables or PARTITIONED_TABLES
+        self.dialect = engine.dialect.name
+
+    def partitions(self, table):
+        """Monthly partitions of a table, oldest first, as (name, month) pairs.
+
+        Empty off PostgreSQL, where tables are not partitioned.
+        """
+        if self.dialect != 'postgresql':
+            return []
+        query = text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        )
+        with self.engine.connect() as conn:
+            names = conn.execute(query, {'table': table}).scalars().all()
+
+        pattern = re.compile(rf'^{re.escape(table)}_p(\d{{4}})(\d{{2}})$')
+        partitions = []
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    def is_partitioned(self, table):
+        """Whether a PostgreSQL table has been converted to a partitioned table."""
+        with self.engine.connect() as conn:
+            return bool(conn.execute(
+                text("SELECT 1 FROM pg_partitioned_table JOIN pg_class ON pg_class.oid = partrelid "
+                     "WHERE pg_class.relname = :table"),
+                {'table': table}
+            ).scalar())
+
+    def default_partition(self, table):
+        """Name of a PostgreSQL table's default partition, or None without one."""
+        name = f"{table}_default"
+        with self.engine.connect() as conn:
+            exists = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {'name': name}).scalar()
+        return name if exists else None
+
+    def ensure_partitions(self, table, months_ahead=DEFAULT_MONTHS_AHEAD, now=None):
+        """Create partitions for this month and the next ``months_ahead`` (PostgreSQL).
+
+        Rows that reached the default partition because their month had
+        no partition yet also get one, and are moved into it.
+
+        Returns:
+            list: Names of the partitions created
+        """
+        if self.dialect != 'postgresql':
+            return []
+        if not self.is_partitioned(table):
+            logger.warning(f"{table} is not partitioned; run the partition_log_tables migration")
+            return []
+
+        existing = {name for name, _ in self.partitions(table)}
+        default = self.default_partition(table)
+        column = self.tables[table]
+        current = month_start(now or datetime.utcnow())
+        months = {add_months(current, offset) for offset in range(months_ahead + 1)}
+        stranded = set()
+        if default:
+            with self.engine.connect() as conn:
+                stranded = {month_start(month) for month in conn.execute(
+                    text(f"SELECT DISTINCT date_trunc('month', {column}) FROM {default}")
+                ).scalars()}
+
+        created = []
+        for month in sorted(months | stranded):
+            name = partition_name(table, month)
+            if name in existing:
+                continue
+            try:
+                with self.engine.begin() as conn:
+                    if month in stranded:
+                        self._split_default(conn, table, default, name, month)
+                    else:
+                        conn.execute(text(
+                            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+                        ))
+            except Exception as e:
+                logger.error(f"Error creating partition {name}: {e}")
+                continue
+            created.append(name)
+        return created
+
+    def _split_default(self, conn, table, default, name, month):
+        """Create a month's partition and move its rows out of the default partition.
+
+        PostgreSQL refuses a new partition while the default partition holds
+        rows for its range, so the default is detached around the move. The
+        detach locks the table, holding back inserts until the transaction ends.
+        """
+        column = self.tables[table]
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        ))
+        conn.execute(
+            text(f"WITH moved AS (DELETE FROM {default} WHERE {column} >= :start AND {column} < :end "
+                 f"RETURNING *) INSERT INTO {table} SELECT * FROM moved"),
+            {'start': month, 'end': add_months(month, 1)}
+        )
+        conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+        logger.info(f"Moved rows of {table} for {month:%Y-%m} out of {default} into {name}")
+
+    def drop_expired(self, table, cutoff):
+        """Drop the months holding only rows older than ``cutoff``.
+
+        On PostgreSQL their partitions are dropped whole, so rows newer
+        than the end of the last expired month are kept until their own
+        month expires; expired rows in the default partition are deleted.
+        On SQLite the same months are deleted from the table, one month
+        per transaction.
+
+        Returns:
+            list: Names of the partitions dropped on PostgreSQL; on SQLite,
+                the months deleted, as ``YYYY-MM``
+        """
+        if self.dialect != 'postgresql':
+            deleted = self._delete_expired_rows(table, month_start(cutoff))
+            if deleted:
+                logger.info(f"Deleted expired months of {table}: {', '.join(deleted)}")
+            return deleted
+
+        dropped = []
+        for name, month in self.partitions(table):
+            if add_months(month, 1) > cutoff:
+                break
+            with self.engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+        self._delete_expired_default_rows(table, month_start(cutoff))
+        if dropped:
+            logger.info(f"Dropped expired partitions of {table}: {', '.join(dropped)}")
+        return dropped
+
+    def _delete_expired_rows(self, table, end):
+        """Delete the rows before ``end``, a month start, a month at a time."""
+        model_table = db.metadata.tables[table]
+        column = model_table.c[self.tables[table]]
+        with self.engine.connect() as conn:
+            oldest = conn.execute(select(func.min(column))).scalar()
+        if oldest is None or oldest >= end:
+            return []
+
+        deleted = []
+        month = month_start(oldest)
+        while month < end:
+            with self.engine.begin() as conn:
+                conn.execute(delete(model_table).where(column >= month, column < add_months(month, 1)))
+            deleted.append(f"{month:%Y-%m}")
+            month = add_months(month, 1)
+        return deleted
+
+    def _delete_expired_default_rows(self, table, end):
+        """Delete rows before ``end`` from the default partition (PostgreSQL)."""
+        default = self.default_partition(table)
+        if not default:
+            return 0
+        column = self.tables[table]
+        with self.engine.begin() as conn:
+            count = conn.execute(text(f"DELETE FROM {default} WHERE {column} < :end"), {'end': end}).rowcount
+        if count:
+            logger.info(f"Deleted {count} expired rows from {default}")
+        return count
+
+    def maintain(self, retention_months=None, months_ahead=DEFAULT_MONTHS_AHEAD, now=None):
+        """Create upcoming partitions and drop expired months.
+
+        Args:
+            retention_months: Months kept per table before the current one;
+                defaults to ``DEFAULT_RETENTION_MONTHS``
+            months_ahead: Partitions created ahead of the current month (PostgreSQL)
+            now: Time to maintain for; defaults to the current UTC time
+
+        Returns:
+            dict: Per table, the partitions created and dropped
+        """
+        retention_months = {**DEFAULT_RETENTION_MONTHS, **(retention_months or {})}
+        now = now or datetime.utcnow()
+        summary = {}
+        for table in self.tables:
+            cutoff = add_months(month_start(now), -retention_months[table])
+            try:
+                summary[table] = {
+                    'created': self.ensure_partitions(table, months_ahead, now),
+                    'dropped': self.drop_expired(table, cutoff)
+                }
+            except Exception as e:
+                logger.error(f"Error maintaining partitions of {table}: {e}")
+                summary[table] = {'error': str(e)}
+        return summary
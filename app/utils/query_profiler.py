@@ -0,0 +1,231 @@
+"""Per-request SQL statement profiling."""
+import os
+import sys
+import json
+import heapq
+import random
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import g, request, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Call sites are reported relative to the project root
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_ROOT = os.path.dirname(APP_ROOT)
+
+MAX_STATEMENT_LENGTH = 500
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a request issues more statements than its budget allows."""
+
+
+def _call_site():
+    """Return ``file:line in function`` for the innermost app frame, skipping this module."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_ROOT) and filename != __file__:
+            return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class RequestQueryStats:
+    """Statements issued while handling a single request."""
+
+    def __init__(self, top_n):
+        self.top_n = top_n
+        self.started = time.perf_counter()
+        self.count = 0
+        self.total_ms = 0.0
+        self._slowest = []
+        self._seq = 0
+
+    def add(self, statement, duration_ms):
+        """Record one statement, keeping it if it is among the slowest."""
+        self.count += 1
+        self.total_ms += duration_ms
+        if self.top_n <= 0:
+            return
+        if len(self._slowest) >= self.top_n and duration_ms <= self._slowest[0][0]:
+            return
+
+        # Only statements that make the top N pay for the stack walk
+        self._seq += 1
+        entry = (duration_ms, self._seq, {
+            'ms': round(duration_ms, 3),
+            'statement': ' '.join(statement.split())[:MAX_STATEMENT_LENGTH],
+            'call_site': _call_site()
+        })
+        if len(self._slowest) < self.top_n:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def slowest(self):
+        """Slowest statements, slowest first."""
+        return [entry for _, _, entry in sorted(self._slowest, reverse=True)]
+
+
+class QueryProfiler:
+    """Count and time SQL statements per request.
+
+    Each request gets a ``Server-Timing`` header with its statement count
+    and DB time. A summary of every request goes into an in-memory ring
+    buffer, and a sample of them is appended to a JSONL file. Requests over
+    their query budget are logged, or fail when ``QUERY_BUDGET_STRICT`` is
+    set (the test configuration does this).
+
+    Statements run after ``after_request``, such as those issued while a
+    streamed response body is generated, are not counted.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=200)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize with Flask app."""
+        self.app = app
+        app.config.setdefault('QUERY_PROFILER_ENABLED', True)
+        app.config.setdefault('QUERY_PROFILER_TOP_N', 5)
+        app.config.setdefault('QUERY_PROFILER_RING_SIZE', 200)
+        app.config.setdefault('QUERY_PROFILER_SAMPLE_RATE', 0.0)
+        app.config.setdefault('QUERY_PROFILER_LOG_FILE',
+                              os.path.join(app.instance_path, 'query_profile.jsonl'))
+        app.config.setdefault('QUERY_BUDGET', None)
+        app.config.setdefault('QUERY_BUDGETS', {})
+        app.config.setdefault('QUERY_BUDGET_STRICT', False)
+
+        self._recent = deque(maxlen=app.config['QUERY_PROFILER_RING_SIZE'])
+        app.extensions['query_profiler'] = self
+        if not app.config['QUERY_PROFILER_ENABLED']:
+            return
+
+        _register_engine_listeners()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g._query_stats = RequestQueryStats(current_app.config['QUERY_PROFILER_TOP_N'])
+
+    def _after_request(self, response):
+        stats = g.pop('_query_stats', None)
+        if stats is None:
+            return response
+
+        elapsed_ms = (time.perf_counter() - stats.started) * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries", app;dur={elapsed_ms:.1f}'
+        )
+
+        endpoint = request.endpoint
+        record = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.total_ms, 3),
+            'total_ms': round(elapsed_ms, 3),
+            'slowest': stats.slowest
+        }
+        with self._lock:
+            self._recent.append(record)
+
+        if random.random() < current_app.config['QUERY_PROFILER_SAMPLE_RATE']:
+            self._write_sample(record)
+
+        self._check_budget(endpoint, stats.count)
+        return response
+
+    def _write_sample(self, record):
+        """Append a request summary to the JSONL log."""
+        try:
+            line = json.dumps(record, default=str)
+            with self._lock:
+                with open(current_app.config['QUERY_PROFILER_LOG_FILE'], 'a') as f:
+                    f.write(line + '\n')
+        except Exception as e:
+            logger.error(f"Error writing query profile sample: {e}")
+
+    def budget_for(self, endpoint):
+        """Get the statement budget for an endpoint, or None if unlimited."""
+        budgets = current_app.config['QUERY_BUDGETS']
+        return budgets.get(endpoint, current_app.config['QUERY_BUDGET'])
+
+    def _check_budget(self, endpoint, count):
+        budget = self.budget_for(endpoint)
+        if budget is None or count <= budget:
+            return
+        message = f"{endpoint} issued {count} SQL statements, over its budget of {budget}"
+        if current_app.config['QUERY_BUDGET_STRICT']:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+    def recent(self, limit=None, endpoint=None):
+        """Get recent request summaries, newest first.
+
+        Args:
+            limit: Maximum number of summaries to return
+            endpoint: Only return summaries for this endpoint
+
+        Returns:
+            list: Request summary dicts
+        """
+        with self._lock:
+            records = list(self._recent)
+        records.reverse()
+        if endpoint:
+            records = [record for record in records if record['endpoint'] == endpoint]
+        return records[:limit] if limit else records
+
+
+_listeners_registered = False
+
+
+def _register_engine_listeners():
+    """Time every cursor execution on every engine (once per process)."""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    _listeners_registered = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start_time')
+        if not starts:
+            return
+        duration_ms = (time.perf_counter() - starts.pop()) * 1000
+        if not has_app_context():
+            return
+        stats = g.get('_query_stats')
+        if stats is not None:
+            stats.add(statement, duration_ms)
+
+    @event.listens_for(Engine, 'handle_error')
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get('query_start_time') if conn is not None else None
+        if starts:
+            starts.pop()
+
+
+query_profiler = QueryProfiler()
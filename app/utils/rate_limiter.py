@@ -1,70 +1,170 @@
 """Rate limiting utilities for the application."""
 from functools import wraps
-from flask import request, current_app, jsonify
-import redis
+from collections import OrderedDict
+from flask import request, current_app, jsonify, make_response
+import threading
 import time
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
-class RateLimiter:
-    """Rate limiter implementation using Redis."""
-    
-    def __init__(self, redis_url='redis://localhost:6379/0'):
-        """Initialize rate limiter with Redis connection."""
+# Keys the local fallback tracks before evicting the least recently used
+DEFAULT_LOCAL_MAX_KEYS = 10000
+
+# Sliding-window counter: the previous window's count is weighted by how much
+# of it still overlaps the window ending now. Two counters per key, one
+# round trip per check, and rejected requests are not counted.
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local weighted = previous * (1 - elapsed) + current
+if weighted + 1 > limit then
+    return {1, math.ceil(weighted)}
+end
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], period * 2)
+end
+return {0, math.ceil(weighted + 1)}
+"""
+
+
+class LocalTokenBucket:
+    """In-process token buckets, one per key, with LRU eviction.
+
+    Each bucket holds up to ``limit`` tokens and refills at ``limit`` per
+    ``period``; a request takes one token. A check is O(1) and memory is
+    bounded by ``max_keys`` buckets. Counts are per process, so this is
+    only the fallback for when no shared store is configured or reachable.
+    """
+
+    def __init__(self, max_keys=DEFAULT_LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def hit(self, key, limit, period):
+        """Take a token from a key's bucket.
+
+        Returns:
+            tuple: (allowed, remaining, reset_time)
+        """
+        now = time.time()
+        rate = limit / period
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = float(limit)
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(float(limit), bucket[0] + (now - bucket[1]) * rate)
+                self._buckets.move_to_end(key)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+        return allowed, int(tokens), int(now + (limit - tokens) / rate)
+
+
+class RedisSlidingWindow:
+    """Sliding-window counters shared by all workers through Redis.
+
+    Each check runs one Lua script, so counting is atomic across workers
+    and costs a single round trip. When Redis cannot be reached the check
+    is answered by ``fallback`` instead of failing the request.
+    """
+
+    def __init__(self, client, fallback):
+        self.client = client
+        self.fallback = fallback
+        self._warned_at = 0.0
+        self._script = client.register_script(SLIDING_WINDOW_SCRIPT)
+
+    def hit(self, key, limit, period):
+        """Count a request against a key's window.
+
+        Returns:
+            tuple: (allowed, remaining, reset_time)
+        """
+        now = time.time()
+        window = int(now // period)
         try:
-            self.redis = redis.from_url(redis_url)
-            self.redis.ping()  # Test connection
-        except redis.ConnectionError:
-            logger.warning("Redis not available, falling back to in-memory storage")
-            self.redis = None
-            self._in_memory = {}
-    
+            limited, used = self._script(
+                keys=[f"{key}:{window}", f"{key}:{window - 1}"],
+                args=[limit, period, (now % period) / period]
+            )
+        except Exception as e:
+            # Once a minute, not once per request, while Redis is down
+            if now - self._warned_at > 60:
+                self._warned_at = now
+                logger.warning(f"Redis rate limit check failed, using local buckets: {e}")
+            return self.fallback.hit(key, limit, period)
+        return not limited, max(0, limit - int(used)), (window + 1) * period
+
+
+def create_backend(storage_url, max_keys=DEFAULT_LOCAL_MAX_KEYS):
+    """Limiter backend for a ``RATELIMIT_STORAGE_URL``.
+
+    ``redis://``, ``rediss://`` and ``redis+unix://`` URLs get the shared
+    sliding window; anything else, including ``memory://``, gets local
+    buckets.
+    """
+    local = LocalTokenBucket(max_keys)
+    if not storage_url or not storage_url.startswith(('redis://', 'rediss://', 'redis+unix://')):
+        return local
+    import redis
+    return RedisSlidingWindow(redis.from_url(storage_url.replace('redis+unix://', 'unix://', 1)), fallback=local)
+
+
+class RateLimiter:
+    """Per-client request limits, counted in the configured shared store.
+
+    Uses ``RATELIMIT_STORAGE_URL``, the same store Flask-Limiter is
+    configured with, so limits hold across all server workers.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.backend = LocalTokenBucket()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize with Flask app."""
+        self.app = app
+        app.config.setdefault('RATELIMIT_STORAGE_URL', 'memory://')
+        app.config.setdefault('RATELIMIT_LOCAL_MAX_KEYS', DEFAULT_LOCAL_MAX_KEYS)
+        self.backend = create_backend(app.config['RATELIMIT_STORAGE_URL'],
+                                      app.config['RATELIMIT_LOCAL_MAX_KEYS'])
+        app.extensions['rate_limiter'] = self
+
     def _get_rate_limit_key(self, key_prefix):
         """Generate rate limit key based on IP and optional prefix."""
         ip = request.headers.get('X-Forwarded-For', request.remote_addr)
         return f"rate_limit:{key_prefix}:{ip}"
-    
+
     def is_rate_limited(self, key_prefix, limit=100, period=3600):
         """Check if the request is rate limited.
-        
+
         Args:
             key_prefix: Prefix for the rate limit key
             limit: Maximum number of requests allowed
             period: Time period in seconds
-        
+
         Returns:
             tuple: (is_limited, remaining, reset_time)
         """
-        key = self._get_rate_limit_key(key_prefix)
-        now = int(time.time())
-        
-        if self.redis:
-            pipeline = self.redis.pipeline()
-            pipeline.zremrangebyscore(key, 0, now - period)
-            pipeline.zadd(key, {str(now): now})
-            pipeline.zcard(key)
-            pipeline.expire(key, period)
-            _, _, request_count, _ = pipeline.execute()
-        else:
-            # In-memory fallback
-            if key not in self._in_memory:
-                self._in_memory[key] = []
-            
-            # Remove old entries
-            self._in_memory[key] = [ts for ts in self._in_memory[key] if ts > now - period]
-            self._in_memory[key].append(now)
-            request_count = len(self._in_memory[key])
-        
-        remaining = max(0, limit - request_count)
-        reset_time = now + period
-        
-        return request_count > limit, remaining, reset_time
+        allowed, remaining, reset_time = self.backend.hit(self._get_rate_limit_key(key_prefix), limit, period)
+        return not allowed, remaining, reset_time
 
 def rate_limit(limit=100, period=3600, key_prefix='default'):
     """Rate limiting decorator.
-    
+
     Args:
         limit: Maximum number of requests allowed
         period: Time period in seconds
@@ -73,27 +173,29 @@ def rate_limit(limit=100, period=3600, key_prefix='default'):
     def decorator(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
-            limiter = current_app.config.get('rate_limiter')
+            limiter = current_app.extensions.get('rate_limiter')
             if not limiter:
                 return f(*args, **kwargs)
-            
+
             is_limited, remaining, reset_time = limiter.is_rate_limited(
                 key_prefix, limit, period
             )
-            
-            response = make_response(f(*args, **kwargs))
-            response.headers['X-RateLimit-Limit'] = str(limit)
-            response.headers['X-RateLimit-Remaining'] = str(remaining)
-            response.headers['X-RateLimit-Reset'] = str(reset_time)
-            
+
             if is_limited:
                 logger.warning(f"Rate limit exceeded for {request.remote_addr}")
-                response = jsonify({
+                response = make_response(jsonify({
                     'error': 'Too many requests',
                     'remaining': remaining,
                     'reset': datetime.fromtimestamp(reset_time).isoformat()
-                }), 429
-            
+                }), 429)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.headers['X-RateLimit-Limit'] = str(limit)
+            response.headers['X-RateLimit-Remaining'] = str(remaining)
+            response.headers['X-RateLimit-Reset'] = str(reset_time)
             return response
         return wrapped
     return decorator
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,26 @@
+"""SQL helpers shared by models and services."""
+from app.extensions import db
+
+
+def upsert_insert(table, bind=None):
+    """Return an INSERT construct supporting ``on_conflict_do_update``.
+
+    Args:
+        table: Table to insert into
+        bind: Engine or connection the statement is for; defaults to the
+            session's
+
+    Returns:
+        The PostgreSQL or SQLite dialect insert for the database
+
+    Raises:
+        NotImplementedError: If the database has no ON CONFLICT support
+    """
+    dialect = (bind if bind is not None else db.session.get_bind()).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return insert(table)
@@ -0,0 +1,283 @@
+"""Cached Flask-Login user resolution."""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_request_context
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from app.extensions import db
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+# User columns copied into a principal; a change to any of them invalidates it
+PRINCIPAL_FIELDS = ('id', 'login_id', 'email', 'first_name', 'last_name', 'role', 'department_id', 'is_active')
+
+# Session.info key holding the users flushed in the current transaction
+CHANGES_KEY = 'user_cache_changes'
+
+# g attribute holding the full User row of a principal, loaded on demand
+ROW_KEY = '_current_user_row'
+
+REDIS_KEY_PREFIX = 'user_principal:'
+
+
+class UserPrincipal(UserMixin):
+    """Immutable snapshot of the columns needed to authorise a request.
+
+    This is what ``current_user`` is on most requests: the id, role,
+    department and active flag, plus the name and email shown in page
+    headers. Anything else, such as ``current_user.department`` or
+    ``enrolled_courses``, loads the full ``User`` row once per request and
+    reads it from there, as does assigning an attribute.
+    """
+    __slots__ = PRINCIPAL_FIELDS
+
+    def __init__(self, **fields):
+        for field in PRINCIPAL_FIELDS:
+            object.__setattr__(self, field, fields.get(field))
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{field: getattr(row, field) for field in PRINCIPAL_FIELDS})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in PRINCIPAL_FIELDS}
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @property
+    def is_lecturer(self):
+        return self.role == 'lecturer'
+
+    @property
+    def is_student(self):
+        return self.role == 'student'
+
+    @property
+    def user(self):
+        """The full ``User`` row, loaded once per request."""
+        if not has_request_context():
+            return db.session.get(User, self.id)
+        rows = g.setdefault(ROW_KEY, {})
+        if self.id not in rows:
+            rows[self.id] = db.session.get(User, self.id)
+        return rows[self.id]
+
+    def __getattr__(self, name):
+        # Only reached for attributes a principal does not carry
+        if name.startswith('__'):
+            raise AttributeError(name)
+        user = self.user
+        if user is None:
+            raise AttributeError(name)
+        return getattr(user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+    def __eq__(self, other):
+        if isinstance(other, (UserPrincipal, User)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'<UserPrincipal {self.login_id}>'
+
+
+class UserCache:
+    """Resolve session user IDs to principals without touching the database.
+
+    Principals are kept in a per-process LRU with a TTL. With
+    ``USER_CACHE_REDIS_URL`` set they are also stored in Redis, so a worker
+    that misses locally can still avoid the database. Commits that change
+    or delete a user invalidate the entry in this process and in Redis;
+    other workers' local copies expire within ``USER_CACHE_TTL``, so keep
+    it short when running several workers.
+
+    Bulk ``Query.update()``/``delete()`` calls on users clear this
+    process's cache, since the affected IDs are not known.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._redis = None
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize with Flask app."""
+        self.app = app
+        app.config.setdefault('USER_CACHE_ENABLED', True)
+        app.config.setdefault('USER_CACHE_TTL', 60)
+        app.config.setdefault('USER_CACHE_SIZE', 10000)
+        app.config.setdefault('USER_CACHE_REDIS_URL', None)
+        app.config.setdefault('USER_CACHE_REDIS_TTL', 300)
+        app.extensions['user_cache'] = self
+
+        if app.config['USER_CACHE_REDIS_URL']:
+            import redis
+            self._redis = redis.from_url(app.config['USER_CACHE_REDIS_URL'])
+        _register_session_listeners(self)
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['USER_CACHE_ENABLED']
+
+    def load(self, user_id):
+        """Principal for a session user ID, or None if there is no such user."""
+        user_id = int(user_id)
+        if not self.enabled:
+            return self._load_from_db(user_id)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            generation = self._generation
+
+        principal = self._redis_get(user_id)
+        if principal is not None:
+            self.redis_hits += 1
+        else:
+            self.misses += 1
+            principal = self._load_from_db(user_id)
+            if principal is None:
+                return None
+            self._redis_set(principal)
+
+        with self._lock:
+            # Skip the store if a commit invalidated users while this one loaded
+            if self._generation == generation:
+                self._entries[user_id] = (now + self.app.config['USER_CACHE_TTL'], principal)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.app.config['USER_CACHE_SIZE']:
+                    self._entries.popitem(last=False)
+        return principal
+
+    def _load_from_db(self, user_id):
+        row = db.session.query(*(getattr(User, field) for field in PRINCIPAL_FIELDS)).filter(
+            User.id == user_id
+        ).first()
+        return UserPrincipal.from_row(row) if row is not None else None
+
+    def _redis_get(self, user_id):
+        if self._redis is None:
+            return None
+        try:
+            data = self._redis.get(f'{REDIS_KEY_PREFIX}{user_id}')
+        except Exception as e:
+            logger.warning(f"Error reading user {user_id} from Redis: {e}")
+            return None
+        return UserPrincipal(**json.loads(data)) if data else None
+
+    def _redis_set(self, principal):
+        if self._redis is None:
+            return
+        try:
+            self._redis.setex(f'{REDIS_KEY_PREFIX}{principal.id}', self.app.config['USER_CACHE_REDIS_TTL'],
+                              json.dumps(principal.to_dict()))
+        except Exception as e:
+            logger.warning(f"Error caching user {principal.id} in Redis: {e}")
+
+    def invalidate(self, user_ids):
+        """Drop users from this process's cache and from Redis."""
+        user_ids = list(user_ids)
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+            self.invalidations += len(user_ids)
+        if self._redis is not None and user_ids:
+            try:
+                self._redis.delete(*(f'{REDIS_KEY_PREFIX}{user_id}' for user_id in user_ids))
+            except Exception as e:
+                logger.error(f"Error invalidating cached users in Redis: {e}")
+
+    def clear(self):
+        """Drop every user from this process's cache."""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'backend': 'redis' if self._redis is not None else 'local',
+                'size': len(self._entries),
+                'hits': self.hits,
+                'redis_hits': self.redis_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': round((self.hits + self.redis_hits) / lookups, 4) if lookups else None
+            }
+
+
+def _principal_changed(user):
+    state = inspect(user)
+    return any(state.attrs[field].history.has_changes() for field in PRINCIPAL_FIELDS)
+
+
+_listeners_registered = False
+
+
+def _register_session_listeners(cache):
+    """Invalidate users changed by each committed transaction (once per process)."""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    _listeners_registered = True
+
+    @event.listens_for(db.session, 'after_flush')
+    def after_flush(session, flush_context):
+        changed = {obj.id for obj in session.dirty if isinstance(obj, User) and _principal_changed(obj)}
+        changed.update(obj.id for obj in session.deleted if isinstance(obj, User))
+        if changed:
+            session.info.setdefault(CHANGES_KEY, set()).update(changed)
+
+    @event.listens_for(db.session, 'after_commit')
+    def after_commit(session):
+        changed = session.info.pop(CHANGES_KEY, None)
+        if changed:
+            cache.invalidate(changed)
+
+    @event.listens_for(db.session, 'after_rollback')
+    def after_rollback(session):
+        session.info.pop(CHANGES_KEY, None)
+
+    @event.listens_for(db.session, 'after_bulk_update')
+    def after_bulk_update(update_context):
+        if update_context.mapper.class_ is User:
+            cache.clear()
+
+    @event.listens_for(db.session, 'after_bulk_delete')
+    def after_bulk_delete(delete_context):
+        if delete_context.mapper.class_ is User:
+            cache.clear()
+
+
+user_cache = UserCache()
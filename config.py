@@ -16,12 +16,21 @@ class Config:
     # Database
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 10,
+        # pool_size and max_overflow are derived from DB_CONNECTION_BUDGET
         'pool_timeout': 30,
         'pool_recycle': 1800,
-        'max_overflow': 2
+        # Test connections at checkout and transparently replace dead ones
+        'pool_pre_ping': True,
+        # Reuse the most recent connection so idle ones can time out server-side
+        'pool_use_lifo': True
     }
     
+    # Connection budget; pool sizes are derived from it in app.utils.db_pool
+    DB_CONNECTION_BUDGET = int(os.environ.get('DB_CONNECTION_BUDGET', '80'))  # across all workers
+    DB_EXTERNAL_POOLER = os.environ.get('DB_EXTERNAL_POOLER', 'false').lower() == 'true'
+    SERVER_WORKERS = int(os.environ.get('WEB_CONCURRENCY', '1'))
+    SERVER_CONCURRENCY = int(os.environ.get('SERVER_CONCURRENCY', '4'))  # threads or greenlets per worker
+
     # Session
     PERMANENT_SESSION_LIFETIME = timedelta(days=1)
     SESSION_COOKIE_SECURE = True
@@ -39,8 +48,68 @@ class Config:
     
     # Rate Limiting
     RATELIMIT_DEFAULT = "200 per day"
-    RATELIMIT_STRATEGY = 'fixed-window'
-    RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL', 'memory://')
+    RATELIMIT_STRATEGY = 'moving-window'  # one Lua script per check on Redis
+    RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL', 'memory://')  # shared by all workers when Redis
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = True  # keep limiting per worker if Redis is down
+    RATELIMIT_LOCAL_MAX_KEYS = 10000  # clients tracked by the local token-bucket fallback
+
+    # Query profiling
+    QUERY_PROFILER_ENABLED = os.environ.get('QUERY_PROFILER_ENABLED', 'true').lower() == 'true'
+    QUERY_PROFILER_TOP_N = 5  # slowest statements kept per request
+    QUERY_PROFILER_RING_SIZE = 200  # request summaries kept for the admin endpoint
+    QUERY_PROFILER_SAMPLE_RATE = float(os.environ.get('QUERY_PROFILER_SAMPLE_RATE', '0.01'))
+    QUERY_BUDGET = None  # default statements per request; None disables the check
+    QUERY_BUDGETS = {}  # per-endpoint overrides, e.g. {'admin.attendance': 10}
+    QUERY_BUDGET_STRICT = False  # raise instead of logging when a budget is exceeded
+
+    # Hardware gateway (run_hardware_server.py) that owns the device link
+    HARDWARE_SERVICE_URL = os.environ.get('HARDWARE_SERVICE_URL', 'ws://127.0.0.1:8765')
+    HARDWARE_COMMAND_TIMEOUT = int(os.environ.get('HARDWARE_COMMAND_TIMEOUT', '30'))  # seconds
+    HARDWARE_GATEWAY_TOKEN = os.environ.get('HARDWARE_GATEWAY_TOKEN')  # shared with the gateway's --token
+    HARDWARE_DEVICE_ID = os.environ.get('HARDWARE_DEVICE_ID')  # reader used for enrollment; optional with one reader
+    HARDWARE_INDEX_NOTIFY = os.environ.get('HARDWARE_INDEX_NOTIFY', 'true').lower() == 'true'  # push card/lecture changes to the gateway
+    FINGERPRINT_LIBRARY_SIZE = int(os.environ.get('FINGERPRINT_LIBRARY_SIZE', '200'))  # templates per sensor
+    FINGERPRINT_SYNC_BATCH_SIZE = int(os.environ.get('FINGERPRINT_SYNC_BATCH_SIZE', '4'))  # templates per sync command
+
+    # Session user cache (app.utils.user_cache)
+    USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'true').lower() == 'true'
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '60'))  # seconds; bounds staleness in other workers
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))  # principals per process
+    USER_CACHE_REDIS_URL = os.environ.get('USER_CACHE_REDIS_URL')  # shared second tier; optional
+    USER_CACHE_REDIS_TTL = int(os.environ.get('USER_CACHE_REDIS_TTL', '300'))  # seconds
+
+    # Dashboard snapshot cache (app.utils.dashboard_cache)
+    DASHBOARD_CACHE_ENABLED = os.environ.get('DASHBOARD_CACHE_ENABLED', 'true').lower() == 'true'
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', '60'))  # seconds a snapshot stays fresh
+    DASHBOARD_CACHE_MIN_AGE = 5  # seconds a snapshot is served regardless of changes
+    DASHBOARD_CACHE_REDIS_URL = os.environ.get('DASHBOARD_CACHE_REDIS_URL')  # share snapshots across workers; optional
+
+    # Prometheus metrics at /metrics; aggregated across workers via PROMETHEUS_MULTIPROC_DIR
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # Audit logging (app.services.audit_log); activity and login logs are written in batches
+    AUDIT_LOG_ASYNC = os.environ.get('AUDIT_LOG_ASYNC', 'true').lower() == 'true'
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', '10000'))  # records held per worker
+    AUDIT_QUEUE_POLICY = os.environ.get('AUDIT_QUEUE_POLICY', 'drop')  # 'drop' or 'block' when full
+    AUDIT_BLOCK_TIMEOUT = 0.5  # seconds a request waits for room under the 'block' policy
+    AUDIT_BATCH_SIZE = 500  # records per insert
+    AUDIT_FLUSH_INTERVAL = 1.0  # seconds
+    AUDIT_JSONL_PATH = os.environ.get('AUDIT_JSONL_PATH')  # append-only copy for cold storage; optional
+    AUDIT_RETRY_ATTEMPTS = 3  # tries per batch on transient database errors
+    AUDIT_RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled each time
+    AUDIT_FALLBACK_PATH = os.environ.get('AUDIT_FALLBACK_PATH')  # batches that could not be inserted; default instance/audit_failed.jsonl
+
+    # Monthly partitions of the log tables (app.utils.partitions), maintained by scripts/backup_scheduler.py
+    PARTITION_RETENTION_MONTHS = {  # months kept before the current one
+        'activity_logs': int(os.environ.get('ACTIVITY_LOG_RETENTION_MONTHS', '12')),
+        'login_logs': int(os.environ.get('LOGIN_LOG_RETENTION_MONTHS', '3')),
+        'notifications': int(os.environ.get('NOTIFICATION_RETENTION_MONTHS', '3'))
+    }
+    PARTITION_MONTHS_AHEAD = 2  # partitions created ahead of the current month (PostgreSQL)
+
+    # Health checks
+    HEALTH_CHECK_INTERVAL = int(os.environ.get('HEALTH_CHECK_INTERVAL', '15'))  # seconds
+    HEALTH_CHECK_BACKGROUND = True  # check from a thread; otherwise on the first probe after expiry
 
     # Security Headers
     SECURITY_HEADERS = {
@@ -84,6 +153,12 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
     SESSION_COOKIE_SECURE = False
+    QUERY_PROFILER_SAMPLE_RATE = 0.0
+    QUERY_BUDGET_STRICT = True
+    HEALTH_CHECK_BACKGROUND = False
+    HARDWARE_INDEX_NOTIFY = False
+    AUDIT_LOG_ASYNC = False
+    METRICS_ENABLED = False
 
 # Configuration dictionary
 config = {
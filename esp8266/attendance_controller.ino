@@ -4,6 +4,8 @@
 #include <Adafruit_Fingerprint.h>
 #include <SPI.h>
 #include <MFRC522.h>
+#include <LittleFS.h>
+#include <time.h>
 
 // WiFi credentials
 const char* ssid = "YOUR_WIFI_SSID";
@@ -13,12 +15,53 @@ const char* password = "YOUR_WIFI_PASSWORD";
 const char* websocket_server = "YOUR_SERVER_IP";
 const int websocket_port = 8765;
 
+// Encode messages as MessagePack (binary frames) instead of JSON text.
+// The gateway accepts it when its subprotocol is negotiated; set to 0 for
+// a gateway without MessagePack support.
+#define USE_MSGPACK 1
+#define WS_SUBPROTOCOL "attendance.msgpack"
+
+// Status is sent when a field changes, checked every 5 s, and in full
+// every minute and on connect
+#define STATUS_CHECK_INTERVAL 5000
+#define STATUS_FULL_INTERVAL 60000
+
+// Identity of this reader in the gateway's device registry
+const char* device_id = "YOUR_DEVICE_ID";
+const char* room = "YOUR_ROOM";
+// The gateway's HARDWARE_DEVICE_TOKEN; sent when registering
+const char* device_token = "YOUR_DEVICE_TOKEN";
+
+// Offline tap buffer: a ring of fixed-size records in flash. Taps are
+// numbered per device and uploaded in batches; the gateway acknowledges
+// the highest sequence number it has journaled, and only then are they
+// dropped from the ring. When the ring is full the oldest tap is lost.
+#define TAP_BUFFER_CAPACITY 2048
+#define TAP_BATCH_SIZE 32
+#define TAP_ACK_TIMEOUT 10000  // ms before an unacknowledged batch is resent
+#define CLOCK_VALID_AFTER 1600000000UL  // Unix time before which NTP has not synced
+
+struct TapRecord {
+    uint32_t seq;
+    uint32_t timestamp;  // Unix time, 0 if the clock was not set
+    char cardId[16];
+};
+
+const char* TAP_BUFFER_FILE = "/taps.bin";
+const char* TAP_STATE_FILE = "/taps.state";
+
 // Hardware pins
 #define FINGERPRINT_RX 14  // D5
 #define FINGERPRINT_TX 12  // D6
 #define RST_PIN 5         // D1
 #define SS_PIN 4          // D2
 
+// Fingerprint library sync: templates are sent by the server as hex and
+// downloaded into the sensor in data packets of this size
+#define FINGERPRINT_DOWNCHAR 0x09
+#define TEMPLATE_PACKET_SIZE 64
+#define TEMPLATE_MAX_SIZE 1536
+
 // Global objects
 WebSocketsClient webSocket;
 SoftwareSerial fingerprintSerial(FINGERPRINT_RX, FINGERPRINT_TX);
@@ -31,6 +74,19 @@ bool rfidReady = false;
 int fingerprintCount = 0;
 int rfidCount = 0;
 
+// Request ID of the command being handled, echoed in its events
+String currentCommandId = "";
+
+// The next card read answers a command instead of being a tap
+bool cardCommandPending = false;
+
+// Offline tap buffer state
+uint32_t nextSeq = 1;     // sequence number of the next tap
+uint32_t ackedSeq = 0;    // high-water mark acknowledged by the gateway
+uint32_t sentSeq = 0;     // last sequence number of the batch in flight, 0 if none
+unsigned long lastUpload = 0;
+bool wsConnected = false;
+
 void setup() {
     Serial.begin(115200);
     
@@ -39,7 +95,10 @@ void setup() {
     if (fingerprint.verifyPassword()) {
         Serial.println("Fingerprint sensor connected!");
         fingerprintReady = true;
+        fingerprint.getTemplateCount();
         fingerprintCount = fingerprint.templateCount;
+        // Data packets must fit Adafruit_Fingerprint_Packet's 64-byte buffer
+        fingerprint.setPacketSize(FINGERPRINT_PACKET_SIZE_64);
     }
     
     // Initialize RFID reader
@@ -58,8 +117,22 @@ void setup() {
     }
     Serial.println("WiFi connected");
     
+    // Clock for tap timestamps; taps before the first sync carry time 0
+    configTime(0, 0, "pool.ntp.org", "time.nist.gov");
+    
+    // Offline tap buffer
+    if (LittleFS.begin()) {
+        loadTapState();
+    } else {
+        Serial.println("LittleFS mount failed; taps are not buffered");
+    }
+    
     // Configure WebSocket client
+#if USE_MSGPACK
+    webSocket.begin(websocket_server, websocket_port, "/", WS_SUBPROTOCOL);
+#else
     webSocket.begin(websocket_server, websocket_port, "/");
+#endif
     webSocket.onEvent(webSocketEvent);
     webSocket.setReconnectInterval(5000);
 }
@@ -74,26 +147,31 @@ void loop() {
             cardId += String(rfid.uid.uidByte[i], HEX);
         }
         
-        // Send RFID event
-        DynamicJsonDocument doc(200);
-        doc["device"] = "esp8266";
-        doc["event"]["type"] = "rfid";
-        doc["event"]["status"] = "card_detected";
-        doc["event"]["card_id"] = cardId;
-        
-        String jsonString;
-        serializeJson(doc, jsonString);
-        webSocket.sendTXT(jsonString);
+        if (cardCommandPending) {
+            // Answer the test or registration command with the card
+            cardCommandPending = false;
+            sendRFIDEvent("card_detected", "Card detected", cardId.c_str());
+        } else {
+            // Every tap goes through the buffer, online or not
+            bufferTap(cardId.c_str());
+        }
         
         rfid.PICC_HaltA();
         rfid.PCD_StopCrypto1();
     }
     
-    // Send status update every 5 seconds
+    uploadTaps();
+    
+    // Send status changes every 5 seconds, the full status every minute
     static unsigned long lastStatus = 0;
-    if (millis() - lastStatus > 5000) {
-        sendStatus();
+    static unsigned long lastFullStatus = 0;
+    if (millis() - lastStatus > STATUS_CHECK_INTERVAL) {
+        bool full = millis() - lastFullStatus > STATUS_FULL_INTERVAL;
+        sendStatus(full);
         lastStatus = millis();
+        if (full) {
+            lastFullStatus = millis();
+        }
     }
 }
 
@@ -101,44 +179,217 @@ void webSocketEvent(WStype_t type, uint8_t * payload, size_t length) {
     switch(type) {
         case WStype_DISCONNECTED:
             Serial.println("WebSocket disconnected");
+            wsConnected = false;
             break;
             
         case WStype_CONNECTED:
             Serial.println("WebSocket connected");
-            sendStatus();
+            wsConnected = true;
+            // Resend from the high-water mark; one batch at a time
+            sentSeq = 0;
+            sendStatus(true);
             break;
             
         case WStype_TEXT:
-            handleCommand((char*)payload);
+            handleCommand(payload, length, false);
+            break;
+            
+        case WStype_BIN:
+            handleCommand(payload, length, true);
             break;
     }
 }
 
-void sendStatus() {
-    DynamicJsonDocument doc(200);
+void sendDocument(JsonDocument& doc) {
+    String payload;
+#if USE_MSGPACK
+    serializeMsgPack(doc, payload);
+    webSocket.sendBIN((uint8_t*)payload.c_str(), payload.length());
+#else
+    serializeJson(doc, payload);
+    webSocket.sendTXT(payload);
+#endif
+}
+
+void sendStatus(bool full) {
+    // Values last sent, so routine updates carry only what changed
+    static bool sentFingerprintReady = false;
+    static bool sentRfidReady = false;
+    static int sentFingerprintCount = -1;
+    static int sentRfidCount = -1;
+    static uint32_t sentBuffered = UINT32_MAX;
+    uint32_t buffered = nextSeq - 1 - ackedSeq;
+    
+    DynamicJsonDocument doc(256);
+    doc["device"] = "esp8266";
+    doc["device_id"] = device_id;
+    JsonObject status = doc.createNestedObject("status");
+    if (full) {
+        doc["room"] = room;
+        doc["token"] = device_token;
+        status["ip"] = WiFi.localIP().toString();
+        status["rssi"] = WiFi.RSSI();
+    }
+    if (full || fingerprintReady != sentFingerprintReady) {
+        status["fingerprint"] = fingerprintReady ? "Ready" : "Not Ready";
+    }
+    if (full || rfidReady != sentRfidReady) {
+        status["rfid"] = rfidReady ? "Ready" : "Not Ready";
+    }
+    if (full || fingerprintCount != sentFingerprintCount) {
+        status["fingerprint_count"] = fingerprintCount;
+    }
+    if (full || rfidCount != sentRfidCount) {
+        status["rfid_count"] = rfidCount;
+    }
+    if (full || buffered != sentBuffered) {
+        status["buffered_taps"] = buffered;
+    }
+    if (status.size() == 0) {
+        return;
+    }
+    
+    sentFingerprintReady = fingerprintReady;
+    sentRfidReady = rfidReady;
+    sentFingerprintCount = fingerprintCount;
+    sentRfidCount = rfidCount;
+    sentBuffered = buffered;
+    sendDocument(doc);
+}
+
+void loadTapState() {
+    File state = LittleFS.open(TAP_STATE_FILE, "r");
+    if (state) {
+        state.read((uint8_t*)&nextSeq, sizeof(nextSeq));
+        state.read((uint8_t*)&ackedSeq, sizeof(ackedSeq));
+        state.close();
+    }
+    
+    if (!LittleFS.exists(TAP_BUFFER_FILE)) {
+        // Allocate the whole ring up front so records can be written in place
+        File buffer = LittleFS.open(TAP_BUFFER_FILE, "w");
+        TapRecord empty = {};
+        for (int i = 0; i < TAP_BUFFER_CAPACITY; i++) {
+            buffer.write((uint8_t*)&empty, sizeof(empty));
+        }
+        buffer.close();
+    }
+    Serial.printf("Tap buffer: %u taps awaiting upload\n", nextSeq - 1 - ackedSeq);
+}
+
+void saveTapState() {
+    File state = LittleFS.open(TAP_STATE_FILE, "w");
+    if (state) {
+        state.write((uint8_t*)&nextSeq, sizeof(nextSeq));
+        state.write((uint8_t*)&ackedSeq, sizeof(ackedSeq));
+        state.close();
+    }
+}
+
+void bufferTap(const char* cardId) {
+    TapRecord record = {};
+    record.seq = nextSeq;
+    time_t now = time(nullptr);
+    record.timestamp = now > (time_t)CLOCK_VALID_AFTER ? (uint32_t)now : 0;
+    strncpy(record.cardId, cardId, sizeof(record.cardId) - 1);
+    
+    File buffer = LittleFS.open(TAP_BUFFER_FILE, "r+");
+    if (!buffer) {
+        Serial.println("Tap buffer unavailable; tap lost");
+        return;
+    }
+    buffer.seek((record.seq % TAP_BUFFER_CAPACITY) * sizeof(TapRecord), SeekSet);
+    buffer.write((uint8_t*)&record, sizeof(record));
+    buffer.close();
+    
+    nextSeq++;
+    if (nextSeq - 1 - ackedSeq > TAP_BUFFER_CAPACITY) {
+        // Ring full: the oldest tap was overwritten
+        ackedSeq = nextSeq - 1 - TAP_BUFFER_CAPACITY;
+    }
+    saveTapState();
+}
+
+void uploadTaps() {
+    if (!wsConnected || ackedSeq + 1 >= nextSeq) {
+        return;
+    }
+    // Only one batch in flight; resend it if no ack arrives
+    if (sentSeq > ackedSeq && millis() - lastUpload < TAP_ACK_TIMEOUT) {
+        return;
+    }
+    
+    File buffer = LittleFS.open(TAP_BUFFER_FILE, "r");
+    if (!buffer) {
+        return;
+    }
+    
+    DynamicJsonDocument doc(3072);
     doc["device"] = "esp8266";
-    doc["status"]["fingerprint"] = fingerprintReady ? "Ready" : "Not Ready";
-    doc["status"]["rfid"] = rfidReady ? "Ready" : "Not Ready";
-    doc["status"]["fingerprint_count"] = fingerprintCount;
-    doc["status"]["rfid_count"] = rfidCount;
-    doc["status"]["ip"] = WiFi.localIP().toString();
-    doc["status"]["rssi"] = WiFi.RSSI();
-    
-    String jsonString;
-    serializeJson(doc, jsonString);
-    webSocket.sendTXT(jsonString);
+    JsonArray taps = doc.createNestedArray("taps");
+    uint32_t seq = ackedSeq + 1;
+    for (int i = 0; i < TAP_BATCH_SIZE && seq < nextSeq; i++, seq++) {
+        TapRecord record;
+        buffer.seek((seq % TAP_BUFFER_CAPACITY) * sizeof(TapRecord), SeekSet);
+        buffer.read((uint8_t*)&record, sizeof(record));
+        JsonArray tap = taps.createNestedArray();
+        tap.add(record.seq);
+        tap.add(record.timestamp);
+        tap.add(record.cardId);
+    }
+    buffer.close();
+    
+    sendDocument(doc);
+    sentSeq = seq - 1;
+    lastUpload = millis();
 }
 
-void handleCommand(char* payload) {
-    DynamicJsonDocument doc(200);
-    DeserializationError error = deserializeJson(doc, payload);
+void handleTapsAck(JsonDocument& doc) {
+    uint32_t hwm = doc["hwm"] | 0;
+    if (hwm >= nextSeq) {
+        // The buffer state was lost (e.g. flash erased); continue numbering
+        // after the gateway's mark or every new tap would be a duplicate
+        nextSeq = hwm + 1;
+        ackedSeq = hwm;
+        saveTapState();
+    } else if (hwm > ackedSeq) {
+        ackedSeq = hwm;
+        saveTapState();
+    }
+    sentSeq = 0;
+    
+    // Feedback for the most recent tap in the batch
+    JsonArray results = doc["results"];
+    if (!results.isNull() && results.size() > 0) {
+        Serial.println(results[results.size() - 1][1] ? "Tap accepted" : "Tap rejected");
+    }
+}
+
+void handleCommand(uint8_t* payload, size_t length, bool binary) {
+    // Large enough for a batch of templates from the library sync
+    DynamicJsonDocument doc(6144);
+    DeserializationError error = binary
+        ? deserializeMsgPack(doc, payload, length)
+        : deserializeJson(doc, payload, length);
     
     if (error) {
-        Serial.println("JSON parsing failed");
+        Serial.println("Message parsing failed");
+        return;
+    }
+    
+    // The gateway acknowledges each tap as soon as it has decided it
+    const char* type = doc["type"] | "";
+    if (strcmp(type, "tap_ack") == 0) {
+        Serial.println(doc["accepted"] ? "Tap accepted" : "Tap rejected");
+        return;
+    }
+    if (strcmp(type, "taps_ack") == 0) {
+        handleTapsAck(doc);
         return;
     }
     
-    const char* command = doc["command"];
+    const char* command = doc["command"] | "";
+    currentCommandId = doc["id"] | "";
     
     if (strcmp(command, "test_fingerprint") == 0) {
         testFingerprint();
@@ -152,6 +403,129 @@ void handleCommand(char* payload) {
     else if (strcmp(command, "register_card") == 0) {
         registerCard();
     }
+    else if (strcasecmp(command, "identify_fingerprint") == 0) {
+        identifyFingerprint();
+    }
+    else if (strcasecmp(command, "store_templates") == 0) {
+        storeTemplates(doc["params"]["templates"]);
+    }
+    else if (strcasecmp(command, "delete_templates") == 0) {
+        deleteTemplates(doc["params"]["slots"]);
+    }
+}
+
+void identifyFingerprint() {
+    if (!fingerprintReady) {
+        sendFingerprintEvent("error", "Sensor not ready");
+        return;
+    }
+    
+    sendFingerprintEvent("identifying", "Place finger on sensor");
+    while (fingerprint.getImage() != FINGERPRINT_OK) {
+        delay(50);
+    }
+    
+    if (fingerprint.image2Tz() != FINGERPRINT_OK) {
+        sendFingerprintEvent("error", "Image conversion failed");
+        return;
+    }
+    
+    // One search over the sensor's whole template library
+    int p = fingerprint.fingerFastSearch();
+    if (p == FINGERPRINT_NOTFOUND) {
+        sendFingerprintEvent("error", "No match");
+        return;
+    }
+    if (p != FINGERPRINT_OK) {
+        sendFingerprintEvent("error", "Search failed");
+        return;
+    }
+    
+    DynamicJsonDocument reply(256);
+    reply["device"] = "esp8266";
+    reply["id"] = currentCommandId;
+    reply["event"]["type"] = "fingerprint";
+    reply["event"]["status"] = "success";
+    reply["event"]["slot"] = fingerprint.fingerID;
+    reply["event"]["confidence"] = fingerprint.confidence;
+    sendDocument(reply);
+}
+
+size_t hexToBytes(const char* hex, uint8_t* out, size_t capacity) {
+    size_t length = strlen(hex) / 2;
+    if (length > capacity) {
+        return 0;
+    }
+    for (size_t i = 0; i < length; i++) {
+        char byteHex[3] = {hex[2 * i], hex[2 * i + 1], 0};
+        out[i] = (uint8_t)strtoul(byteHex, nullptr, 16);
+    }
+    return length;
+}
+
+bool downloadTemplate(uint8_t* data, size_t length) {
+    // DownChar into character buffer 1, then the template in data packets
+    uint8_t command[] = {FINGERPRINT_DOWNCHAR, 0x01};
+    Adafruit_Fingerprint_Packet request(FINGERPRINT_COMMANDPACKET, sizeof(command), command);
+    fingerprint.writeStructuredPacket(request);
+    Adafruit_Fingerprint_Packet ack(FINGERPRINT_ACKPACKET, 0, nullptr);
+    if (fingerprint.getStructuredPacket(&ack) != FINGERPRINT_OK
+            || ack.type != FINGERPRINT_ACKPACKET || ack.data[0] != FINGERPRINT_OK) {
+        return false;
+    }
+    
+    for (size_t offset = 0; offset < length; offset += TEMPLATE_PACKET_SIZE) {
+        size_t chunk = min((size_t)TEMPLATE_PACKET_SIZE, length - offset);
+        uint8_t type = offset + chunk >= length ? FINGERPRINT_ENDDATAPACKET : FINGERPRINT_DATAPACKET;
+        Adafruit_Fingerprint_Packet packet(type, chunk, data + offset);
+        fingerprint.writeStructuredPacket(packet);
+    }
+    return true;
+}
+
+void storeTemplates(JsonArray templates) {
+    if (!fingerprintReady) {
+        sendFingerprintEvent("error", "Sensor not ready");
+        return;
+    }
+    
+    static uint8_t buffer[TEMPLATE_MAX_SIZE];
+    DynamicJsonDocument reply(512);
+    reply["device"] = "esp8266";
+    reply["id"] = currentCommandId;
+    reply["event"]["type"] = "fingerprint";
+    reply["event"]["status"] = "success";
+    JsonArray stored = reply["event"].createNestedArray("stored");
+    
+    for (JsonObject entry : templates) {
+        uint16_t slot = entry["slot"] | 0;
+        size_t length = hexToBytes(entry["template"] | "", buffer, sizeof(buffer));
+        if (slot == 0 || length == 0) {
+            continue;
+        }
+        if (downloadTemplate(buffer, length) && fingerprint.storeModel(slot, 1) == FINGERPRINT_OK) {
+            stored.add(slot);
+        }
+    }
+    
+    fingerprint.getTemplateCount();
+    fingerprintCount = fingerprint.templateCount;
+    sendDocument(reply);
+}
+
+void deleteTemplates(JsonArray slots) {
+    if (!fingerprintReady) {
+        sendFingerprintEvent("error", "Sensor not ready");
+        return;
+    }
+    
+    for (uint16_t slot : slots) {
+        fingerprint.deleteModel(slot);
+    }
+    
+    fingerprint.getTemplateCount();
+    fingerprintCount = fingerprint.templateCount;
+    sendFingerprintEvent("success", "Templates deleted");
 }
 
 void testFingerprint() {
@@ -223,7 +597,7 @@ void enrollFingerprint() {
     
     fingerprintCount++;
     sendFingerprintEvent("success", "Enrollment successful");
-    sendStatus();
+    sendStatus(false);
 }
 
 void testRFID() {
@@ -232,6 +606,7 @@ void testRFID() {
         return;
     }
     
+    cardCommandPending = true;
     sendRFIDEvent("testing", "Waiting for card", "");
 }
 
@@ -241,24 +616,29 @@ void registerCard() {
         return;
     }
     
+    cardCommandPending = true;
     sendRFIDEvent("registering", "Place card on reader", "");
 }
 
 void sendFingerprintEvent(const char* status, const char* message) {
     DynamicJsonDocument doc(200);
     doc["device"] = "esp8266";
+    if (currentCommandId.length() > 0) {
+        doc["id"] = currentCommandId;
+    }
     doc["event"]["type"] = "fingerprint";
     doc["event"]["status"] = status;
     doc["event"]["message"] = message;
     
-    String jsonString;
-    serializeJson(doc, jsonString);
-    webSocket.sendTXT(jsonString);
+    sendDocument(doc);
 }
 
 void sendRFIDEvent(const char* status, const char* message, const char* cardId) {
     DynamicJsonDocument doc(200);
     doc["device"] = "esp8266";
+    if (currentCommandId.length() > 0) {
+        doc["id"] = currentCommandId;
+    }
     doc["event"]["type"] = "rfid";
     doc["event"]["status"] = status;
     doc["event"]["message"] = message;
@@ -266,7 +646,5 @@ void sendRFIDEvent(const char* status, const char* message, const char* cardId)
         doc["event"]["card_id"] = cardId;
     }
     
-    String jsonString;
-    serializeJson(doc, jsonString);
-    webSocket.sendTXT(jsonString);
+    sendDocument(doc);
 }
@@ -1,18 +1,52 @@
-"""Gunicorn configuration for production."""
+"""Gunicorn configuration for production.
+
+Worker modes (GUNICORN_WORKER_CLASS):
+    gthread  one process per core, GUNICORN_THREADS threads each (default)
+    gevent   one process per core, GUNICORN_WORKER_CONNECTIONS greenlets each
+             (requires the gevent and psycogreen packages)
+
+Each worker's database pool is sized from DB_CONNECTION_BUDGET, the
+maximum number of connections the whole server may hold. Set
+DB_EXTERNAL_POOLER=true when connecting through PgBouncer in transaction
+mode to use NullPool instead.
+
+Workers write Prometheus metrics to PROMETHEUS_MULTIPROC_DIR (default
+instance/metrics), which /metrics aggregates across all of them.
+"""
 import multiprocessing
 import os
 
+# Must be set before prometheus_client is first imported
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics'
+))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+from prometheus_client import multiprocess
+
+# Nothing from the app package is imported at module level: importing it
+# loads config.py, which reads WEB_CONCURRENCY and SERVER_CONCURRENCY, and
+# forked workers would inherit the values from before they are set below.
+
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
-worker_connections = 1000
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '100'))
 timeout = 30
 keepalive = 2
 
+# Concurrent requests per worker, which bounds the connections it can use
+concurrency = worker_connections if worker_class == 'gevent' else threads
+
+# Workers read these when sizing their pools (see app.utils.db_pool)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['SERVER_CONCURRENCY'] = str(concurrency)
+
 # Logging
 accesslog = 'logs/access.log'
 errorlog = 'logs/error.log'
@@ -39,8 +73,41 @@ certfile = None
 
 # Server hooks
 def on_starting(server):
-    """Log when the server starts."""
+    """Validate the connection budget and log when the server starts.
+
+    An over-subscribed configuration raises here, so the server never starts.
+    """
+    from flask import Config as FlaskConfig
+    from config import Config
+    from app.utils.db_pool import budget_from_config
+    from app.utils.metrics import remove_dead_process_files
+
+    # The same settings, read the same way, as the pools the workers build
+    settings = FlaskConfig(os.path.dirname(os.path.abspath(__file__)))
+    settings.from_object(Config)
+    pool_budget = budget_from_config(settings)
     server.log.info("Starting Attendance System server")
+    server.log.info(f"Worker class {worker_class}; database pool: {pool_budget.describe()}")
+    remove_dead_process_files(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+def post_fork(server, worker):
+    """Make psycopg2 cooperative under gevent workers."""
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        server.log.warning("psycogreen is not installed; database calls will block gevent workers")
+
+def worker_exit(server, worker):
+    """Write the worker's queued audit records before it exits."""
+    from app.services.audit_log import audit_logger
+    audit_logger.stop()
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited."""
+    multiprocess.mark_process_dead(worker.pid)
 
 def on_reload(server):
     """Log when the server reloads."""
@@ -0,0 +1,41 @@
+"""add attendance indexes
+
+Revision ID: add_attendance_indexes
+Revises: add_dashboard_features
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_attendance_indexes'
+down_revision = 'add_dashboard_features'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Remove duplicate attendance rows so the unique index can be built,
+    # keeping the most recent record for each (lecture, student) pair
+    op.execute(
+        'DELETE FROM attendances WHERE id NOT IN ('
+        'SELECT MAX(id) FROM attendances GROUP BY lecture_id, user_id)'
+    )
+
+    op.create_index('uq_attendances_lecture_user', 'attendances',
+                    ['lecture_id', 'user_id'], unique=True)
+    op.create_index('ix_attendances_user_status_lecture', 'attendances',
+                    ['user_id', 'status', 'lecture_id'])
+    op.create_index('ix_lectures_course_date_start', 'lectures',
+                    ['course_id', 'date', 'start_time'])
+    op.create_index('ix_course_students_course_student', 'course_students',
+                    ['course_id', 'student_id'])
+    op.create_index('ix_activity_logs_timestamp', 'activity_logs',
+                    ['timestamp'])
+
+def downgrade():
+    op.drop_index('ix_activity_logs_timestamp', table_name='activity_logs')
+    op.drop_index('ix_course_students_course_student', table_name='course_students')
+    op.drop_index('ix_lectures_course_date_start', table_name='lectures')
+    op.drop_index('ix_attendances_user_status_lecture', table_name='attendances')
+    op.drop_index('uq_attendances_lecture_user', table_name='attendances')
@@ -0,0 +1,46 @@
+"""add attendance rollups
+
+Revision ID: add_attendance_rollups
+Revises: add_attendance_indexes
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_attendance_rollups'
+down_revision = 'add_attendance_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('attendance_rollups',
+        sa.Column('course_id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('present_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('late_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('absent_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_attended', sa.Date(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ),
+        sa.ForeignKeyConstraint(['student_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('course_id', 'student_id')
+    )
+
+    # Backfill from existing attendance records
+    op.execute(
+        "INSERT INTO attendance_rollups (course_id, student_id, present_count, late_count, "
+        "absent_count, last_attended, updated_at) "
+        "SELECT lectures.course_id, attendances.user_id, "
+        "COUNT(CASE WHEN attendances.status = 'present' THEN 1 END), "
+        "COUNT(CASE WHEN attendances.status = 'late' THEN 1 END), "
+        "COUNT(CASE WHEN attendances.status = 'absent' THEN 1 END), "
+        "MAX(CASE WHEN attendances.status IN ('present', 'late') THEN lectures.date END), "
+        "CURRENT_TIMESTAMP "
+        "FROM attendances JOIN lectures ON attendances.lecture_id = lectures.id "
+        "GROUP BY lectures.course_id, attendances.user_id"
+    )
+
+def downgrade():
+    op.drop_table('attendance_rollups')
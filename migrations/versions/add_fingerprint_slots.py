@@ -0,0 +1,32 @@
+"""add fingerprint slots
+
+Revision ID: add_fingerprint_slots
+Revises: add_user_rfid_card_id
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_fingerprint_slots'
+down_revision = 'add_user_rfid_card_id'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('fingerprint_slots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('device_id', sa.String(length=64), nullable=False),
+        sa.Column('slot', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('template_hash', sa.String(length=64), nullable=False),
+        sa.Column('synced_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('device_id', 'slot', name='uq_fingerprint_slots_device_slot'),
+        sa.UniqueConstraint('device_id', 'user_id', name='uq_fingerprint_slots_device_user')
+    )
+
+def downgrade():
+    op.drop_table('fingerprint_slots')
@@ -0,0 +1,32 @@
+"""add keyset pagination indexes
+
+Revision ID: add_keyset_indexes
+Revises: add_attendance_rollups
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_keyset_indexes'
+down_revision = 'add_attendance_rollups'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # (timestamp, id) serves both ORDER BY timestamp DESC and the seek predicate
+    op.drop_index('ix_activity_logs_timestamp', table_name='activity_logs')
+    op.create_index('ix_activity_logs_timestamp_id', 'activity_logs',
+                    ['timestamp', 'id'])
+    op.create_index('ix_login_logs_timestamp_id', 'login_logs',
+                    ['timestamp', 'id'])
+    op.create_index('ix_attendances_timestamp_id', 'attendances',
+                    ['timestamp', 'id'])
+
+def downgrade():
+    op.drop_index('ix_attendances_timestamp_id', table_name='attendances')
+    op.drop_index('ix_login_logs_timestamp_id', table_name='login_logs')
+    op.drop_index('ix_activity_logs_timestamp_id', table_name='activity_logs')
+    op.create_index('ix_activity_logs_timestamp', 'activity_logs',
+                    ['timestamp'])
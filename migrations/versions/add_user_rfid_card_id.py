@@ -0,0 +1,25 @@
+"""add rfid card id to users
+
+Revision ID: add_user_rfid_card_id
+Revises: add_keyset_indexes
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_user_rfid_card_id'
+down_revision = 'add_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rfid_card_id', sa.String(length=32), nullable=True))
+        batch_op.create_index('ix_users_rfid_card_id', ['rfid_card_id'], unique=True)
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_rfid_card_id')
+        batch_op.drop_column('rfid_card_id')
@@ -0,0 +1,77 @@
+"""move fingerprint data to user biometrics
+
+Revision ID: move_fingerprint_to_user_biometrics
+Revises: add_fingerprint_slots
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+import hashlib
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'move_fingerprint_to_user_biometrics'
+down_revision = 'add_fingerprint_slots'
+branch_labels = None
+depends_on = None
+
+# Templates copied per round trip
+BATCH_SIZE = 500
+
+users = sa.table('users',
+    sa.column('id', sa.Integer),
+    sa.column('fingerprint_data', sa.LargeBinary)
+)
+
+user_biometrics = sa.table('user_biometrics',
+    sa.column('user_id', sa.Integer),
+    sa.column('fingerprint_data', sa.LargeBinary),
+    sa.column('template_hash', sa.String),
+    sa.column('updated_at', sa.DateTime)
+)
+
+def upgrade():
+    op.create_table('user_biometrics',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('fingerprint_data', sa.LargeBinary(), nullable=False),
+        sa.Column('template_hash', sa.String(length=64), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index('ix_user_biometrics_template_hash', 'user_biometrics', ['template_hash'])
+
+    # Copy templates in batches; the hash is computed here as SQLite has no SHA-256
+    conn = op.get_bind()
+    now = datetime.utcnow()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(users.c.id, users.c.fingerprint_data)
+            .where(users.c.fingerprint_data.isnot(None), users.c.id > last_id)
+            .order_by(users.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(user_biometrics.insert(), [
+            {'user_id': row.id, 'fingerprint_data': row.fingerprint_data,
+             'template_hash': hashlib.sha256(row.fingerprint_data).hexdigest(), 'updated_at': now}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('fingerprint_data')
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint_data', sa.LargeBinary(), nullable=True))
+
+    conn = op.get_bind()
+    for row in conn.execute(sa.select(user_biometrics.c.user_id, user_biometrics.c.fingerprint_data)).all():
+        conn.execute(users.update().where(users.c.id == row.user_id).values(fingerprint_data=row.fingerprint_data))
+
+    op.drop_index('ix_user_biometrics_template_hash', table_name='user_biometrics')
+    op.drop_table('user_biometrics')
@@ -0,0 +1,108 @@
+"""partition log tables by month
+
+Revision ID: partition_log_tables
+Revises: move_fingerprint_to_user_biometrics
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'partition_log_tables'
+down_revision = 'move_fingerprint_to_user_biometrics'
+branch_labels = None
+depends_on = None
+
+# Table -> (partition column, indexes on it besides the primary key)
+TABLES = {
+    'activity_logs': ('timestamp', {'ix_activity_logs_timestamp_id': ['timestamp', 'id']}),
+    'login_logs': ('timestamp', {'ix_login_logs_timestamp_id': ['timestamp', 'id']}),
+    'notifications': ('created_at', {'ix_notifications_created_at': ['created_at']})
+}
+
+# Partitions created past the current month; later ones come from scripts/backup_scheduler.py
+MONTHS_AHEAD = 2
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _partition(table, column, indexes):
+    """Rebuild a table as a partitioned table with one partition per month of its rows."""
+    conn = op.get_bind()
+    old = f'{table}_unpartitioned'
+    for name in indexes:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+    op.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    op.execute(f'ALTER INDEX {table}_pkey RENAME TO {old}_pkey')
+    # Keep the id sequence when the old table is dropped
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+
+    # The partition key has to be part of the primary key, and so not null
+    op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE ({column})')
+    op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL')
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, {column})')
+    op.execute(f'ALTER TABLE {table} ADD FOREIGN KEY (user_id) REFERENCES users (id)')
+    for name, columns in indexes.items():
+        op.execute(f'CREATE INDEX {name} ON {table} ({", ".join(columns)})')
+
+    op.execute(f"UPDATE {old} SET {column} = now() AT TIME ZONE 'utc' WHERE {column} IS NULL")
+    oldest = conn.execute(sa.text(f'SELECT min({column}) FROM {old}')).scalar() or datetime.utcnow()
+    month = datetime(oldest.year, oldest.month, 1)
+    last = _add_months(datetime(datetime.utcnow().year, datetime.utcnow().month, 1), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+        )
+        month = _add_months(month, 1)
+    op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+    op.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    op.execute(f'DROP TABLE {old}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+
+
+def _unpartition(table, column, indexes):
+    """Rebuild a partitioned table as a plain table holding all of its partitions' rows."""
+    old = f'{table}_partitioned'
+    for name in indexes:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+    op.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    op.execute(f'ALTER INDEX {table}_pkey RENAME TO {old}_pkey')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+
+    op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)')
+    op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} DROP NOT NULL')
+    op.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+    op.execute(f'ALTER TABLE {table} ADD FOREIGN KEY (user_id) REFERENCES users (id)')
+    for name, columns in indexes.items():
+        op.execute(f'CREATE INDEX {name} ON {table} ({", ".join(columns)})')
+
+    # Drops the partitions with it
+    op.execute(f'DROP TABLE {old}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite expires months by indexed deletes (app.utils.partitions); only the index is new
+        op.create_index('ix_notifications_created_at', 'notifications', ['created_at'])
+        return
+    for table, (column, indexes) in TABLES.items():
+        _partition(table, column, indexes)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        op.drop_index('ix_notifications_created_at', table_name='notifications')
+        return
+    for table, (column, indexes) in TABLES.items():
+        if table == 'notifications':
+            indexes = {}
+        _unpartition(table, column, indexes)
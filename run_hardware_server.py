@@ -1,13 +1,19 @@
 import sys
 import os
 
-# Add the app directory to Python path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from hardware.websocket_server import main
+from app.hardware.websocket_server import main, parse_args
 import asyncio
 
 if __name__ == "__main__":
+    args = parse_args()
     print("Starting Hardware WebSocket Server...")
-    print("Listening on ws://0.0.0.0:8765")
-    asyncio.run(main())
+    print(f"Listening on ws://{args.host}:{args.port}")
+    if args.serial_port:
+        print(f"Serial controller on {args.serial_port} at {args.baudrate} baud")
+    asyncio.run(main(args.host, args.port, args.serial_port, args.baudrate, args.serial_room,
+                     args.client_queue_size, args.database_url, args.index_refresh,
+                     args.journal, args.batch_size, args.flush_ms / 1000, args.token,
+                     args.device_token))
@@ -1,4 +1,4 @@
-"""Schedule regular database backups."""
+"""Schedule regular database backups and log partition maintenance."""
 import os
 import sys
 import logging
@@ -10,8 +10,10 @@ from pathlib import Path
 # Add parent directory to path so we can import app modules
 sys.path.append(str(Path(__file__).parent.parent))
 
+from sqlalchemy import create_engine
 from app.utils.backup import DatabaseBackup
-from config import Config
+from app.utils.partitions import PartitionManager
+from config import Config, config
 
 # Configure logging
 logging.basicConfig(
@@ -44,14 +46,38 @@ def perform_backup():
     except Exception as e:
         logger.error(f"Scheduled backup failed: {e}")
 
+def maintain_partitions():
+    """Create upcoming log partitions and drop the expired ones."""
+    try:
+        # Registers the log tables' metadata, used to recreate them on SQLite
+        import app.models  # noqa: F401
+
+        env_config = config[os.getenv('FLASK_ENV', 'production')]
+        engine = create_engine(env_config.SQLALCHEMY_DATABASE_URI)
+        try:
+            summary = PartitionManager(engine).maintain(
+                retention_months=env_config.PARTITION_RETENTION_MONTHS,
+                months_ahead=env_config.PARTITION_MONTHS_AHEAD
+            )
+        finally:
+            engine.dispose()
+        logger.info(f"Maintained log partitions: {summary}")
+
+    except Exception as e:
+        logger.error(f"Partition maintenance failed: {e}")
+
 def main():
     """Main function to schedule backups."""
     logger.info("Starting backup scheduler...")
     
     # Schedule daily backup at 3 AM
     schedule.every().day.at("03:00").do(perform_backup)
+
+    # Partitions before the backup, so expired months are not backed up again
+    schedule.every().day.at("02:30").do(maintain_partitions)
     
-    # Also perform initial backup when starting
+    # Also perform initial maintenance and backup when starting
+    maintain_partitions()
     perform_backup()
     
     while True:
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Compare wire encodings of the hardware gateway's messages.
+
+For each message the gateway and readers exchange, reports the encoded
+size and the encode and decode time per message for every codec in
+``app/hardware/framing.py`` that is installed. It also compares a status
+broadcast encoded once per client, as the gateway used to, with one
+encoded once for all subscribers, and a full status message with the
+delta the gateway now publishes.
+
+Usage:
+    python scripts/benchmark_framing.py
+    python scripts/benchmark_framing.py --subscribers 5000 --repeat 20000
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.hardware.framing import CODECS, JSON, CborCodec, MsgPackCodec, cbor2, msgpack
+from app.hardware.websocket_server import Device
+
+
+def sample_messages():
+    """Representative messages, built with the gateway's own classes where possible."""
+    device = Device('reader-12', 'LT-204')
+    device.update_status({'fingerprint': 'Ready', 'rfid': 'Ready', 'fingerprint_count': 57,
+                          'rfid_count': 1204})
+    full_status = device.status_message()
+    device.status_delta()
+    device.update_status({'rfid_count': 1205})
+    delta_status = device.status_delta()
+
+    devices = []
+    for index in range(50):
+        reader = Device(f'reader-{index}', f'room-{index}')
+        reader.update_status({'fingerprint': 'Ready', 'rfid': 'Ready', 'rfid_count': index * 10})
+        devices.append(reader.status_message())
+
+    return {
+        'device status report': {
+            'device': 'esp8266', 'device_id': 'reader-12', 'room': 'LT-204',
+            'status': {'fingerprint': 'Ready', 'rfid': 'Ready', 'fingerprint_count': 57,
+                       'rfid_count': 1204, 'ip': '10.20.4.31', 'rssi': -61, 'buffered_taps': 0}
+        },
+        'status (full)': full_status,
+        'status (delta)': delta_status,
+        'rfid event': {
+            'type': 'rfid', 'device_id': 'reader-12', 'room': 'LT-204', 'status': 'card_detected',
+            'cardId': '04a1b2c3', 'accepted': True, 'reason': 'accepted', 'userId': 4312,
+            'lectureId': 88123, 'timestamp': '2026-10-18T09:41:07.123456'
+        },
+        'tap batch (32)': {
+            'device': 'esp8266',
+            'taps': [[1000 + n, 1792316467 + n * 7, f'04a1{n:04x}'] for n in range(32)]
+        },
+        'taps_ack (32)': {'type': 'taps_ack', 'hwm': 1031, 'results': [[1000 + n, True] for n in range(32)]},
+        'devices snapshot (50)': {'type': 'devices', 'devices': devices,
+                                  'timestamp': '2026-10-18T09:41:07.123456'}
+    }
+
+
+def per_message_us(func, argument, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(argument)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def benchmark_codecs(messages, repeat):
+    print(f"{'message':<24}{'codec':<10}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+    for name, message in messages.items():
+        for codec in CODECS:
+            payload = codec.encode(message)
+            size = len(payload.encode() if isinstance(payload, str) else payload)
+            encode_us = per_message_us(codec.encode, message, repeat)
+            decode_us = per_message_us(codec.decode, payload, repeat)
+            print(f"{name:<24}{codec.name:<10}{size:>8}{encode_us:>12.2f}{decode_us:>12.2f}")
+        print()
+
+
+def benchmark_broadcast(message, subscribers, repeat):
+    """CPU per broadcast: one encode per subscriber versus one for all."""
+    codec = CODECS[0]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        queued = []
+        for _ in range(subscribers):
+            queued.append(JSON.encode(message))
+    per_client = (time.perf_counter() - start) / repeat * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        queued = []
+        payload = codec.encode(message)
+        for _ in range(subscribers):
+            queued.append(payload)
+    once = (time.perf_counter() - start) / repeat * 1000
+
+    print(f"Broadcast to {subscribers} subscribers:")
+    print(f"  json per client:       {per_client:8.3f} ms")
+    print(f"  {codec.name} encoded once:  {once:8.3f} ms")
+
+
+def main():
+    """Run the codec and broadcast benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10000, help='Encodes and decodes per measurement')
+    parser.add_argument('--subscribers', type=int, default=1000, help='Clients receiving a broadcast')
+    args = parser.parse_args()
+
+    missing = [codec.name for codec, module in ((MsgPackCodec, msgpack), (CborCodec, cbor2)) if module is None]
+    if missing:
+        print(f"Not installed, skipped: {', '.join(missing)}\n")
+
+    messages = sample_messages()
+    benchmark_codecs(messages, args.repeat)
+    benchmark_broadcast(messages['status (delta)'], args.subscribers, max(1, args.repeat // 100))
+
+
+if __name__ == '__main__':
+    main()
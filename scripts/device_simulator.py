@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Simulate ESP8266 readers that buffer taps offline and sync them in batches.
+
+Each simulated reader behaves like the firmware in
+``esp8266/attendance_controller.ino``: every tap goes into a bounded ring
+buffer with a per-device sequence number, and while connected the reader
+uploads the buffer in batches of ``[seq, unix_time, card_id]``, one batch
+in flight at a time, dropping taps once the gateway acknowledges their
+high-water mark. Readers go offline periodically so taps pile up and are
+synced on reconnect.
+
+Usage:
+    python scripts/device_simulator.py --url ws://localhost:8765 --cards 04a1b2c3 04d5e6f7
+    python scripts/device_simulator.py --readers 20 --online 30 --offline 60 --duration 600
+"""
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from collections import deque
+from itertools import islice
+
+import websockets
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Same limits as the firmware
+BUFFER_CAPACITY = 2048
+BATCH_SIZE = 32
+ACK_TIMEOUT = 10.0  # seconds before an unacknowledged batch is resent
+
+
+class SimulatedReader:
+    """A reader with an offline tap buffer speaking the batch sync protocol."""
+
+    def __init__(self, url, device_id, room, capacity=BUFFER_CAPACITY, batch_size=BATCH_SIZE,
+                 ack_timeout=ACK_TIMEOUT):
+        self.url = url
+        self.device_id = device_id
+        self.room = room
+        self.batch_size = batch_size
+        self.ack_timeout = ack_timeout
+        self.buffer = deque(maxlen=capacity)
+        self.next_seq = 1
+        self.acked_seq = 0
+
+        self.tapped = 0
+        self.overwritten = 0
+        self.batches = 0
+        self.resends = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.ack_latencies = []
+
+    def tap(self, card_id, timestamp=None):
+        """Buffer a tap, overwriting the oldest one when the ring is full."""
+        if len(self.buffer) == self.buffer.maxlen:
+            self.overwritten += 1
+        self.buffer.append([self.next_seq, int(timestamp if timestamp is not None else time.time()), card_id])
+        self.next_seq += 1
+        self.tapped += 1
+
+    @property
+    def pending(self):
+        """Taps buffered and not yet acknowledged."""
+        return len(self.buffer)
+
+    def acknowledge(self, hwm):
+        """Drop every buffered tap up to the gateway's high-water mark."""
+        if hwm >= self.next_seq:
+            # The gateway has seen later taps than this reader remembers
+            self.next_seq = hwm + 1
+        while self.buffer and self.buffer[0][0] <= hwm:
+            self.buffer.popleft()
+        self.acked_seq = max(self.acked_seq, hwm)
+
+    async def connect(self):
+        """Open a connection and register with the gateway."""
+        websocket = await websockets.connect(self.url, compression=None, ping_interval=None)
+        await websocket.send(json.dumps({
+            "device": "esp8266",
+            "device_id": self.device_id,
+            "room": self.room,
+            "status": {"fingerprint": "Ready", "rfid": "Ready", "buffered_taps": self.pending}
+        }))
+        return websocket
+
+    async def _wait_for_ack(self, websocket):
+        while True:
+            data = json.loads(await websocket.recv())
+            if data.get("type") == "taps_ack":
+                return data
+
+    async def upload_batch(self, websocket, batch=None):
+        """Send one batch and wait for its acknowledgement.
+
+        Args:
+            batch: Taps to send; defaults to the oldest buffered taps
+
+        Returns:
+            dict: The ``taps_ack`` reply, or None if it timed out
+        """
+        batch = batch if batch is not None else list(islice(self.buffer, self.batch_size))
+        start = time.perf_counter()
+        await websocket.send(json.dumps({"device": "esp8266", "taps": batch}))
+        self.batches += 1
+        try:
+            ack = await asyncio.wait_for(self._wait_for_ack(websocket), self.ack_timeout)
+        except asyncio.TimeoutError:
+            self.resends += 1
+            return None
+        self.ack_latencies.append(time.perf_counter() - start)
+        for _, accepted in ack.get("results", []):
+            if accepted:
+                self.accepted += 1
+            else:
+                self.rejected += 1
+        self.acknowledge(ack["hwm"])
+        return ack
+
+    async def sync(self, websocket):
+        """Upload batches until the buffer is empty."""
+        while self.buffer:
+            await self.upload_batch(websocket)
+
+    async def run(self, cards, duration, tap_interval, online_for, offline_for):
+        """Tap random cards for ``duration`` seconds, going offline periodically."""
+        loop = asyncio.get_running_loop()
+        end = loop.time() + duration
+
+        async def tap_loop():
+            while loop.time() < end:
+                await asyncio.sleep(random.expovariate(1 / tap_interval))
+                self.tap(random.choice(cards))
+
+        tapper = asyncio.create_task(tap_loop())
+        try:
+            while loop.time() < end:
+                websocket = await self.connect()
+                try:
+                    online_until = min(end, loop.time() + online_for)
+                    while loop.time() < online_until:
+                        await self.sync(websocket)
+                        await asyncio.sleep(0.2)
+                finally:
+                    await websocket.close()
+                if loop.time() < end:
+                    logger.info(f"{self.device_id} offline for {offline_for:.0f} s")
+                    await asyncio.sleep(min(offline_for, end - loop.time()))
+        finally:
+            tapper.cancel()
+
+        # Flush whatever was tapped during the last offline period
+        websocket = await self.connect()
+        try:
+            await self.sync(websocket)
+        finally:
+            await websocket.close()
+
+    def report(self):
+        latencies = sorted(self.ack_latencies)
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        return (f"{self.device_id}: {self.tapped} taps, {self.accepted} accepted, "
+                f"{self.rejected} rejected, {self.overwritten} overwritten, {self.pending} pending, "
+                f"{self.batches} batches ({self.resends} resent), ack p50 {p50:.1f} ms")
+
+
+async def run_fleet(args):
+    readers = [SimulatedReader(args.url, f"{args.device_prefix}-{index}", f"{args.room_prefix}-{index}",
+                               capacity=args.capacity, batch_size=args.batch_size)
+               for index in range(args.readers)]
+    await asyncio.gather(*(reader.run(args.cards, args.duration, args.tap_interval, args.online, args.offline)
+                           for reader in readers))
+    for reader in readers:
+        print(reader.report())
+
+
+def main():
+    """Run a fleet of simulated readers against a gateway."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='ws://localhost:8765', help='Gateway to connect to')
+    parser.add_argument('--readers', type=int, default=1, help='Simulated readers, one per room')
+    parser.add_argument('--device-prefix', default='sim-reader')
+    parser.add_argument('--room-prefix', default='sim-room')
+    parser.add_argument('--cards', nargs='+', default=['04a1b2c3'], help='Card IDs to tap')
+    parser.add_argument('--duration', type=float, default=120.0, help='Seconds to tap for')
+    parser.add_argument('--tap-interval', type=float, default=1.0, help='Mean seconds between taps')
+    parser.add_argument('--online', type=float, default=30.0, help='Seconds online between drops')
+    parser.add_argument('--offline', type=float, default=30.0, help='Seconds offline per drop')
+    parser.add_argument('--capacity', type=int, default=BUFFER_CAPACITY, help='Ring buffer size')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Taps per upload')
+    args = parser.parse_args()
+    asyncio.run(run_fleet(args))
+
+
+if __name__ == '__main__':
+    main()
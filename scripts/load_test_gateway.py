@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Load test the hardware gateway with a simulated fleet of readers and browsers.
+
+Connects a fleet of simulated ESP8266 readers (one per room) and browser
+clients that each subscribe to one room, then has every reader send RFID
+events at a fixed interval. A fraction of the browsers never read from
+their socket. The report shows fan-out latency and delivery for the
+well-behaved browsers, which should be unaffected by the slow ones, and
+the gateway's queue and drop counters.
+
+Starts a gateway on a free local port unless --url is given.
+
+Usage:
+    python scripts/load_test_gateway.py
+    python scripts/load_test_gateway.py --devices 500 --clients 5000 --duration 60
+    python scripts/load_test_gateway.py --url ws://gateway.example:8765
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import resource
+import subprocess
+from collections import Counter
+
+import websockets
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def raise_file_limit():
+    """Raise the open file limit to the hard limit; each connection needs a descriptor."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gateway(port, client_queue_size=256, extra_args=()):
+    """Run the gateway in a child process and wait until it accepts connections."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_ROOT, 'run_hardware_server.py'),
+         '--host', '127.0.0.1', '--port', str(port),
+         '--client-queue-size', str(client_queue_size), *extra_args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('Gateway did not start')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class LoadTest:
+    """Simulated fleet state and results."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rooms = [f"room-{index}" for index in range(args.devices)]
+        self.sent = Counter()  # room -> events sent
+        self.received = Counter()  # room -> events received by fast clients
+        self.fast_rooms = Counter()  # room -> fast clients subscribed
+        self.latencies = []
+        self.connect_errors = 0
+        self.events_started = asyncio.Event()
+        self.stopping = asyncio.Event()
+        self.connect_limit = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect(self):
+        async with self.connect_limit:
+            return await websockets.connect(self.args.url, compression=None, open_timeout=30,
+                                            ping_interval=None, max_queue=32)
+
+    async def run_device(self, index):
+        room = self.rooms[index]
+        try:
+            websocket = await self.connect()
+        except Exception:
+            self.connect_errors += 1
+            return
+        try:
+            await websocket.send(json.dumps({
+                "device": "esp8266",
+                "device_id": f"reader-{index}",
+                "room": room,
+                "status": {"fingerprint": "Ready", "rfid": "Ready"}
+            }))
+            await self.events_started.wait()
+            # Spread the fleet's events evenly over the interval
+            await asyncio.sleep(random.uniform(0, self.args.event_interval))
+            while not self.stopping.is_set():
+                # The card ID carries the send time so receivers can measure latency
+                await websocket.send(json.dumps({
+                    "device": "esp8266",
+                    "event": {"type": "rfid", "status": "card_detected", "card_id": repr(time.time())}
+                }))
+                self.sent[room] += 1
+                await asyncio.sleep(self.args.event_interval)
+        finally:
+            await websocket.close()
+
+    async def run_client(self, slow, ready):
+        room = random.choice(self.rooms)
+        try:
+            websocket = await self.connect()
+        except Exception:
+            self.connect_errors += 1
+            ready.release()
+            return
+        try:
+            await websocket.send(json.dumps({"type": "subscribe", "room": room}))
+            while json.loads(await websocket.recv()).get("type") != "subscribed":
+                pass
+            ready.release()
+            if slow:
+                # Never read; the gateway must not wait on this client
+                await asyncio.get_running_loop().create_future()
+            self.fast_rooms[room] += 1
+            async for message in websocket:
+                data = json.loads(message)
+                if data.get("type") == "rfid":
+                    self.latencies.append(time.time() - float(data["cardId"]))
+                    self.received[room] += 1
+        finally:
+            websocket.transport.abort()
+
+    async def gateway_stats(self):
+        websocket = await self.connect()
+        try:
+            await websocket.send(json.dumps({"type": "stats"}))
+            while True:
+                data = json.loads(await websocket.recv())
+                if data.get("type") == "stats":
+                    return data
+        finally:
+            await websocket.close()
+
+    async def run(self):
+        args = self.args
+        start = time.perf_counter()
+        devices = [asyncio.create_task(self.run_device(index)) for index in range(args.devices)]
+
+        slow_clients = int(args.clients * args.slow_fraction)
+        ready = asyncio.Semaphore(0)
+        clients = [asyncio.create_task(self.run_client(index < slow_clients, ready))
+                   for index in range(args.clients)]
+        for _ in clients:
+            await ready.acquire()
+        logger.info(f"Connected {args.devices} devices and {args.clients} clients "
+                    f"({slow_clients} slow) in {time.perf_counter() - start:.1f} s")
+
+        self.events_started.set()
+        await asyncio.sleep(args.duration)
+        self.stopping.set()
+        await asyncio.gather(*devices, return_exceptions=True)
+        # Let in-flight events reach the fast clients
+        await asyncio.sleep(args.drain)
+        stats = await self.gateway_stats()
+
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        self.report(stats)
+
+    def report(self, stats):
+        expected = sum(self.sent[room] * count for room, count in self.fast_rooms.items())
+        delivered = sum(self.received.values())
+        latencies = sorted(self.latencies)
+        events = sum(self.sent.values())
+
+        print()
+        print(f"Events sent:            {events} ({events / self.args.duration:.0f}/s)")
+        print(f"Fast-client deliveries: {delivered} of {expected} "
+              f"({100.0 * delivered / expected if expected else 100.0:.2f}%)")
+        print(f"Fan-out latency ms:     p50 {percentile(latencies, 0.50) * 1000:.1f}  "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f}  "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f}  "
+              f"max {(latencies[-1] if latencies else 0) * 1000:.1f}")
+        print(f"Connect errors:         {self.connect_errors}")
+        print(f"Gateway:                {stats['devices']} devices, {stats['clients']} clients, "
+              f"{stats['queued']} queued, {stats['dropped']} dropped")
+
+
+def main():
+    """Start or connect to a gateway and run the load test."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Gateway to test; a local one is started if omitted')
+    parser.add_argument('--devices', type=int, default=500, help='Simulated readers, one per room')
+    parser.add_argument('--clients', type=int, default=5000, help='Simulated browser clients')
+    parser.add_argument('--slow-fraction', type=float, default=0.02,
+                        help='Fraction of clients that never read from their socket')
+    parser.add_argument('--event-interval', type=float, default=5.0,
+                        help='Seconds between RFID events of each reader')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to send events for')
+    parser.add_argument('--drain', type=float, default=3.0,
+                        help='Seconds to wait for deliveries after the readers stop')
+    parser.add_argument('--connect-concurrency', type=int, default=200,
+                        help='Connection handshakes in flight at once')
+    parser.add_argument('--client-queue-size', type=int, default=256,
+                        help='Per-client queue size of the locally started gateway')
+    args = parser.parse_args()
+
+    limit = raise_file_limit()
+    if args.url is None and limit < 2 * (args.devices + args.clients) + 100:
+        logger.warning(f"Open file limit {limit} may be too low for this fleet size")
+
+    gateway = None
+    if args.url is None:
+        port = free_port()
+        gateway = start_gateway(port, args.client_queue_size)
+        args.url = f"ws://127.0.0.1:{port}"
+        logger.info(f"Started gateway at {args.url}")
+
+    try:
+        asyncio.run(LoadTest(args).run())
+    finally:
+        if gateway is not None:
+            gateway.terminate()
+            gateway.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Replay hours of taps buffered offline by a fleet of readers and measure ingestion.
+
+Seeds a throwaway SQLite database with one course per room, its enrolled
+students and a lecture every hour over the past ``--hours``, then has a
+simulated reader per room (see ``device_simulator.py``) come back online
+holding a tap from every student for every lecture, plus repeat taps and
+unknown cards. All readers sync at once against a gateway started on a
+free port. The report shows how long the gateway took to acknowledge the
+backlog and to write it to the database, and checks that resending an
+acknowledged batch writes nothing twice.
+
+Usage:
+    python scripts/replay_buffered_taps.py
+    python scripts/replay_buffered_taps.py --readers 50 --hours 8 --students 120
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import calendar
+import tempfile
+from datetime import datetime, timedelta
+
+import websockets
+from sqlalchemy import create_engine, func, select
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.extensions import db
+from app import models  # noqa: F401  registers all tables on db.metadata
+from device_simulator import SimulatedReader
+from load_test_gateway import free_port, percentile, start_gateway
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+LECTURE_MINUTES = 50
+
+
+def unix_time(value):
+    return calendar.timegm(value.utctimetuple())
+
+
+def seed(engine, readers, students, hours, seed_value=42):
+    """Create the schema and a lecture every hour in each room.
+
+    Returns:
+        tuple: ``{room: [(lecture start, lecture end, [card_id, ...]), ...]}``
+        and the number of distinct (lecture, student) pairs
+    """
+    rng = random.Random(seed_value)
+    db.metadata.create_all(engine)
+    t = db.metadata.tables
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+
+    schedule = {}
+    with engine.begin() as conn:
+        conn.execute(t['departments'].insert(), [{'id': 1, 'name': 'Replay', 'code': 'RPL'}])
+        users = [{'id': r + 1, 'login_id': f'L{r:05d}', 'role': 'lecturer', 'department_id': 1,
+                  'is_active': True, 'created_at': now, 'rfid_card_id': None} for r in range(readers)]
+        courses = []
+        enrollments = []
+        lectures = []
+        cards = {}
+        next_user = readers + 1
+        next_lecture = 1
+        for r in range(readers):
+            room = f"room-{r}"
+            courses.append({'id': r + 1, 'code': f'RPL{r:04d}', 'title': f'Course {r}',
+                            'department_id': 1, 'lecturer_id': r + 1, 'minimum_attendance': 75,
+                            'is_active': True})
+            roster = []
+            for _ in range(students):
+                card_id = f"{next_user:08x}"
+                users.append({'id': next_user, 'login_id': f'S{next_user:07d}', 'role': 'student',
+                              'department_id': 1, 'is_active': True, 'created_at': now,
+                              'rfid_card_id': card_id})
+                enrollments.append({'course_id': r + 1, 'student_id': next_user, 'status': 'active'})
+                roster.append(card_id)
+                next_user += 1
+            cards[room] = roster
+
+            schedule[room] = []
+            for h in range(hours, 0, -1):
+                start = now - timedelta(hours=h)
+                end = start + timedelta(minutes=LECTURE_MINUTES)
+                if end.date() != start.date():
+                    continue  # keep lectures within one day
+                lectures.append({'id': next_lecture, 'course_id': r + 1, 'room': room,
+                                 'date': start.date(), 'start_time': start.time(),
+                                 'end_time': end.time(), 'status': 'completed', 'is_active': True})
+                schedule[room].append((start, end, roster))
+                next_lecture += 1
+
+        conn.execute(t['users'].insert(), users)
+        conn.execute(t['courses'].insert(), courses)
+        conn.execute(t['course_students'].insert(), enrollments)
+        conn.execute(t['lectures'].insert(), lectures)
+
+    expected = sum(len(roster) for slots in schedule.values() for _, _, roster in slots)
+    logger.info(f"Seeded {readers} rooms, {readers * students} students, {len(lectures)} lectures")
+    return schedule, expected, rng
+
+
+def buffer_taps(reader, slots, rng, repeat_fraction, unknown_fraction):
+    """Fill a reader's buffer with the taps of every lecture held in its room."""
+    taps = []
+    for start, end, roster in slots:
+        span = (end - start).total_seconds()
+        for card_id in roster:
+            taps.append((unix_time(start) + rng.uniform(0, span), card_id))
+            if rng.random() < repeat_fraction:
+                taps.append((unix_time(start) + rng.uniform(0, span), card_id))
+        for _ in range(int(len(roster) * unknown_fraction)):
+            taps.append((unix_time(start) + rng.uniform(0, span), f"ff{rng.getrandbits(24):06x}"))
+    for timestamp, card_id in sorted(taps):
+        reader.tap(card_id, timestamp)
+
+
+async def gateway_stats(url):
+    async with websockets.connect(url, compression=None) as websocket:
+        await websocket.send(json.dumps({"type": "stats"}))
+        while True:
+            data = json.loads(await websocket.recv())
+            if data.get("type") == "stats":
+                return data
+
+
+async def replay(args, url, readers):
+    taps = sum(reader.pending for reader in readers)
+    logger.info(f"Replaying {taps} buffered taps from {len(readers)} readers")
+
+    start = time.perf_counter()
+    connections = [await reader.connect() for reader in readers]
+    await asyncio.gather(*(reader.sync(ws) for reader, ws in zip(readers, connections)))
+    acked = time.perf_counter() - start
+
+    while True:
+        stats = (await gateway_stats(url))["ingestion"]
+        if stats["depth"] == 0:
+            break
+        await asyncio.sleep(0.05)
+    written = time.perf_counter() - start
+
+    # Resend an acknowledged batch, as a reader would after a lost ack
+    first_batch = [[seq, 0, '00000000'] for seq in range(1, args.batch_size + 1)]
+    ack = await readers[0].upload_batch(connections[0], first_batch)
+    for websocket in connections:
+        await websocket.close()
+
+    stats = (await gateway_stats(url))["ingestion"]
+    return {'taps': taps, 'acked_s': acked, 'written_s': written, 'resend_ack': ack, 'stats': stats}
+
+
+def report(args, readers, result, expected, rows):
+    latencies = sorted(latency for reader in readers for latency in reader.ack_latencies)
+    stats = result['stats']
+    print()
+    print(f"Buffered taps:          {result['taps']} from {len(readers)} readers "
+          f"({args.hours} h, {args.students} students per room)")
+    print(f"Acknowledged in:        {result['acked_s']:.2f} s "
+          f"({result['taps'] / result['acked_s']:.0f} taps/s)")
+    print(f"Written in:             {result['written_s']:.2f} s "
+          f"({result['taps'] / result['written_s']:.0f} taps/s)")
+    print(f"Batch ack latency ms:   p50 {percentile(latencies, 0.50) * 1000:.1f}  "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f}  "
+          f"max {(latencies[-1] if latencies else 0) * 1000:.1f}")
+    print(f"Accepted / rejected:    {sum(r.accepted for r in readers)} / {sum(r.rejected for r in readers)}")
+    print(f"Ingestion:              {stats['written']} written, {stats['duplicates']} duplicates, "
+          f"{stats['batches']} batches, flush p50 {stats['flush_ms_p50']} ms")
+    resend = result['resend_ack']
+    idempotent = resend is not None and not resend['results'] and rows == expected
+    print(f"Attendance rows:        {rows} of {expected} expected")
+    print(f"Resent batch:           {'ignored' if idempotent else 'NOT IGNORED'} (hwm {resend and resend['hwm']})")
+    return idempotent
+
+
+def main():
+    """Seed a database, start a gateway and replay the buffered taps."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=20, help='Simulated readers, one per room')
+    parser.add_argument('--students', type=int, default=60, help='Students enrolled per room')
+    parser.add_argument('--hours', type=int, default=6, help='Hours of lectures buffered offline')
+    parser.add_argument('--repeat-fraction', type=float, default=0.1,
+                        help='Fraction of students who tap twice in a lecture')
+    parser.add_argument('--unknown-fraction', type=float, default=0.02,
+                        help='Unknown cards tapped per enrolled student')
+    parser.add_argument('--capacity', type=int, default=4096, help='Reader ring buffer size')
+    parser.add_argument('--batch-size', type=int, default=32, help='Taps per reader upload')
+    parser.add_argument('--ingest-batch-size', type=int, default=200, help='Taps per database write')
+    parser.add_argument('--flush-ms', type=int, default=250, help='Gateway flush interval')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='replay-taps-')
+    database_url = f"sqlite:///{os.path.join(workdir, 'replay.db')}"
+    engine = create_engine(database_url)
+    schedule, expected, rng = seed(engine, args.readers, args.students, args.hours)
+
+    port = free_port()
+    url = f"ws://127.0.0.1:{port}"
+    readers = []
+    for room, slots in schedule.items():
+        reader = SimulatedReader(url, f"reader-{room}", room, capacity=args.capacity,
+                                 batch_size=args.batch_size)
+        buffer_taps(reader, slots, rng, args.repeat_fraction, args.unknown_fraction)
+        readers.append(reader)
+    overwritten = sum(reader.overwritten for reader in readers)
+    if overwritten:
+        logger.warning(f"{overwritten} taps overwritten; raise --capacity")
+
+    gateway = start_gateway(port, extra_args=[
+        '--database-url', database_url,
+        '--journal', os.path.join(workdir, 'journal.db'),
+        '--batch-size', str(args.ingest_batch_size),
+        '--flush-ms', str(args.flush_ms)
+    ])
+    try:
+        result = asyncio.run(replay(args, url, readers))
+    finally:
+        gateway.terminate()
+        gateway.wait()
+
+    with engine.connect() as conn:
+        rows = conn.execute(select(func.count()).select_from(db.metadata.tables['attendances'])).scalar()
+    if not report(args, readers, result, expected, rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
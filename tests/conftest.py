@@ -26,6 +26,24 @@ def runner(app):
     """A test runner for the app's Click commands."""
     return app.test_cli_runner()
 
+@pytest.fixture
+def query_budget(app):
+    """Set the SQL statement budget for requests made during a test.
+
+    ``QUERY_BUDGET_STRICT`` is on under TestingConfig, so a request that
+    issues more statements than its budget raises QueryBudgetExceeded.
+
+    Usage:
+        query_budget(5)                          # every endpoint
+        query_budget(5, endpoint='admin.attendance')
+    """
+    def set_budget(limit, endpoint=None):
+        if endpoint is None:
+            app.config['QUERY_BUDGET'] = limit
+        else:
+            app.config['QUERY_BUDGETS'] = {**app.config['QUERY_BUDGETS'], endpoint: limit}
+    return set_budget
+
 @pytest.fixture
 def auth_client(client):
     """A test client with authentication."""
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import text
+from app.extensions import db
+from app.utils.query_profiler import QueryBudgetExceeded
+
+
+@pytest.fixture
+def statements_endpoint(app):
+    """An endpoint issuing ``n`` SQL statements."""
+    def run_statements(n):
+        for _ in range(n):
+            db.session.execute(text('SELECT 1'))
+        return 'ok'
+    app.add_url_rule('/test/statements/<int:n>', 'run_statements', run_statements)
+    return '/test/statements/{}'
+
+
+def test_request_within_budget(app, client, query_budget, statements_endpoint):
+    query_budget(3, endpoint='run_statements')
+
+    response = client.get(statements_endpoint.format(3))
+
+    assert response.status_code == 200
+    assert '"3 queries"' in response.headers['Server-Timing']
+    record = app.extensions['query_profiler'].recent(limit=1, endpoint='run_statements')[0]
+    assert record['queries'] == 3
+
+
+def test_request_over_budget_raises_when_strict(client, query_budget, statements_endpoint):
+    query_budget(3, endpoint='run_statements')
+
+    with pytest.raises(QueryBudgetExceeded, match='issued 4 SQL statements, over its budget of 3'):
+        client.get(statements_endpoint.format(4))
+
+
+def test_request_over_budget_only_logs_when_not_strict(app, client, query_budget, statements_endpoint):
+    app.config['QUERY_BUDGET_STRICT'] = False
+    query_budget(3)
+
+    response = client.get(statements_endpoint.format(4))
+
+    assert response.status_code == 200
@@ -0,0 +1,50 @@
+import asyncio
+import time
+import pytest
+from app.hardware.tap_index import TapDecision
+from app.hardware.websocket_server import Device, HardwareServer
+from app.services.tap_ingestion import TapIngestionQueue, TapJournal
+
+
+class FakeTapIndex:
+    """Accepts every tap for lecture 1, with the card ID as the user ID."""
+
+    def ongoing_lecture(self, room, now=None):
+        return None
+
+    def check_tap(self, card_id, room, now=None, buffered=False):
+        return TapDecision(True, 'accepted', int(card_id), 1)
+
+
+class FakeReader:
+    subprotocol = None
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, data):
+        self.sent.append(data)
+
+
+@pytest.fixture
+def ingestion(tmp_path):
+    return TapIngestionQueue(TapJournal(str(tmp_path / 'taps.db')), writer=lambda taps: None)
+
+
+def test_tap_batch_with_bad_timestamp_still_advances_hwm(ingestion):
+    server = HardwareServer(tap_index=FakeTapIndex(), ingestion=ingestion)
+    reader = FakeReader()
+    device = Device('reader-1', 'R1', websocket=reader)
+    now = int(time.time())
+    taps = [[1, now, '11'], [2, 10 ** 12, '12'], [3, -2 ** 40, '13'], [4, now, '14']]
+
+    async def send_batch():
+        await server.handle_tap_batch(device, taps)
+        await server.handle_tap_batch(device, taps[:3])
+    asyncio.run(send_batch())
+
+    acks = [device.codec.decode(data) for data in reader.sent]
+    assert acks[0] == {'type': 'taps_ack', 'hwm': 4, 'results': [[1, True], [2, False], [3, False], [4, True]]}
+    assert acks[1] == {'type': 'taps_ack', 'hwm': 4, 'results': []}
+    assert ingestion.high_water_mark('reader-1') == 4
+    assert ingestion.journal.depth() == 2
@@ -1,17 +1,14 @@
 """WSGI entry point for production."""
 from app import create_app
-from app.extensions import db
+from app.extensions import db, limiter
+from app.utils.health import health_checker
 from config import Config
 import logging
 import sys
 import os
-from sqlalchemy import text
 import traceback
 import time
 from sqlalchemy.exc import SQLAlchemyError
-from app.models.department import Department
-from app.models.user import User
-from app.models.course import Course
 
 # Set environment based on ENV variable
 flask_env = os.environ.get('FLASK_ENV', 'production')
@@ -33,50 +30,18 @@ app = create_app(Config)
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.jinja_env.auto_reload = True
 
-@app.before_request
-def before_request():
-    """Ensure database connection is active."""
-    try:
-        db.session.execute(text('SELECT 1'))
-        db.session.commit()
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}\n{traceback.format_exc()}")
-        db.session.rollback()
-        try:
-            db.session.remove()
-            db.engine.dispose()
-        except:
-            pass
-        raise
+# Dead pooled connections are detected at checkout by pool_pre_ping
+# (see Config.SQLALCHEMY_ENGINE_OPTIONS), so requests need no SELECT 1.
 
 @app.route('/health')
+@limiter.exempt
 def health_check():
-    """Health check endpoint for monitoring."""
-    try:
-        # Check database connection
-        db.session.execute(text('SELECT 1'))
-        db.session.commit()
-        
-        # Check if essential models exist
-        dept_count = Department.query.count()
-        user_count = User.query.count()
-        course_count = Course.query.count()
-        
-        return {
-            'status': 'healthy',
-            'database': 'connected',
-            'models': {
-                'departments': dept_count,
-                'users': user_count,
-                'courses': course_count
-            }
-        }, 200
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}\n{traceback.format_exc()}")
-        return {
-            'status': 'unhealthy',
-            'error': str(e)
-        }, 500
+    """Health check endpoint for monitoring.
+
+    Reads the state cached by the background health checker, so probes
+    do not touch the database.
+    """
+    return health_checker.get_state()
 
 def init_database(max_retries=5, retry_delay=5):
     """Initialize database with retry mechanism."""